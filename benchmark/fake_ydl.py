@@ -0,0 +1,141 @@
+import datetime
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterator
+
+CHANNEL_URL_PATTERN = re.compile(r'^https://www\.youtube\.com/@channel(?P<channel>\d+)')
+VIDEO_URL_PATTERN = re.compile(r'[?&]v=(?P<video_id>[\w-]{11})')
+
+
+@dataclass(frozen=True, slots=True)
+class FakeChannels:
+    """
+    Synthetic channels served by FakeYoutubeDL.
+
+    Channel `c` uploads `videos_per_channel` videos, newest first, one per
+    day. Video ids and upload dates are derived from their position, so
+    the same video always maps to the same file name.
+    """
+    channels: int
+    videos_per_channel: int
+    file_size: int
+
+    EPOCH = datetime.date(2020, 1, 1)
+
+    def channel_url(self, channel: int) -> str:
+        return f'https://www.youtube.com/@channel{channel:05d}/videos'
+
+    def uploader(self, channel: int) -> str:
+        return f'channel{channel:05d}'
+
+    def video_id(self, channel: int, video: int) -> str:
+        return f'{channel:05d}{video:06d}'
+
+    def video_url(self, channel: int, video: int) -> str:
+        return f'https://www.youtube.com/watch?v={self.video_id(channel, video)}'
+
+    def upload_date(self, video: int) -> str:
+        return (self.EPOCH + datetime.timedelta(days=video)).strftime('%Y%m%d')
+
+    def file_name(self, channel: int, video: int) -> str:
+        return f'{self.upload_date(video)}_{self.uploader(channel)}_{self.video_id(channel, video)}.mp4'
+
+    def entries(self, channel: int) -> Iterator[dict]:
+        for video in reversed(range(self.videos_per_channel)):
+            yield {
+                '_type': 'url',
+                'ie_key': 'Youtube',
+                'id': self.video_id(channel, video),
+                'url': self.video_url(channel, video),
+                'upload_date': self.upload_date(video),
+            }
+
+    def video(self, video_id: str) -> dict:
+        channel, video = int(video_id[:5]), int(video_id[5:])
+        return {
+            'id': video_id,
+            'title': f'Video {video} of {self.uploader(channel)}',
+            'uploader': self.uploader(channel),
+            'upload_date': self.upload_date(video),
+            'ext': 'mp4',
+            'filesize': self.file_size,
+        }
+
+
+class FakeYoutubeDL:
+    """
+    Stand-in for yt_dlp.YoutubeDL that serves FakeChannels without network.
+
+    Only the calls ytracker makes are implemented. Downloads write a file of
+    `file_size` bytes and report progress through the configured hooks.
+    """
+    __slots__ = 'params',
+
+    channels: FakeChannels | None = None
+    # Bytes written per write call, and reported per progress hook call.
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, params: dict | None = None) -> None:
+        self.params = params or {}
+
+    def __enter__(self) -> 'FakeYoutubeDL':
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def extract_info(self, url: str, download: bool = True, process: bool = True) -> dict:
+        match = CHANNEL_URL_PATTERN.match(url)
+        if match is not None:
+            channel = int(match.group('channel'))
+            return {
+                '_type': 'playlist',
+                'id': self.channels.uploader(channel),
+                'uploader': self.channels.uploader(channel),
+                'entries': self.channels.entries(channel),
+            }
+
+        match = VIDEO_URL_PATTERN.search(url)
+        if match is None:
+            raise ValueError(f'Unsupported url: {url}')
+        video_info = self.channels.video(match.group('video_id'))
+        return self.process_ie_result(video_info, download=True) if download else video_info
+
+    def sort_formats(self, video_info: dict) -> None:
+        pass
+
+    def build_format_selector(self, format_spec: str):
+        # Every fake video comes in one format, which matches any spec.
+        return lambda ctx: iter(ctx['formats'][-1:])
+
+    def prepare_filename(self, video_info: dict) -> str:
+        return self.params['outtmpl'] % video_info
+
+    def process_ie_result(self, video_info: dict, download: bool = True) -> dict:
+        if not download:
+            return video_info
+
+        path_on_disk = self.prepare_filename(video_info)
+        tmp_path = f'{path_on_disk}.part'
+        file_size = video_info['filesize']
+        chunk = b'\0' * min(self.CHUNK_SIZE, file_size)
+        written = 0
+        with open(tmp_path, 'wb') as file:
+            while written < file_size:
+                written += file.write(chunk[:file_size - written])
+                self._report('downloading', tmp_path, written, file_size)
+        os.replace(tmp_path, path_on_disk)
+        self._report('finished', path_on_disk, written, file_size)
+
+        return {**video_info, 'requested_downloads': [{'filepath': path_on_disk}]}
+
+    def _report(self, status: str, file_name: str, downloaded_bytes: int, total_bytes: int) -> None:
+        for hook in self.params.get('progress_hooks') or ():
+            hook({
+                'status': status,
+                'filename': file_name,
+                'tmpfilename': file_name,
+                'downloaded_bytes': downloaded_bytes,
+                'total_bytes': total_bytes,
+            })
@@ -0,0 +1,284 @@
+"""
+Offline end-to-end benchmark of a ytracker cycle.
+
+Runs the real daemon cycle against FakeYoutubeDL in a throwaway HOME:
+download history is seeded with `--history` videos, then every stage is
+timed and its SQLite queries counted. Results are compared with the stored
+baseline and the process exits non-zero when a stage regressed.
+
+    python3 -m benchmark.run
+    python3 -m benchmark.run --channels 100 --history 10000
+    python3 -m benchmark.run --update-baseline
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator
+
+import ytracker.ydl
+from benchmark.fake_ydl import FakeChannels, FakeYoutubeDL
+from ytracker.__main__ import evict, prepare_queue, run_cycle
+from ytracker.config import Config, Options
+from ytracker.database import Session, YouTubeVideo
+from ytracker.fetch import Urls
+from ytracker.logger import Logger
+from ytracker.metrics import DB_QUERY_DURATION
+from ytracker.ratelimit import BandwidthLimiter
+from ytracker.scheduler import ChannelScheduler
+from ytracker.utils import convert_gb_to_bytes
+from ytracker.ydl import YoutubeDLPool
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+QUERY_OPERATIONS = ('fetchone', 'fetchall', 'execute', 'executemany')
+# Stages that mostly measure the benchmark's own setup and are not compared.
+SETUP_STAGES = ('seed_history',)
+
+
+@dataclass(frozen=True, slots=True)
+class StageResult:
+    name: str
+    seconds: float
+    queries: int
+    peak_rss_kb: int
+
+
+@dataclass(slots=True)
+class BenchmarkResult:
+    params: dict
+    stages: list[StageResult] = field(default_factory=list)
+
+    @property
+    def peak_rss_kb(self) -> int:
+        return max((stage.peak_rss_kb for stage in self.stages), default=0)
+
+    def to_dict(self) -> dict:
+        return {
+            'params': self.params,
+            'stages': {
+                stage.name: {'seconds': stage.seconds, 'queries': stage.queries, 'peak_rss_kb': stage.peak_rss_kb}
+                for stage in self.stages
+            },
+            'peak_rss_kb': self.peak_rss_kb,
+        }
+
+
+def query_count() -> int:
+    return sum(DB_QUERY_DURATION.count(operation=operation) for operation in QUERY_OPERATIONS)
+
+
+def peak_rss_kb() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+@contextmanager
+def isolated_home(home: str) -> Iterator[None]:
+    """
+    Points HOME, and so the database, log, url list and download path, to
+    `home` and serves channels from FakeYoutubeDL instead of YouTube.
+    :param home:
+    :return:
+    """
+    previous_home = os.environ.get('HOME')
+    previous_ydl = ytracker.ydl.YoutubeDL
+    Session.close_all()
+    YoutubeDLPool.get().clear()
+    os.environ['HOME'] = home
+    ytracker.ydl.YoutubeDL = FakeYoutubeDL
+    try:
+        yield
+    finally:
+        Session.close_all()
+        YoutubeDLPool.get().clear()
+        ytracker.ydl.YoutubeDL = previous_ydl
+        if previous_home is None:
+            os.environ.pop('HOME', None)
+        else:
+            os.environ['HOME'] = previous_home
+
+
+def seed_history(channels: FakeChannels, download_path: str, history_per_channel: int) -> None:
+    """
+    Creates sparse files for the oldest `history_per_channel` videos of every
+    channel and inserts them into download_history in one transaction.
+    :param channels:
+    :param download_path:
+    :param history_per_channel:
+    :return:
+    """
+    videos = []
+    for channel in range(channels.channels):
+        for video in range(history_per_channel):
+            path_on_disk = os.path.join(download_path, channels.file_name(channel, video))
+            with open(path_on_disk, 'wb') as file:
+                file.truncate(channels.file_size)
+            videos.append(YouTubeVideo()
+                          .set_youtube_video_id(channels.video_id(channel, video))
+                          .set_path_on_disk(path_on_disk)
+                          .set_file_size(channels.file_size))
+    YouTubeVideo.save_all(videos, [])
+
+
+def run_benchmark(
+        channels: int = 1000,
+        history: int = 100000,
+        new_videos: int = 2,
+        file_size: int = 256 * 1024,
+        scan_workers: int = 4,
+        download_workers: int = 2
+) -> BenchmarkResult:
+    """
+    Runs every stage once in a temporary HOME and returns their measurements.
+    :param channels: Number of tracked channels.
+    :param history: Videos already in download_history, spread over the channels.
+    :param new_videos: Videos per channel uploaded since the last run.
+    :param file_size: Size in bytes of every video file.
+    :param scan_workers:
+    :param download_workers:
+    :return:
+    """
+    history_per_channel = history // channels
+    fake_channels = FakeChannels(channels, history_per_channel + new_videos, file_size)
+    FakeYoutubeDL.channels = fake_channels
+    result = BenchmarkResult({
+        'channels': channels,
+        'history': history_per_channel * channels,
+        'new_videos': new_videos,
+        'file_size': file_size,
+        'scan_workers': scan_workers,
+        'download_workers': download_workers,
+    })
+
+    def stage(name: str, function: Callable[[], object]) -> None:
+        queries = query_count()
+        started_at = time.perf_counter()
+        function()
+        result.stages.append(StageResult(
+            name,
+            round(time.perf_counter() - started_at, 3),
+            query_count() - queries,
+            peak_rss_kb()
+        ))
+
+    with tempfile.TemporaryDirectory(prefix='ytracker-benchmark-') as home, isolated_home(home):
+        data_path = os.path.join(home, '.local', 'share', 'ytracker')
+        download_path = os.path.join(home, 'Videos', 'ytracker')
+        os.makedirs(data_path)
+        os.makedirs(download_path)
+        with open(os.path.join(data_path, 'ytracker_urls.txt'), 'w') as urls_file:
+            urls_file.write('\n'.join(fake_channels.channel_url(channel) for channel in range(channels)))
+
+        total_bytes = channels * fake_channels.videos_per_channel * file_size
+        options = dict(
+            download_path=download_path,
+            storage_size=math.ceil(total_bytes / convert_gb_to_bytes(1)) + 1,
+            scan_workers=scan_workers,
+            download_workers=download_workers
+        )
+        config = Config(Options.create(**options))
+        logger = Logger(os.path.join(data_path, 'ytracker.log'))
+        BandwidthLimiter.get().configure(0, ())
+        scheduler = ChannelScheduler(config, logger)
+        channel_urls = tuple(fake_channels.channel_url(channel) for channel in range(channels))
+
+        stage('seed_history', lambda: seed_history(fake_channels, download_path, history_per_channel))
+        stage('prepare_queue', lambda: prepare_queue(logger, config))
+        stage('cycle', lambda: run_cycle(logger, config, scheduler, channel_urls))
+        stage('rescan', lambda: list(Urls(channel_urls, logger, scan_workers, scheduler)))
+
+        # Halve the quota, so eviction has to plan and delete about half of the videos.
+        half_quota = Config(Options.create(**{**options, 'storage_size': total_bytes // convert_gb_to_bytes(2)}))
+        stage('evict', lambda: evict(logger, half_quota))
+
+    return result
+
+
+def compare(result: BenchmarkResult, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Returns a description of every measurement worse than the baseline allows.
+    Stage times may grow by `tolerance` plus a little noise, query counts by
+    ten percent and peak memory by a quarter.
+    :param result:
+    :param baseline:
+    :param tolerance: Allowed ratio of a stage's time to its baseline time.
+    :return:
+    """
+    regressions = []
+    for stage in result.stages:
+        expected = baseline['stages'].get(stage.name)
+        if expected is None or stage.name in SETUP_STAGES:
+            continue
+        if stage.seconds > expected['seconds'] * tolerance + 0.25:
+            regressions.append(f'{stage.name}: {stage.seconds}s, baseline {expected["seconds"]}s')
+        if stage.queries > expected['queries'] * 1.1 + 5:
+            regressions.append(f'{stage.name}: {stage.queries} queries, baseline {expected["queries"]}')
+    if result.peak_rss_kb > baseline['peak_rss_kb'] * 1.25:
+        regressions.append(f'peak RSS: {result.peak_rss_kb} KiB, baseline {baseline["peak_rss_kb"]} KiB')
+    return regressions
+
+
+def print_result(result: BenchmarkResult) -> None:
+    print(', '.join(f'{name}={value}' for name, value in result.params.items()))
+    print(f'{"stage":<16}{"seconds":>10}{"queries":>10}{"peak RSS KiB":>14}')
+    for stage in result.stages:
+        print(f'{stage.name:<16}{stage.seconds:>10.3f}{stage.queries:>10}{stage.peak_rss_kb:>14}')
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark.run', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--history', type=int, default=100000)
+    parser.add_argument('--new-videos', type=int, default=2)
+    parser.add_argument('--file-size', type=int, default=256 * 1024)
+    parser.add_argument('--scan-workers', type=int, default=4)
+    parser.add_argument('--download-workers', type=int, default=2)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(
+        args.channels,
+        args.history,
+        args.new_videos,
+        args.file_size,
+        args.scan_workers,
+        args.download_workers
+    )
+    print_result(result)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(result.to_dict(), baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f'Baseline written: {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline, 'r') as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to create one.')
+        return 0
+
+    if baseline['params'] != result.params:
+        print('Parameters differ from the baseline, not comparing.')
+        return 0
+
+    regressions = compare(result, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,7 +7,7 @@ setup(
     description='YouTube feed downloader',
     author='Dragan Stojaković',
     url='https://github.com/draganstojakovic/ytracker',
-    packages=find_packages(),
+    packages=find_packages(exclude=('benchmark', 'benchmark.*')),
     install_requires=[
         'mutagen',
         'pycryptodomex',
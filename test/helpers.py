@@ -0,0 +1,19 @@
+import os
+from ytracker.database import Session
+
+
+def db_path() -> str:
+    return os.path.join(os.environ.get('HOME'), '.local', 'share', 'ytracker', 'ytracker.db')
+
+
+def remove_db() -> None:
+    """
+    Closes every session and deletes the database with its WAL files,
+    so every test starts from an empty one.
+    :return:
+    """
+    Session.close_all()
+    path = db_path()
+    for file_path in (path, f'{path}-wal', f'{path}-shm'):
+        if os.path.isfile(file_path):
+            os.remove(file_path)
@@ -0,0 +1,38 @@
+import os
+import unittest
+import ytracker.ydl
+from benchmark.run import compare, run_benchmark
+from ytracker.metrics import VIDEOS_DOWNLOADED, VIDEOS_EVICTED
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmark(self):
+        home = os.environ.get('HOME')
+        youtube_dl = ytracker.ydl.YoutubeDL
+        downloaded = VIDEOS_DOWNLOADED.value()
+        evicted = VIDEOS_EVICTED.value()
+
+        result = run_benchmark(channels=5, history=50, new_videos=2, file_size=1024)
+
+        self.assertEqual(os.environ.get('HOME'), home)
+        self.assertIs(ytracker.ydl.YoutubeDL, youtube_dl)
+        self.assertEqual(
+            [stage.name for stage in result.stages],
+            ['seed_history', 'prepare_queue', 'cycle', 'rescan', 'evict']
+        )
+        self.assertEqual(VIDEOS_DOWNLOADED.value() - downloaded, 10)
+        # The halved quota rounds down to 0 GB at this size, so everything goes.
+        self.assertEqual(VIDEOS_EVICTED.value() - evicted, 60)
+
+        stages = {stage.name: stage for stage in result.stages}
+        self.assertEqual(stages['rescan'].queries, 5)
+        self.assertGreater(result.peak_rss_kb, 0)
+
+        baseline = result.to_dict()
+        self.assertEqual(compare(result, baseline, 1.5), [])
+        baseline['stages']['cycle']['queries'] = 1
+        self.assertEqual(len(compare(result, baseline, 1.5)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,6 +38,19 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(options.storage_size, 5)
         self.assertEqual(options.video_quality, '720')
         self.assertEqual(options.refresh_interval, 120)
+        self.assertEqual(options.scan_workers, 4)
+        self.assertEqual(options.download_workers, 2)
+
+        options = Options.create(scan_workers='0')
+        self.assertEqual(options.scan_workers, 1)
+
+        options = Options.create(channel_limits={
+            'https://www.youtube.com/@busy': {'max_videos': 20},
+            'https://www.youtube.com/@broken': {'max_videos': 'many'},
+            'https://www.youtube.com/@unlimited': {},
+        })
+        self.assertEqual([limit.channel for limit in options.channel_limits], ['https://www.youtube.com/@busy'])
+        self.assertEqual(Options.create(channel_limits=options.channel_limits).channel_limits, options.channel_limits)
 
     def test_config(self):
         conf = Config.create(Logger())
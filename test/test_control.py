@@ -0,0 +1,111 @@
+import os
+import tempfile
+import threading
+import unittest
+from yt_dlp.utils import DownloadCancelled
+from ytracker.control import ControlServer, DaemonState, Stage, send_command
+from ytracker.logger import Logger
+
+
+class TestDaemonState(unittest.TestCase):
+    def test_snapshot(self):
+        state = DaemonState()
+        state.set_stage(Stage.DOWNLOADING)
+        state.set_queued(3)
+        state.download_started('https://www.youtube.com/watch?v=a')
+        state.download_started('https://www.youtube.com/watch?v=b')
+        state.download_finished('https://www.youtube.com/watch?v=a')
+        state.job_queued()
+        state.set_storage(100, 1000)
+        state.set_next_cycle_at(1060)
+
+        snapshot = state.snapshot(now=1000)
+        self.assertEqual(snapshot['stage'], 'downloading')
+        self.assertEqual(snapshot['queued'], 2)
+        self.assertEqual([download['url'] for download in snapshot['active_downloads']],
+                         ['https://www.youtube.com/watch?v=b'])
+        self.assertEqual(snapshot['storage_used'], 100)
+        self.assertEqual(snapshot['next_cycle_in'], 60)
+
+    def test_pause(self):
+        state = DaemonState()
+        state.pause()
+        self.assertEqual(state.snapshot()['stage'], 'paused')
+        self.assertFalse(state.wait_until_resumed(timeout=0.01))
+
+        threading.Timer(0.05, state.resume).start()
+        self.assertTrue(state.wait_until_resumed(timeout=5))
+
+        state.pause()
+        state.drain()
+        self.assertTrue(state.wait_until_resumed(timeout=0))
+        self.assertTrue(state.wake_requested())
+
+    def test_stop(self):
+        state = DaemonState()
+        state.pause()
+        state.stop(10, now=100)
+        self.assertTrue(state.stopping)
+        self.assertTrue(state.wake_requested())
+        self.assertTrue(state.wait_until_resumed(timeout=0))
+        self.assertEqual(state.snapshot()['stage'], 'stopping')
+        self.assertFalse(state.grace_expired(now=109))
+        self.assertTrue(state.grace_expired(now=110))
+
+        state = DaemonState()
+        state.cancel_hook({'status': 'downloading'})
+        state.stop(0)
+        self.assertRaises(DownloadCancelled, state.cancel_hook, {'status': 'downloading'})
+
+
+class TestControlServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'ytracker.sock')
+        self.state = DaemonState()
+        self.server = ControlServer(Logger(), self.path, self.state).start()
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        self.directory.cleanup()
+
+    def test_commands(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+        status = send_command('status', self.path)
+        self.assertTrue(status['ok'])
+        self.assertEqual(status['stage'], 'starting')
+        self.assertEqual(status['pid'], os.getpid())
+
+        self.assertTrue(send_command('pause', self.path)['ok'])
+        self.assertTrue(self.state.paused)
+        self.assertTrue(send_command('resume', self.path)['ok'])
+        self.assertFalse(self.state.paused)
+
+        self.assertTrue(send_command('scan-now', self.path)['ok'])
+        self.assertTrue(self.state.take_scan_request())
+        self.assertFalse(self.state.take_scan_request())
+
+        self.assertTrue(send_command('drain', self.path)['ok'])
+        self.assertTrue(self.state.draining)
+
+        self.assertFalse(send_command('explode', self.path)['ok'])
+
+    def test_socket_mode_under_open_umask(self):
+        self.server.stop()
+        previous_umask = os.umask(0)
+        try:
+            self.server = ControlServer(Logger(), self.path, self.state).start()
+            self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+            self.assertEqual(os.umask(0), 0)
+        finally:
+            os.umask(previous_umask)
+
+    def test_stop(self):
+        self.server.stop()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertRaises(OSError, send_command, 'status', self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from ytracker.daemon import Daemon, PidFileManager
+from ytracker.logger import Logger
+
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.pid_manager = PidFileManager(os.path.join(self.directory.name, 'ytracker.pid'))
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_pid_file(self):
+        self.assertFalse(self.pid_manager.read())
+        self.assertTrue(self.pid_manager.write(1234))
+        self.assertEqual(self.pid_manager.read(), 1234)
+        self.assertFalse(self.pid_manager.remove(4321))
+        self.assertTrue(self.pid_manager.remove(1234))
+        self.assertFalse(self.pid_manager.read())
+
+    def test_stop_without_daemon(self):
+        self.assertTrue(Daemon('stop', self.pid_manager, Logger()).stop())
+        self.pid_manager.write(os.getpid())
+        self.assertTrue(Daemon('stop', self.pid_manager, Logger()).stop())
+
+    def test_stop_waits_for_exit(self):
+        # Takes its time to exit on SIGTERM, like a daemon finishing downloads.
+        process = subprocess.Popen([sys.executable, '-c', (
+            'import signal, sys, time\n'
+            'signal.signal(signal.SIGTERM, lambda *_: (time.sleep(0.3), sys.exit(0)))\n'
+            'print("ready", flush=True)\n'
+            'time.sleep(30)\n'
+        )], stdout=subprocess.PIPE)
+        process.stdout.readline()
+        threading.Thread(target=process.wait).start()
+        self.pid_manager.write(process.pid)
+
+        started_at = time.monotonic()
+        self.assertTrue(Daemon('stop', self.pid_manager, Logger(), stop_timeout=10).stop())
+        self.assertGreaterEqual(time.monotonic() - started_at, 0.3)
+        process.stdout.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
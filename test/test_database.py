@@ -1,30 +1,17 @@
 import os
 import time
 import unittest
-from ytracker.database import Constraint, Database, DBPath, YouTubeVideo
+from helpers import remove_db
+from ytracker.database import Constraint, Database, DBPath, DownloadedIndex, Session, YouTubeVideo
 
 
 class TestDatabase(unittest.TestCase):
     def setUp(self):
-        db_path = self.get_db_path()
-        if os.path.isfile(db_path):
-            os.remove(db_path)
+        remove_db()
 
     @classmethod
     def tearDownClass(cls) -> None:
-        db_path = cls.get_db_path()
-        if os.path.isfile(db_path):
-            os.remove(db_path)
-
-    @staticmethod
-    def get_db_path() -> str:
-        return os.path.join(
-            os.environ.get('HOME'),
-            '.local',
-            'share',
-            'ytracker',
-            'ytracker.db'
-        )
+        remove_db()
 
     @staticmethod
     def add_videos() -> None:
@@ -39,6 +26,49 @@ class TestDatabase(unittest.TestCase):
          .set_path_on_disk('/videos/video.mp4').set_file_size(142234)
          .set_deleted(True).save())
 
+    def test_session(self):
+        session = Session.get()
+        self.assertIs(session, Session.get())
+        self.assertEqual(session.fetchone('PRAGMA journal_mode')[0], 'wal')
+        YouTubeVideo()
+        self.assertTrue(session.is_validated('download_history'))
+
+    def test_downloaded_index(self):
+        self.add_videos()
+        index = DownloadedIndex.get().reload()
+        self.assertEqual(len(index), 3)
+        self.assertIn('id1', index)
+        self.assertNotIn('id4', index)
+        video = YouTubeVideo().set_youtube_video_id('id4').set_path_on_disk('/some_path').set_file_size(1)
+        video.save()
+        self.assertIn('id4', index)
+        YouTubeVideo.find_by_video_id('id4').delete()
+        self.assertNotIn('id4', index)
+
+    def test_plan_eviction(self):
+        self.add_videos()
+        self.assertEqual(YouTubeVideo.plan_eviction(0), [])
+        victims = YouTubeVideo.plan_eviction(1)
+        self.assertEqual([video.video_id for video in victims], ['id1'])
+        victims = YouTubeVideo.plan_eviction(142235)
+        self.assertEqual([video.video_id for video in victims], ['id1', 'id2'])
+        self.assertEqual(len(YouTubeVideo.plan_eviction(10 ** 9)), 2)
+        self.assertEqual(YouTubeVideo.mark_deleted(victims), 2)
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 0)
+        self.assertTrue(YouTubeVideo.find_by_video_id('id1').deleted)
+
+    def test_sum_file_size(self):
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 0)
+        self.add_videos()
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 284468)
+        video = YouTubeVideo.find_by_video_id('id3')
+        video.set_deleted(False).set_file_size(100).update()
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 284568)
+        video.delete()
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 284468)
+        Session.get().execute('UPDATE storage_usage SET used_bytes = 7 WHERE id = 1')
+        self.assertEqual(YouTubeVideo.rebuild_sum_file_size(), 284468)
+
     def test_constraint(self):
         constraint = Constraint('id', 1)
         self.assertIsNotNone(constraint)
@@ -69,9 +99,6 @@ class TestDatabase(unittest.TestCase):
         self.assertIsNotNone(video)
         self.assertEqual(video.video['youtube_video_id'], 'id3')
         self.assertEqual(video.video['deleted'], True)
-        last_not_deleted_video = YouTubeVideo.get_latest_not_deleted_video()
-        self.assertIsNotNone(last_not_deleted_video)
-        self.assertEqual(last_not_deleted_video.video['youtube_video_id'], 'id2')
         file_size_sum = YouTubeVideo.get_sum_file_size()
         self.assertEqual(file_size_sum, 284468)
         exists = YouTubeVideo.exists('id1')
@@ -85,6 +112,7 @@ class TestDatabase(unittest.TestCase):
         self.assertTrue(YouTubeVideo.find_by_video_id('id4').set_deleted(True).update())
         self.assertTrue(YouTubeVideo.exists('id4'))
         self.assertTrue(YouTubeVideo.find_by_video_id('id4').delete())
+        self.assertFalse(YouTubeVideo.exists("id4' OR '1' = '1"))
         # TODO add more cases
 
 
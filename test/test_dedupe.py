@@ -0,0 +1,114 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from helpers import remove_db
+from ytracker.config import Config, Options
+from ytracker.database import YouTubeVideo
+from ytracker.dedupe import Deduplicator
+from ytracker.eviction import EvictionPlanner
+from ytracker.logger import Logger
+
+
+class TestDeduplicator(unittest.TestCase):
+    def setUp(self) -> None:
+        remove_db()
+        self.download_path = tempfile.mkdtemp()
+        self.logger = Logger()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.download_path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    def deduplicator(self, deduplicate: str = 'hardlink') -> Deduplicator:
+        config = Config(Options.create(download_path=self.download_path, deduplicate=deduplicate))
+        return Deduplicator(config, self.logger)
+
+    def save_video(self, video_id: str, content: bytes) -> str:
+        path = os.path.join(self.download_path, f'{video_id}.mp4')
+        with open(path, 'wb') as file:
+            file.write(content)
+        YouTubeVideo() \
+            .set_youtube_video_id(video_id) \
+            .set_path_on_disk(path) \
+            .set_file_size(len(content)) \
+            .save()
+        return path
+
+    def test_hash_file(self):
+        content = os.urandom(Deduplicator.CHUNK_SIZE * 2 + 123)
+        path = self.save_video('a', content)
+
+        self.assertEqual(hashlib.sha256(content).hexdigest(), self.deduplicator().hash_file(path))
+        self.assertIsNone(self.deduplicator().hash_file(os.path.join(self.download_path, 'missing.mp4')))
+
+    def test_hardlink(self):
+        original = self.save_video('a', b'same content')
+        duplicate = self.save_video('b', b'same content')
+        self.save_video('c', b'diff content')
+        self.save_video('d', b'unique size')
+
+        duplicates = self.deduplicator().process('b')
+
+        self.assertEqual(['b'], [video.video_id for video in duplicates])
+        self.assertTrue(os.path.samefile(original, duplicate))
+        video = YouTubeVideo.find_by_video_id('b')
+        self.assertFalse(video.deleted)
+        self.assertEqual(YouTubeVideo.find_by_video_id('a').table_id, video.duplicate_of)
+        self.assertIsNotNone(YouTubeVideo.find_by_video_id('c').content_hash)
+        self.assertIsNone(YouTubeVideo.find_by_video_id('c').duplicate_of)
+        self.assertIsNone(YouTubeVideo.find_by_video_id('d').content_hash)
+        self.assertEqual(12 + 12 + 11, YouTubeVideo.get_sum_file_size())
+        self.assertEqual(12 + 12 + 11, YouTubeVideo.rebuild_sum_file_size())
+
+    def test_drop(self):
+        self.save_video('a', b'same content')
+        duplicate = self.save_video('b', b'same content')
+
+        self.deduplicator('drop').process('a')
+
+        self.assertFalse(os.path.exists(duplicate))
+        self.assertTrue(YouTubeVideo.find_by_video_id('b').deleted)
+        self.assertEqual(12, YouTubeVideo.get_sum_file_size())
+
+    def test_off(self):
+        self.save_video('a', b'same content')
+        self.save_video('b', b'same content')
+
+        self.assertEqual([], self.deduplicator('off').process('b'))
+        self.assertIsNone(YouTubeVideo.find_by_video_id('b').content_hash)
+
+    def test_evicting_original_evicts_duplicates(self):
+        original = self.save_video('a', b'same content')
+        duplicate = self.save_video('b', b'same content')
+        self.deduplicator().process('b')
+
+        evicted = EvictionPlanner(self.logger).evict(1)
+
+        self.assertEqual(['a', 'b'], [video.video_id for video in evicted])
+        self.assertFalse(os.path.exists(original))
+        self.assertFalse(os.path.exists(duplicate))
+        self.assertEqual(0, YouTubeVideo.get_sum_file_size())
+
+    def test_background(self):
+        self.save_video('a', b'same content')
+        deduplicator = self.deduplicator().start()
+        try:
+            self.save_video('b', b'same content')
+            deduplicator.submit('b')
+            deadline = time.monotonic() + 5
+            while YouTubeVideo.find_by_video_id('b').duplicate_of is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+        finally:
+            deduplicator.stop()
+
+        self.assertIsNotNone(YouTubeVideo.find_by_video_id('b').duplicate_of)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from helpers import remove_db
+from ytracker.database import YouTubeVideo
+from ytracker.eviction import ChannelLimit, EvictionPlanner
+from ytracker.logger import Logger
+
+
+class TestEvictionPlanner(unittest.TestCase):
+    # video id, size, upload date, seconds since last access
+    VIDEOS = (
+        ('a', 100, '20230105', 10),
+        ('b', 400, '20230101', 30),
+        ('c', 200, None, 40),
+        ('d', 300, '20230103', 20),
+    )
+
+    def setUp(self) -> None:
+        remove_db()
+        self.download_path = tempfile.mkdtemp()
+        for video_id, size, upload_date, accessed_ago in self.VIDEOS:
+            path = os.path.join(self.download_path, f'{video_id}.mp4')
+            with open(path, 'wb') as file:
+                file.truncate(size)
+            accessed_at = 1_700_000_000 - accessed_ago
+            os.utime(path, (accessed_at, accessed_at))
+            YouTubeVideo() \
+                .set_youtube_video_id(video_id) \
+                .set_path_on_disk(path) \
+                .set_file_size(size) \
+                .set_upload_date(upload_date) \
+                .save()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.download_path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    def plan(self, policy: str, bytes_to_free: int) -> list[str]:
+        return [video.video_id for video in EvictionPlanner(Logger(), policy).plan(bytes_to_free)]
+
+    def test_policy_order(self):
+        expected = {
+            'oldest': ['a', 'b', 'c', 'd'],
+            'largest': ['b', 'd', 'c', 'a'],
+            'least_recently_accessed': ['c', 'b', 'd', 'a'],
+            'oldest_upload': ['b', 'd', 'a', 'c'],
+        }
+        for policy, order in expected.items():
+            with self.subTest(policy=policy):
+                self.assertEqual(self.plan(policy, 10 ** 9), order)
+
+    def test_fewest_deletions_reach_target(self):
+        sizes = {video_id: size for video_id, size, _, _ in self.VIDEOS}
+        for policy, bytes_to_free in itertools.product(EvictionPlanner.POLICIES, (0, 1, 150, 500, 700, 1000)):
+            with self.subTest(policy=policy, bytes_to_free=bytes_to_free):
+                victims = self.plan(policy, bytes_to_free)
+                freed = sum(sizes[video_id] for video_id in victims)
+                self.assertGreaterEqual(freed, bytes_to_free)
+                if victims:
+                    self.assertLess(freed - sizes[victims[-1]], bytes_to_free)
+                    self.assertEqual(victims, self.plan(policy, 10 ** 9)[:len(victims)])
+
+    def test_largest_evicts_fewest_videos(self):
+        self.assertEqual(self.plan('largest', 600), ['b', 'd'])
+        self.assertEqual(len(self.plan('oldest', 600)), 3)
+
+    def test_evict(self):
+        victims = EvictionPlanner(Logger(), 'least_recently_accessed').evict(250)
+
+        self.assertEqual([video.video_id for video in victims], ['c', 'b'])
+        self.assertFalse(os.path.exists(os.path.join(self.download_path, 'c.mp4')))
+        self.assertTrue(YouTubeVideo.find_by_video_id('b').deleted)
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 400)
+
+    def test_evict_over_channel_limits(self):
+        for number in range(6):
+            YouTubeVideo() \
+                .set_youtube_video_id(f'busy{number}') \
+                .set_path_on_disk(os.path.join(self.download_path, f'busy{number}.mp4')) \
+                .set_file_size(100) \
+                .set_channel('https://www.youtube.com/@busy') \
+                .save()
+        YouTubeVideo() \
+            .set_youtube_video_id('quiet0') \
+            .set_path_on_disk(os.path.join(self.download_path, 'quiet0.mp4')) \
+            .set_file_size(1000) \
+            .set_channel('https://www.youtube.com/@quiet') \
+            .save()
+        limits = (
+            ChannelLimit('https://www.youtube.com/@busy', max_bytes=450, max_videos=5),
+            ChannelLimit('https://www.youtube.com/@quiet', max_videos=1),
+            ChannelLimit('https://www.youtube.com/@empty', max_videos=1),
+        )
+
+        victims = EvictionPlanner(Logger()).evict_over_channel_limits(limits)
+
+        self.assertEqual([video.video_id for video in victims], ['busy0', 'busy1'])
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 1000 + 1000 + 400)
+
+        aged = EvictionPlanner(Logger()).evict_over_channel_limits(
+            (ChannelLimit('https://www.youtube.com/@quiet', max_age=3600),),
+            now=time.time() + 7200
+        )
+        self.assertEqual([video.video_id for video in aged], ['quiet0'])
+
+    def test_channel_limit_create(self):
+        limit = ChannelLimit.create(' https://www.youtube.com/@busy ', {'max_size': 0.5, 'max_age': 2})
+        self.assertEqual(limit.channel, 'https://www.youtube.com/@busy')
+        self.assertEqual(limit.max_bytes, 512 * 1024 * 1024)
+        self.assertIsNone(limit.max_videos)
+        self.assertEqual(limit.max_age, 2 * 24 * 3600)
+        for invalid in ({}, {'max_videos': -1}, {'max_size': 'lots'}):
+            with self.subTest(limit=invalid), self.assertRaises(ValueError):
+                ChannelLimit.create('https://www.youtube.com/@busy', invalid)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            EvictionPlanner(Logger(), 'random')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from ytracker.database import DownloadedIndex
+from ytracker.fetch import ChannelScan, Urls, VideoFetcher
+from ytracker.logger import Logger
+from ytracker.scheduler import Watermark
+
+
+class TestUrls(unittest.TestCase):
+    def setUp(self) -> None:
+        self.urls = Urls((), Logger())
+        self.entries = [{'id': f'video{number}', 'url': f'https://www.youtube.com/watch?v=video{number}'}
+                        for number in range(50, 0, -1)]
+
+    def tearDown(self) -> None:
+        DownloadedIndex.get().discard('video49')
+
+    def test_first_scan(self):
+        scan = self.urls._walk(iter(self.entries), None, Urls.FIRST_SCAN_SIZE)
+        self.assertEqual(len(scan.entries), 10)
+        self.assertEqual(scan.watermark, Watermark('video50'))
+
+    def test_scan_stops_at_watermark(self):
+        DownloadedIndex.get().add('video49')
+        scan = self.urls._walk(iter(self.entries), Watermark('video45'), 100)
+        self.assertEqual([entry['id'] for entry in scan.entries], ['video50', 'video48', 'video47', 'video46'])
+        self.assertEqual(scan.watermark, Watermark('video50'))
+
+    def test_scan_catches_up(self):
+        scan = self.urls._walk(iter(self.entries), Watermark('video5'), 30)
+        self.assertEqual(len(scan.entries), 30)
+
+    def test_scan_stops_at_older_upload(self):
+        entries = [
+            {'id': 'new', 'upload_date': '20231010'},
+            {'id': 'old', 'upload_date': '20231001'},
+        ]
+        scan = self.urls._walk(iter(entries), Watermark('gone', '20231005'), 100)
+        self.assertEqual([entry['id'] for entry in scan.entries], ['new'])
+        self.assertEqual(scan.watermark, Watermark('new', '20231010'))
+
+    def test_watermark_recorded_after_urls_taken(self):
+        recorded = []
+
+        class Scheduler:
+            def watermark(self, channel_url: str) -> None:
+                return None
+
+            def record(self, channel_url: str, new_videos: int, watermark: Watermark | None = None) -> None:
+                recorded.append((channel_url, new_videos, watermark))
+
+        entries = self.entries[:2]
+
+        class ScannedUrls(Urls):
+            def _get_info(self, playlist_url: str) -> ChannelScan:
+                return ChannelScan(entries, Watermark('video50'))
+
+        urls = iter(ScannedUrls(('channel',), Logger(), scheduler=Scheduler()))
+        next(urls)
+        next(urls)
+        self.assertEqual(recorded, [])
+        self.assertEqual(list(urls), [])
+        self.assertEqual(recorded, [('channel', 2, Watermark('video50'))])
+
+        recorded.clear()
+        urls = iter(ScannedUrls(('channel',), Logger(), scheduler=Scheduler()))
+        next(urls)
+        urls.close()
+        self.assertEqual(recorded, [])
+
+
+class TestVideoFetcher(unittest.TestCase):
+    def test_expected_size_of_unprocessed_formats(self):
+        merged = {'requested_formats': [{'filesize': 1000}, {'tbr': 128}]}
+        self.assertEqual(VideoFetcher._expected_size(merged, 10), 1000 + 160000)
+        self.assertEqual(VideoFetcher._expected_size({'tbr': 128}, None), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+from yt_dlp import YoutubeDL
+from ytracker.formats import FormatNegotiator
+
+
+def video_format(format_id: str, ext: str, height: int | None, vcodec: str, acodec: str) -> dict:
+    return {
+        'format_id': format_id,
+        'ext': ext,
+        'height': height,
+        'vcodec': vcodec,
+        'acodec': acodec,
+        'url': f'https://example.com/{format_id}',
+        'protocol': 'https',
+        'filesize': 1000,
+    }
+
+
+# Sorted worst to best, as yt-dlp hands them to format selectors.
+PROGRESSIVE_360 = video_format('18', 'mp4', 360, 'avc1', 'mp4a')
+PROGRESSIVE_720 = video_format('22', 'mp4', 720, 'avc1', 'mp4a')
+AUDIO_WEBM = video_format('251', 'webm', None, 'none', 'opus')
+AUDIO_M4A = video_format('140', 'm4a', None, 'none', 'mp4a')
+VIDEO_720_WEBM = video_format('247', 'webm', 720, 'vp9', 'none')
+VIDEO_720_MP4 = video_format('136', 'mp4', 720, 'avc1', 'none')
+VIDEO_1080_MP4 = video_format('137', 'mp4', 1080, 'avc1', 'none')
+
+
+class TestFormatNegotiator(unittest.TestCase):
+    def setUp(self) -> None:
+        self.ydl = YoutubeDL({'quiet': True})
+
+    def tearDown(self) -> None:
+        self.ydl.close()
+
+    def video_info(self, *formats: dict, channel_id: str = 'channel1') -> dict:
+        return {'id': 'video1', 'channel_id': channel_id, 'formats': list(formats)}
+
+    def choose(self, negotiator: FormatNegotiator, video_info: dict, quality: str = '720') -> tuple[str, list[str]]:
+        choice = negotiator.choose(self.ydl, video_info, quality)
+        return choice.profile.name, [
+            requested['format_id'] for requested in choice.formats[0].get('requested_formats', choice.formats)
+        ]
+
+    def test_profiles(self):
+        self.assertEqual(
+            [profile.name for profile in FormatNegotiator(can_merge=True).profiles('1080')],
+            ['mp4', 'merged', 'single', 'any']
+        )
+        self.assertEqual(FormatNegotiator(can_merge=False).spec('480'), 'b[height<=480]/b')
+
+    def test_prefers_mp4_merged_with_audio(self):
+        video_info = self.video_info(
+            PROGRESSIVE_360, AUDIO_WEBM, AUDIO_M4A, VIDEO_720_WEBM, VIDEO_720_MP4, VIDEO_1080_MP4
+        )
+        self.assertEqual(self.choose(FormatNegotiator(can_merge=True), video_info), ('mp4', ['136', '140']))
+
+    def test_falls_back_without_extra_requests(self):
+        negotiator = FormatNegotiator(can_merge=True)
+        self.assertEqual(
+            self.choose(negotiator, self.video_info(PROGRESSIVE_360, AUDIO_WEBM, VIDEO_720_WEBM)),
+            ('merged', ['247', '251'])
+        )
+        self.assertEqual(
+            self.choose(FormatNegotiator(can_merge=False), self.video_info(PROGRESSIVE_360, AUDIO_M4A, VIDEO_720_MP4)),
+            ('single', ['18'])
+        )
+        self.assertEqual(self.choose(negotiator, self.video_info(PROGRESSIVE_360), '240'), ('any', ['18']))
+
+    def test_remembers_working_profile_per_channel(self):
+        negotiator = FormatNegotiator(can_merge=True)
+        video_info = self.video_info(PROGRESSIVE_360, AUDIO_M4A, PROGRESSIVE_720, VIDEO_720_MP4)
+        single = negotiator.profiles('720')[2]
+
+        negotiator.remember(video_info, '720', single)
+
+        # As high as the ladder's pick and needs no merge, so it wins the tie.
+        self.assertEqual(self.choose(negotiator, video_info), ('single', ['22']))
+        self.assertEqual(self.choose(negotiator, video_info, '1080'), ('mp4', ['136', '140']))
+        other_channel = self.video_info(
+            PROGRESSIVE_360, AUDIO_M4A, PROGRESSIVE_720, VIDEO_720_MP4, channel_id='channel2'
+        )
+        self.assertEqual(self.choose(negotiator, other_channel), ('mp4', ['136', '140']))
+
+        negotiator.forget(video_info, '720')
+        self.assertEqual(self.choose(negotiator, video_info), ('mp4', ['136', '140']))
+
+    def test_remembered_profile_never_lowers_quality(self):
+        negotiator = FormatNegotiator(can_merge=True)
+        progressive_1080 = video_format('37', 'mp4', 1080, 'avc1', 'mp4a')
+        video_info = self.video_info(PROGRESSIVE_360, AUDIO_M4A, VIDEO_720_MP4, progressive_1080)
+
+        negotiator.remember(video_info, '720', negotiator.profiles('720')[2])
+        self.assertEqual(self.choose(negotiator, video_info), ('mp4', ['136', '140']))
+
+        negotiator.remember(video_info, '720', negotiator.profiles('720')[3])
+        self.assertEqual(self.choose(negotiator, video_info), ('mp4', ['136', '140']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import logging
+import os
+import tempfile
+import unittest
+from logging.handlers import QueueHandler
+from ytracker.logger import Logger
+
+
+class TestLogger(unittest.TestCase):
+    def setUp(self) -> None:
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.log_dir.name, 'logs', 'ytracker.log')
+
+    def tearDown(self) -> None:
+        Logger().configure('DEBUG', 10)
+        self.log_dir.cleanup()
+
+    def read_log(self) -> str:
+        with open(self.log_path, 'r') as log_file:
+            return log_file.read()
+
+    def test_handlers_are_set_up_once(self):
+        first = Logger(self.log_path)
+        second = Logger(self.log_path)
+        handlers = logging.getLogger('ytracker').handlers
+        self.assertEqual(sum(isinstance(handler, QueueHandler) for handler in handlers), 1)
+
+        first.info('first message')
+        second.info('second message')
+        second.flush()
+        log = self.read_log()
+        self.assertEqual(log.count('first message'), 1)
+        self.assertEqual(log.count('second message'), 1)
+
+    def test_level(self):
+        logger = Logger(self.log_path).configure('WARNING')
+        logger.info('quiet')
+        logger.warning('loud')
+        logger.flush()
+        log = self.read_log()
+        self.assertNotIn('quiet', log)
+        self.assertIn('loud', log)
+
+    def test_rotation(self):
+        logger = Logger(self.log_path).configure('DEBUG', 1)
+        for _ in range(1200):
+            logger.info('x' * 1000)
+        logger.flush()
+        self.assertTrue(os.path.isfile(f'{self.log_path}.1'))
+        self.assertLessEqual(os.path.getsize(self.log_path), 1024 * 1024)
+
+    def test_fork(self):
+        logger = Logger(self.log_path)
+        pid = os.fork()
+        if pid == 0:
+            logger.info('from child')
+            logger.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        logger.info('from parent')
+        logger.flush()
+        log = self.read_log()
+        self.assertIn('from child', log)
+        self.assertIn('from parent', log)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import urllib.request
+from ytracker.logger import Logger
+from ytracker.metrics import Counter, Gauge, Histogram, MetricsServer, Registry
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.registry = Registry()
+        self.counter = self.registry.register(Counter('test_scans_total', 'Scans.'))
+        self.gauge = self.registry.register(Gauge('test_used_bytes', 'Used bytes.'))
+        self.histogram = self.registry.register(Histogram('test_duration_seconds', 'Duration.', buckets=(1, 5)))
+
+    def test_render(self):
+        self.counter.inc(status='ok')
+        self.counter.inc(2, status='ok')
+        self.counter.inc(status='say "hi"')
+        self.gauge.set(1024)
+        self.histogram.observe(0.5)
+        self.histogram.observe(3)
+        self.histogram.observe(10)
+
+        self.assertEqual(self.counter.value(status='ok'), 3)
+        self.assertEqual(self.histogram.count(), 3)
+        self.assertEqual(self.registry.render(), '\n'.join((
+            '# HELP test_scans_total Scans.',
+            '# TYPE test_scans_total counter',
+            'test_scans_total{status="ok"} 3',
+            'test_scans_total{status="say \\"hi\\""} 1',
+            '# HELP test_used_bytes Used bytes.',
+            '# TYPE test_used_bytes gauge',
+            'test_used_bytes 1024',
+            '# HELP test_duration_seconds Duration.',
+            '# TYPE test_duration_seconds histogram',
+            'test_duration_seconds_bucket{le="1"} 1',
+            'test_duration_seconds_bucket{le="5"} 2',
+            'test_duration_seconds_bucket{le="+Inf"} 3',
+            'test_duration_seconds_sum 13.5',
+            'test_duration_seconds_count 3',
+        )) + '\n')
+
+    def test_server(self):
+        self.gauge.set(7)
+        server = MetricsServer(0, Logger(), self.registry).start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                self.assertEqual(response.status, 200)
+                self.assertIn('test_used_bytes 7', response.read().decode())
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+from ytracker.logger import Logger
+from ytracker.profiling import CycleProfiler
+
+
+def busy_worker(result: list) -> None:
+    result.append(sum(i * i for i in range(20000)))
+
+
+def cycle() -> None:
+    result = []
+    thread = threading.Thread(target=busy_worker, args=(result,))
+    thread.start()
+    thread.join()
+    allocations = [bytearray(1024) for _ in range(100)]
+    assert result and allocations
+
+
+class TestCycleProfiler(unittest.TestCase):
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as report_dir:
+            report = CycleProfiler(Logger(), report_dir).run(cycle, save_pstats=True)
+
+            self.assertTrue(report.report_path.startswith(report_dir))
+            with open(report.report_path, 'r') as report_file:
+                text = report_file.read()
+            self.assertIn('2 threads profiled', text)
+            self.assertIn('by cumulative time', text)
+            self.assertIn('busy_worker', text)
+            self.assertIn('test_profiling.py', text.split('allocation sites')[1])
+            self.assertGreater(report.peak_memory, 100 * 1024)
+
+            stats = pstats.Stats(report.pstats_path)
+            self.assertTrue(any(function[2] == 'busy_worker' for function in stats.stats))
+
+        self.assertIsNone(CycleProfiler(Logger(), report_dir).run(cycle).pstats_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
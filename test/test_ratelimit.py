@@ -0,0 +1,122 @@
+import threading
+import time
+import unittest
+from datetime import datetime
+from ytracker.config import Options
+from ytracker.ratelimit import BandwidthLimiter, RateLimitWindow, TokenBucket
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self) -> float:
+        with self.lock:
+            return self.now
+
+    def sleep(self, seconds: float) -> None:
+        with self.lock:
+            self.now += seconds
+
+
+def fake_byte_source(total: int, chunk_size: int, name: str = 'video', resumed: int = 0):
+    """
+    Yields yt-dlp style progress reports of a download receiving `total` bytes,
+    continuing a partial file of `resumed` bytes.
+    """
+    downloaded = resumed
+    total += resumed
+    while downloaded < total:
+        downloaded = min(total, downloaded + chunk_size)
+        yield {'status': 'downloading', 'downloaded_bytes': downloaded, 'tmpfilename': f'{name}.mp4.part'}
+    yield {'status': 'finished', 'downloaded_bytes': total, 'filename': f'{name}.mp4'}
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_consume(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1000, clock=clock, sleep=clock.sleep)
+        self.assertEqual(bucket.consume(1000), 0)
+        self.assertEqual(bucket.consume(500), 0.5)
+        self.assertEqual(clock.now, 0.5)
+
+    def test_unlimited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(0, clock=clock, sleep=clock.sleep)
+        self.assertEqual(bucket.consume(10 ** 9), 0)
+        self.assertEqual(clock.now, 0)
+
+
+class TestBandwidthLimiter(unittest.TestCase):
+    def test_shared_limit(self):
+        clock = FakeClock()
+        limiter = BandwidthLimiter(TokenBucket(0, clock=clock, sleep=clock.sleep))
+        limiter.configure(100_000)
+
+        sources = [fake_byte_source(250_000, 16_384, f'video{number}') for number in range(4)]
+        while sources:
+            for source in list(sources):
+                progress = next(source, None)
+                if progress is None:
+                    sources.remove(source)
+                else:
+                    limiter.progress_hook(progress)
+
+        # 1 MB at 100 kB/s, starting with an empty bucket, less the uncharged first chunks
+        self.assertAlmostEqual(clock.now, (1_000_000 - 4 * 16_384) / 100_000, delta=0.01)
+
+    def test_resumed_download(self):
+        clock = FakeClock()
+        limiter = BandwidthLimiter(TokenBucket(0, clock=clock, sleep=clock.sleep))
+        limiter.configure(100_000)
+
+        for progress in fake_byte_source(200_000, 10_000, resumed=50_000_000):
+            limiter.progress_hook(progress)
+
+        # Only the bytes received after the first report are charged, not the 50 MB on disk.
+        self.assertAlmostEqual(clock.now, 1.9, delta=0.01)
+
+    def test_shared_limit_across_threads(self):
+        limiter = BandwidthLimiter()
+        limiter.configure(400_000)
+
+        def download(name: str) -> None:
+            for progress in fake_byte_source(150_000, 8_192, name):
+                limiter.progress_hook(progress)
+
+        threads = [threading.Thread(target=download, args=(f'video{number}',)) for number in range(4)]
+        started_at = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # 600 kB at 400 kB/s, starting with an empty bucket
+        self.assertGreaterEqual(time.monotonic() - started_at, 1.4)
+
+    def test_schedule(self):
+        moment = datetime(2023, 10, 6, 12, 0)
+        limiter = BandwidthLimiter(now=lambda: moment)
+        limiter.configure(0, (
+            RateLimitWindow.create({'start': '09:00', 'end': '17:00', 'rate_limit': 500}),
+            RateLimitWindow.create({'start': '22:00', 'end': '06:00', 'rate_limit': 100}),
+        ))
+        self.assertEqual(limiter.current_rate_limit(), 500)
+        moment = datetime(2023, 10, 6, 23, 30)
+        self.assertEqual(limiter.current_rate_limit(), 100)
+        moment = datetime(2023, 10, 6, 18, 0)
+        self.assertEqual(limiter.current_rate_limit(), 0)
+
+    def test_options(self):
+        options = Options.create(rate_limit_schedule=[
+            {'start': '09:00', 'end': '17:00', 'rate_limit': '500'},
+            {'start': 'noon', 'end': '17:00', 'rate_limit': 1},
+            {'end': '17:00'},
+        ])
+        self.assertEqual(options.rate_limit_schedule, (RateLimitWindow('09:00', '17:00', 500),))
+        self.assertEqual(Options.create().rate_limit, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
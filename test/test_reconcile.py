@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from helpers import remove_db
+from ytracker.config import Config, Options
+from ytracker.database import DownloadJob, YouTubeVideo
+from ytracker.logger import Logger
+from ytracker.reconcile import Reconciler
+
+
+class TestReconciler(unittest.TestCase):
+    def setUp(self) -> None:
+        remove_db()
+        self.download_path = tempfile.mkdtemp()
+        self.config = Config(Options.create(download_path=self.download_path))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.download_path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    def create_file(self, name: str, size: int, age: float = 0) -> str:
+        path = os.path.join(self.download_path, name)
+        with open(path, 'wb') as file:
+            file.write(b'0' * size)
+        if age:
+            modified_at = time.time() - age
+            os.utime(path, (modified_at, modified_at))
+        return path
+
+    def test_run(self):
+        kept = self.create_file('20231001_Some_Uploader_aaaaaaaaaaa.mp4', 10)
+        renamed = self.create_file('20231002_Uploader_bbbbbbbbbbb.webm', 20)
+        orphan = self.create_file('20231003_Mr. Uploader_ccccccccccc.mkv', 30)
+        resumable = self.create_file('20231004_Uploader_ddddddddddd.f137.mp4.part', 5)
+        leftover = self.create_file('20231001_Some_Uploader_aaaaaaaaaaa.f251.webm', 5)
+        abandoned = self.create_file('20231005_Uploader_eeeeeeeeeee.mp4.part', 5, age=30 * 24 * 3600)
+        self.create_file('notes.txt', 1)
+        thumbnail = self.create_file('20231001_Some_Uploader_aaaaaaaaaaa.webp', 50)
+        self.create_file('20231001_Some_Uploader_aaaaaaaaaaa.en.vtt', 50)
+        self.create_file('20231006_Uploader_ggggggggggg.jpg', 50)
+        self.create_file('20231006_Uploader_ggggggggggg.info.json', 50)
+
+        YouTubeVideo().set_youtube_video_id('aaaaaaaaaaa').set_path_on_disk(kept).set_file_size(1).save()
+        YouTubeVideo().set_youtube_video_id('bbbbbbbbbbb').set_path_on_disk(renamed[:-5] + '.mp4') \
+            .set_file_size(20).save()
+        YouTubeVideo().set_youtube_video_id('fffffffffff').set_path_on_disk('/gone.mp4').set_file_size(40).save()
+
+        report = Reconciler(self.config, Logger()).run()
+
+        self.assertEqual(report.adopted, 1)
+        self.assertEqual(report.corrected, 2)
+        self.assertEqual(report.marked_deleted, 1)
+        self.assertEqual(report.removed_partials, 2)
+        self.assertEqual(report.resumable, ['ddddddddddd'])
+
+        self.assertEqual(YouTubeVideo.find_by_video_id('aaaaaaaaaaa').file_size, 10)
+        self.assertEqual(YouTubeVideo.find_by_video_id('bbbbbbbbbbb').path_on_disk, renamed)
+        self.assertEqual(YouTubeVideo.find_by_video_id('ccccccccccc').path_on_disk, orphan)
+        self.assertTrue(YouTubeVideo.find_by_video_id('fffffffffff').deleted)
+        self.assertEqual(YouTubeVideo.get_sum_file_size(), 60)
+        self.assertTrue(os.path.isfile(resumable))
+        self.assertFalse(os.path.isfile(leftover))
+        self.assertFalse(os.path.isfile(abandoned))
+        self.assertTrue(os.path.isfile(thumbnail))
+        self.assertIsNone(YouTubeVideo.find_by_video_id('ggggggggggg'))
+
+    def test_adopted_channel(self):
+        self.create_file('20231001_Uploader_aaaaaaaaaaa.mp4', 10)
+        self.create_file('20231002_Uploader_bbbbbbbbbbb.mp4', 20)
+        DownloadJob.enqueue('https://www.youtube.com/watch?v=aaaaaaaaaaa', channel='https://www.youtube.com/@channel')
+        DownloadJob.enqueue('https://www.youtube.com/watch?v=bbbbbbbbbbb')
+
+        self.assertEqual(Reconciler(self.config, Logger()).run().adopted, 2)
+
+        self.assertEqual(YouTubeVideo.find_by_video_id('aaaaaaaaaaa').channel, 'https://www.youtube.com/@channel')
+        self.assertIsNone(YouTubeVideo.find_by_video_id('bbbbbbbbbbb').channel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import json
+import os
+import tempfile
+import unittest
+from ytracker.config import Config, Options
+from ytracker.logger import Logger
+from ytracker.reload import Reloader
+
+
+class WatchingReloader(Reloader):
+    WATCH_INTERVAL = 0
+
+
+class TestReloader(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.conf_path = os.path.join(self.directory.name, 'config.json')
+        self.urls_path = os.path.join(self.directory.name, 'ytracker_urls.txt')
+        self.write_config(storage_size=5, video_quality='720')
+        self.write_urls('https://www.youtube.com/@a/videos', 'https://www.youtube.com/@b/videos')
+        self.config = Config(Config.load_options(Logger(), self.conf_path))
+        self.reloader = WatchingReloader(self.config, Logger(), self.conf_path, self.urls_path)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def write_config(self, **config_data) -> None:
+        with open(self.conf_path, 'w') as conf_file:
+            json.dump(config_data, conf_file)
+
+    def write_urls(self, *urls: str) -> None:
+        with open(self.urls_path, 'w') as urls_file:
+            urls_file.write('\n'.join(urls))
+        # Make sure the stamp changes even on file systems with coarse mtimes.
+        stat = os.stat(self.urls_path)
+        os.utime(self.urls_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_unchanged(self):
+        self.assertFalse(self.reloader.pending())
+        result = self.reloader.reload()
+        self.assertFalse(result.config_changed)
+        self.assertFalse(result.channels_changed)
+
+        os.utime(self.conf_path)
+        self.write_urls('https://www.youtube.com/@a/videos', 'https://www.youtube.com/@b/videos')
+        self.assertTrue(self.reloader.pending())
+        result = self.reloader.reload()
+        self.assertFalse(result.config_changed)
+        self.assertFalse(result.channels_changed)
+        self.assertFalse(self.reloader.pending())
+
+    def test_channels(self):
+        self.write_urls('https://www.youtube.com/@b/videos', 'https://www.youtube.com/@c/videos')
+        self.assertTrue(self.reloader.pending())
+        result = self.reloader.reload()
+        self.assertTrue(result.channels_changed)
+        self.assertEqual(
+            self.reloader.channel_urls,
+            ('https://www.youtube.com/@b/videos', 'https://www.youtube.com/@c/videos')
+        )
+
+        self.write_urls('not a channel')
+        self.assertFalse(self.reloader.reload().channels_changed)
+        self.assertEqual(len(self.reloader.channel_urls), 2)
+
+    def test_config(self):
+        options = self.config.options
+        self.write_config(storage_size=50, video_quality='1080')
+        self.reloader.request()
+        self.assertTrue(self.reloader.pending())
+        result = self.reloader.reload()
+        self.assertIs(result.previous_options, options)
+        self.assertEqual(self.config.options.storage_size, 50)
+        self.assertEqual(self.config.options.video_quality, '1080')
+
+        with open(self.conf_path, 'w') as conf_file:
+            conf_file.write('{"storage_size": ')
+        self.reloader.request()
+        self.assertFalse(self.reloader.reload().config_changed)
+        self.assertEqual(self.config.options.storage_size, 50)
+
+        self.write_config(storage_size='lots')
+        self.reloader.request()
+        self.assertFalse(self.reloader.reload().config_changed)
+        self.assertIsInstance(self.config.options, Options)
+        self.assertEqual(self.config.options.storage_size, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
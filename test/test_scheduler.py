@@ -0,0 +1,62 @@
+import unittest
+from helpers import remove_db
+from ytracker.config import Config, Options
+from ytracker.database import Channel
+from ytracker.logger import Logger
+from ytracker.scheduler import ChannelScheduler
+
+
+class TestChannelScheduler(unittest.TestCase):
+    def setUp(self):
+        remove_db()
+        self.config = Config(Options.create(
+            refresh_interval=2,
+            min_refresh_interval=1,
+            max_refresh_interval=8
+        ))
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    def test_sync(self):
+        scheduler = ChannelScheduler(self.config, Logger())
+        scheduler.sync(('https://www.youtube.com/@a', 'https://www.youtube.com/@b'), now=1000)
+        self.assertEqual(sorted(scheduler.due(now=1000)), ['https://www.youtube.com/@a', 'https://www.youtube.com/@b'])
+        self.assertEqual(scheduler.due(now=1000), ())
+
+        scheduler.sync(('https://www.youtube.com/@b',), now=1000)
+        self.assertIsNone(Channel.find_by_url('https://www.youtube.com/@a'))
+        self.assertEqual(scheduler.seconds_until_next(now=1000), 7200)
+
+    def test_check_all_now(self):
+        scheduler = ChannelScheduler(self.config, Logger())
+        scheduler.sync(('https://www.youtube.com/@a', 'https://www.youtube.com/@b'), now=1000)
+        scheduler.due(now=1000)
+        self.assertEqual(scheduler.due(now=2000), ())
+
+        scheduler.check_all_now(now=2000)
+        self.assertEqual(sorted(scheduler.due(now=2000)), ['https://www.youtube.com/@a', 'https://www.youtube.com/@b'])
+        self.assertEqual(scheduler.seconds_until_next(now=2000), 7200)
+
+    def test_record(self):
+        scheduler = ChannelScheduler(self.config, Logger())
+        scheduler.sync(('https://www.youtube.com/@quiet', 'https://www.youtube.com/@busy'), now=0)
+        scheduler.due(now=0)
+
+        scheduler.record('https://www.youtube.com/@quiet', 0, now=0)
+        scheduler.record('https://www.youtube.com/@busy', 4, now=0)
+        self.assertEqual(Channel.find_by_url('https://www.youtube.com/@quiet').check_interval, 10800)
+        self.assertEqual(Channel.find_by_url('https://www.youtube.com/@busy').check_interval, 4500)
+        self.assertEqual(scheduler.due(now=4500), ('https://www.youtube.com/@busy',))
+
+        for _ in range(10):
+            scheduler.record('https://www.youtube.com/@quiet', 0)
+        self.assertEqual(Channel.find_by_url('https://www.youtube.com/@quiet').check_interval, 8 * 3600)
+
+        reloaded = ChannelScheduler(self.config, Logger())
+        self.assertEqual(reloaded.due(now=4500), ('https://www.youtube.com/@busy',))
+
+
+if __name__ == '__main__':
+    unittest.main()
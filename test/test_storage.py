@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+from helpers import remove_db
+from ytracker.config import Config, Options
+from ytracker.database import YouTubeVideo
+from ytracker.logger import Logger
+from ytracker.storage import StoragePolicy
+from ytracker.utils import convert_gb_to_bytes
+
+GB = convert_gb_to_bytes(1)
+
+
+class TestStoragePolicy(unittest.TestCase):
+    def setUp(self) -> None:
+        remove_db()
+        self.download_path = tempfile.mkdtemp()
+        self.logger = Logger()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.download_path)
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    def policy(self, **options) -> StoragePolicy:
+        config = Config(Options.create(download_path=self.download_path, **options))
+        return StoragePolicy(config, self.logger)
+
+    def save_video(self, video_id: str, file_size: int) -> None:
+        YouTubeVideo() \
+            .set_youtube_video_id(video_id) \
+            .set_path_on_disk(os.path.join(self.download_path, f'{video_id}.mp4')) \
+            .set_file_size(file_size) \
+            .save()
+
+    def test_quota_usage(self):
+        self.save_video('a', GB // 2)
+
+        usage = self.policy(storage_size=2).usage()
+
+        self.assertEqual(usage.used, GB // 2)
+        self.assertEqual(usage.limit, 2 * GB)
+        self.assertEqual(usage.bytes_over, -GB - GB // 2)
+
+    def test_free_space_usage(self):
+        self.save_video('a', 1000)
+        stat = os.statvfs(self.download_path)
+        total = stat.f_blocks * stat.f_frsize
+        keep_free = int(total * 10 / 100)
+
+        usage = self.policy(storage_mode='free_space', min_free_space=0, min_free_percent=10).usage()
+
+        free = stat.f_bavail * stat.f_frsize
+        self.assertEqual(usage.used, 1000)
+        # Other processes may write to the disk meanwhile, so allow some slack.
+        self.assertAlmostEqual(usage.limit, 1000 + free - keep_free, delta=64 * 1024 * 1024)
+
+    def test_free_space_of_missing_download_path(self):
+        config = Config(Options.create(
+            download_path=os.path.join(self.download_path, 'not', 'created'),
+            storage_mode='free_space',
+            min_free_space=0
+        ))
+
+        usage = StoragePolicy(config, self.logger).usage()
+
+        self.assertGreater(usage.limit, 0)
+
+    def test_room_for_evicts_ahead_of_download(self):
+        self.save_video('a', GB // 2)
+        self.save_video('b', GB // 2)
+        policy = self.policy(storage_size=1)
+
+        with policy.room_for(GB // 4) as fits:
+            self.assertTrue(fits)
+            self.assertEqual(policy.usage().used, GB // 2)
+
+    def test_room_for_counts_reserved_downloads(self):
+        policy = self.policy(storage_size=1)
+
+        with policy.room_for(GB // 2) as first:
+            with policy.room_for(GB // 2) as second:
+                with policy.room_for(1) as third:
+                    self.assertTrue(first)
+                    self.assertTrue(second)
+                    self.assertFalse(third)
+
+        with policy.room_for(GB) as fits:
+            self.assertTrue(fits)
+
+    def test_room_for_reads_usage_once(self):
+        policy = self.policy(storage_size=1)
+
+        with policy.room_for(GB // 2) as fits:
+            self.assertTrue(fits)
+        # Saved by the consumer meanwhile, counted through add() instead.
+        self.save_video('a', GB // 2)
+        policy.add(GB // 2)
+
+        with policy.room_for(GB // 2) as fits:
+            self.assertTrue(fits)
+            self.assertEqual(policy.usage().used, GB // 2)
+        with policy.room_for(GB // 2 + 1) as fits:
+            self.assertTrue(fits)
+            self.assertTrue(YouTubeVideo.find_by_video_id('a').deleted)
+
+    def test_free_space_reserves_nothing(self):
+        policy = self.policy(storage_mode='free_space', min_free_space=0, min_free_percent=0)
+
+        with policy.room_for(1) as first:
+            with policy.room_for(1) as second:
+                self.assertTrue(first)
+                self.assertTrue(second)
+                self.assertEqual(policy._reserved, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
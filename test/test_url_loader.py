@@ -1,6 +1,6 @@
 import os
 import unittest
-from ytracker.utils import load_urls, is_valid_youtube_url
+from ytracker.utils import load_urls, is_valid_youtube_url, video_id_of
 from ytracker.exception import ProgramShouldExit
 
 
@@ -36,6 +36,13 @@ class TestUrlLoader(unittest.TestCase):
         self.assertFalse(result2)
         self.assertTrue(not result2)
 
+    def test_video_id_of(self):
+        self.assertEqual(video_id_of('https://www.youtube.com/watch?v=aaaaaaaaaaa'), 'aaaaaaaaaaa')
+        self.assertEqual(video_id_of('https://www.youtube.com/watch?list=x&v=a-_aaaaaaaa'), 'a-_aaaaaaaa')
+        self.assertEqual(video_id_of('https://www.youtube.com/shorts/aaaaaaaaaaa'), 'aaaaaaaaaaa')
+        self.assertIsNone(video_id_of('https://www.youtube.com/@some-channel'))
+        self.assertIsNone(video_id_of('from-last-run'))
+
     def test_load_urls(self):
         result = load_urls('urls.txt')
         self.assertIsInstance(result, tuple)
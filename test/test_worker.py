@@ -0,0 +1,252 @@
+import threading
+import time
+import unittest
+from typing import Iterable
+from helpers import remove_db
+from ytracker.control import DaemonState
+from ytracker.database import DownloadedIndex, DownloadJob, JobStatus, YouTubeVideo
+from ytracker.fetch import VideoInfo
+from ytracker.logger import Logger
+from ytracker.worker import DownloadPool
+
+
+class TestDownloadPool(unittest.TestCase):
+    def setUp(self) -> None:
+        remove_db()
+        DaemonState._instance = None
+        DownloadedIndex._instance = None
+
+    def tearDown(self) -> None:
+        DaemonState._instance = None
+        DownloadedIndex._instance = None
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        remove_db()
+
+    @staticmethod
+    def save(results: Iterable[VideoInfo | bool]) -> list[VideoInfo | bool]:
+        saved = []
+        for result in results:
+            if isinstance(result, VideoInfo):
+                YouTubeVideo() \
+                    .set_youtube_video_id(result.video_id) \
+                    .set_path_on_disk(result.path_on_disk) \
+                    .set_file_size(result.file_size) \
+                    .save()
+            saved.append(result)
+        return saved
+
+    def test_run(self):
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def download(video_url: str) -> VideoInfo | bool:
+            with lock:
+                active.append(video_url)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(video_url)
+            if video_url == 'broken':
+                raise RuntimeError('broken download')
+            return VideoInfo(video_url, f'/videos/{video_url}.mp4', 1)
+
+        DownloadJob.enqueue('from-last-run')
+        urls = ['id1', None, 'id2', 'broken', 'id3', 'id4', 'id1']
+        results = self.save(DownloadPool(download, 3, Logger()).run((url, 'channel') for url in urls))
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(results.count(False), 1)
+        self.assertEqual(
+            sorted(result.video_id for result in results if isinstance(result, VideoInfo)),
+            ['from-last-run', 'id1', 'id2', 'id3', 'id4']
+        )
+        self.assertEqual(
+            {result.video_id: result.channel for result in results if isinstance(result, VideoInfo)}['id1'],
+            'channel'
+        )
+        self.assertLessEqual(max(peak), 3)
+        self.assertGreater(max(peak), 1)
+
+        self.assertEqual(DownloadJob.count(JobStatus.DONE), 5)
+        broken = DownloadJob.find_by_video_url('broken')
+        self.assertEqual(broken.status, JobStatus.QUEUED.value)
+        self.assertEqual(broken.attempts, 1)
+        self.assertGreater(broken.next_attempt_at, time.time())
+
+    def test_run_skips_videos_already_saved(self):
+        downloaded = []
+        video_url = 'https://www.youtube.com/watch?v=aaaaaaaaaaa'
+        DownloadJob.enqueue(video_url)
+        DownloadJob.claim()
+        YouTubeVideo().set_youtube_video_id('aaaaaaaaaaa').set_path_on_disk('/videos/a.mp4').set_file_size(1).save()
+        DownloadJob.requeue_running()
+
+        results = list(DownloadPool(lambda url: downloaded.append(url) or False, 1, Logger()).run(()))
+
+        self.assertEqual(results, [])
+        self.assertEqual(downloaded, [])
+        self.assertEqual(DownloadJob.find_by_video_url(video_url).status, JobStatus.DONE.value)
+
+    def test_run_finishes_saved_videos_only(self):
+        DownloadJob.enqueue('id1')
+        results = list(DownloadPool(lambda video_url: VideoInfo(video_url, video_url, 1), 1, Logger()).run(()))
+
+        self.assertEqual(len(results), 1)
+        job = DownloadJob.find_by_video_url('id1')
+        self.assertEqual(job.status, JobStatus.QUEUED.value)
+        self.assertEqual(job.last_error, 'Not saved to download history')
+
+    def test_run_stops_early(self):
+        pool = DownloadPool(lambda video_url: VideoInfo(video_url, video_url), 2, Logger())
+        results = pool.run((f'id{number}', None) for number in range(100))
+        self.assertIsInstance(next(results), VideoInfo)
+        results.close()
+
+    def test_stop(self):
+        started = threading.Barrier(3)
+
+        def download(video_url: str) -> VideoInfo | bool:
+            started.wait()
+            time.sleep(0.2)
+            if DaemonState.get().grace_expired():
+                return False
+            return VideoInfo(video_url, f'/videos/{video_url}.mp4', 1)
+
+        for video_url in ('id1', 'id2', 'id3', 'id4'):
+            DownloadJob.enqueue(video_url)
+        results = DownloadPool(download, 2, Logger()).run(())
+
+        def stop() -> None:
+            # Both workers hold a claim before the stop, so the other two jobs are the ones left queued.
+            started.wait()
+            DaemonState.get().stop(5)
+
+        threading.Thread(target=stop).start()
+
+        self.assertEqual(len([result for result in self.save(results) if isinstance(result, VideoInfo)]), 2)
+        self.assertEqual(DownloadJob.count(JobStatus.DONE), 2)
+        self.assertEqual(DownloadJob.count(JobStatus.QUEUED), 2)
+
+    def test_stop_after_grace_period(self):
+        started = threading.Barrier(3)
+
+        def download(video_url: str) -> VideoInfo | bool:
+            started.wait()
+            time.sleep(0.2)
+            if video_url == 'broken':
+                return False
+            DaemonState.get().cancel_hook({})
+            return VideoInfo(video_url, f'/videos/{video_url}.mp4', 1)
+
+        DownloadJob.enqueue('id1', now=0)
+        DownloadJob.enqueue('broken', now=1)
+        results = DownloadPool(download, 2, Logger()).run(())
+
+        def stop() -> None:
+            # Both workers are downloading before the stop, so neither claim is cut short.
+            started.wait()
+            DaemonState.get().stop(0)
+
+        threading.Thread(target=stop).start()
+
+        self.assertEqual(list(results), [False, False])
+        job = DownloadJob.find_by_video_url('id1')
+        self.assertEqual(job.status, JobStatus.QUEUED.value)
+        self.assertEqual(job.attempts, 0)
+        self.assertLessEqual(job.next_attempt_at, time.time())
+        broken = DownloadJob.find_by_video_url('broken')
+        self.assertEqual(broken.attempts, 1)
+        self.assertGreater(broken.next_attempt_at, time.time())
+
+    def test_abandon(self):
+        class AbandoningPool(DownloadPool):
+            ABANDON_AFTER = 0
+
+        started = threading.Event()
+        finish = threading.Event()
+
+        def download(video_url: str) -> VideoInfo | bool:
+            started.set()
+            finish.wait(5)
+            return False
+
+        DownloadJob.enqueue('id1')
+        results = AbandoningPool(download, 1, Logger()).run(())
+        threading.Thread(target=lambda: started.wait() and DaemonState.get().stop(0)).start()
+
+        self.assertEqual(list(results), [])
+        self.assertTrue(DownloadPool.abandoned_alive())
+        finish.set()
+        for thread in DownloadPool._abandoned:
+            thread.join()
+        self.assertFalse(DownloadPool.abandoned_alive())
+
+
+class TestDownloadJob(unittest.TestCase):
+    def setUp(self) -> None:
+        remove_db()
+
+    def test_claim(self):
+        self.assertTrue(DownloadJob.enqueue('id1', now=10))
+        self.assertFalse(DownloadJob.enqueue('id1', now=10))
+        self.assertTrue(DownloadJob.enqueue('id2', now=20))
+
+        self.assertIsNone(DownloadJob.claim(now=5))
+        job = DownloadJob.claim(now=30)
+        self.assertEqual(job.video_url, 'id1')
+        self.assertEqual(job.status, JobStatus.RUNNING.value)
+        self.assertEqual(DownloadJob.claim(now=30).video_url, 'id2')
+        self.assertIsNone(DownloadJob.claim(now=30))
+
+        self.assertEqual(DownloadJob.requeue_running(), 2)
+        self.assertEqual(DownloadJob.count(JobStatus.QUEUED), 2)
+
+    def test_fail(self):
+        DownloadJob.enqueue('id1', now=0)
+        for attempt in range(DownloadJob.MAX_ATTEMPTS):
+            job = DownloadJob.claim(now=10 ** 9)
+            self.assertEqual(job.attempts, attempt + 1)
+            job.fail('error', now=0)
+        self.assertEqual(DownloadJob.find_by_video_url('id1').status, JobStatus.FAILED.value)
+        self.assertIsNone(DownloadJob.next_ready_at())
+
+        self.assertFalse(DownloadJob.enqueue('id1', now=DownloadJob.FAILED_COOLDOWN - 1))
+        self.assertTrue(DownloadJob.enqueue('id1', now=DownloadJob.FAILED_COOLDOWN))
+        job = DownloadJob.find_by_video_url('id1')
+        self.assertEqual(job.status, JobStatus.QUEUED.value)
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(DownloadJob.next_ready_at(), DownloadJob.FAILED_COOLDOWN)
+
+    def test_requeue_failed(self):
+        now = time.time()
+        DownloadJob.enqueue('id1', now=0)
+        job = DownloadJob.claim(now=0)
+        job.attempts = DownloadJob.MAX_ATTEMPTS
+        job.fail('error', now=now)
+
+        self.assertEqual(DownloadJob.requeue_failed(now=now), 0)
+        self.assertEqual(DownloadJob.requeue_failed(now=now + DownloadJob.KEEP_FAILED + 1), 0)
+        self.assertEqual(DownloadJob.requeue_failed(now=now + DownloadJob.FAILED_COOLDOWN), 1)
+        job = DownloadJob.find_by_video_url('id1')
+        self.assertEqual(job.status, JobStatus.QUEUED.value)
+        self.assertEqual(job.attempts, 0)
+
+    def test_prune(self):
+        DownloadJob.enqueue('done', now=0)
+        DownloadJob.claim(now=0).finish(now=0)
+        DownloadJob.enqueue('failed', now=0)
+        job = DownloadJob.claim(now=0)
+        job.attempts = DownloadJob.MAX_ATTEMPTS
+        job.fail('error', now=0)
+        DownloadJob.enqueue('queued', now=0)
+
+        self.assertEqual(DownloadJob.prune(now=DownloadJob.KEEP_DONE + 1), 1)
+        self.assertEqual(DownloadJob.prune(now=DownloadJob.FAILED_COOLDOWN + DownloadJob.KEEP_FAILED + 1), 1)
+        self.assertEqual(DownloadJob.count(JobStatus.QUEUED), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
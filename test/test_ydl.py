@@ -0,0 +1,26 @@
+import unittest
+from ytracker.ydl import YoutubeDLPool
+
+
+class TestYoutubeDLPool(unittest.TestCase):
+    def test_acquire(self):
+        pool = YoutubeDLPool()
+        with pool.acquire(('flat-scan',), lambda: {'quiet': True}) as first:
+            with pool.acquire(('flat-scan',), lambda: {'quiet': True}) as second:
+                self.assertIsNot(first, second)
+        self.assertEqual(pool.created, 2)
+
+        with pool.acquire(('flat-scan',), lambda: {'quiet': True}) as reused:
+            self.assertIn(reused, (first, second))
+        with pool.acquire(('download', '720'), lambda: {'quiet': True, 'format': '22'}) as download:
+            self.assertEqual(download.params['format'], '22')
+        self.assertEqual(pool.created, 3)
+
+        pool.clear()
+        with pool.acquire(('flat-scan',), lambda: {'quiet': True}):
+            pass
+        self.assertEqual(pool.created, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -22,18 +22,24 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import os
+import signal
+import sqlite3
 import sys
+import time
 
 from typing import Union, Generator
 
 from ytracker.config import Config
+from ytracker.control import ControlServer, DaemonState, Stage, send_command
 from ytracker.daemon import Daemon, PidFileManager
-from ytracker.database import YouTubeVideo
+from ytracker.dedupe import Deduplicator
+from ytracker.database import DownloadedIndex, DownloadJob, JobStatus, Session, YouTubeVideo
+from ytracker.eviction import EvictionPlanner
 from ytracker.exception import ProgramShouldExit
+from ytracker.storage import StoragePolicy
 from ytracker.utils import (
     Command,
-    convert_gb_to_bytes,
-    delete_file,
     ExitCode,
     handle_should_exit_exception,
     load_urls,
@@ -43,26 +49,283 @@ from ytracker.utils import (
     sleep
 )
 from ytracker.logger import Logger
+from ytracker.metrics import CYCLE_DURATION, STORAGE_LIMIT, STORAGE_USED, MetricsServer
+from ytracker.profiling import CycleProfiler
+from ytracker.ratelimit import BandwidthLimiter
+from ytracker.reconcile import Reconciler
+from ytracker.reload import Reloader, ReloadResult
+from ytracker.scheduler import ChannelScheduler
 from ytracker.fetch import Urls, VideoFetcher, VideoInfo
+from ytracker.worker import DownloadPool
+from ytracker.ydl import YoutubeDLPool
 
 
-def download_video(logger: Logger, config: Config) -> Generator[Union[VideoInfo, bool], None, None]:
+def download_video(
+        logger: Logger,
+        config: Config,
+        scheduler: ChannelScheduler,
+        channel_urls: tuple
+) -> Generator[Union[VideoInfo, bool], None, None]:
+    state = DaemonState.get()
     try:
-        urls = load_urls()
+        scheduler.sync(channel_urls)
+        due_urls = scheduler.due() if not state.draining else ()
+        DownloadJob.requeue_failed()
+        next_job_at = DownloadJob.next_ready_at()
+        if not due_urls and (next_job_at is None or next_job_at > time.time()):
+            return
+        DownloadedIndex.get().reload()
     except ProgramShouldExit as should_exit:
         handle_should_exit_exception(should_exit, logger)
     else:
-        for video_url in Urls(urls, logger):
-            yield VideoFetcher(config, logger).download(video_url)
+        state.set_stage(Stage.SCANNING if due_urls else Stage.DOWNLOADING)
+        pool = DownloadPool(
+            VideoFetcher(config, logger).download,
+            config.options.download_workers,
+            logger
+        )
+        yield from pool.run(Urls(
+            due_urls,
+            logger,
+            config.options.scan_workers,
+            scheduler,
+            config.options.max_catch_up
+        ))
 
 
-def is_not_enough_space(logger: Logger, config: Config) -> bool:
+def seconds_until_next_cycle(scheduler: ChannelScheduler) -> float:
+    next_job_at = DownloadJob.next_ready_at()
+    if next_job_at is None:
+        return scheduler.seconds_until_next()
+    return max(0.0, min(scheduler.seconds_until_next(), next_job_at - time.time()))
+
+
+def prepare_queue(logger: Logger, config: Config) -> None:
+    """
+    Requeues jobs a previous run left unfinished, reconciles download_history
+    with download_path and queues partially downloaded videos to resume.
+    :param logger:
+    :param config:
+    :return:
+    """
+    try:
+        requeued = DownloadJob.requeue_running()
+        DownloadJob.prune()
+        report = Reconciler(config, logger).run()
+        for video_id in report.resumable:
+            DownloadJob.enqueue(f'https://www.youtube.com/watch?v={video_id}')
+        DaemonState.get().set_queued(DownloadJob.count(JobStatus.QUEUED))
+    except ProgramShouldExit as should_exit:
+        handle_should_exit_exception(should_exit, logger)
+    else:
+        if requeued:
+            logger.info(f'Resuming {requeued} interrupted downloads')
+
+
+def get_bytes_over_quota(logger: Logger, config: Config) -> int:
     try:
-        sum_file_size = YouTubeVideo.get_sum_file_size()
+        usage = StoragePolicy(config, logger).usage()
     except ProgramShouldExit as should_exit:
         handle_should_exit_exception(should_exit, logger)
     else:
-        return sum_file_size > convert_gb_to_bytes(config.options.storage_size)
+        STORAGE_USED.set(usage.used)
+        STORAGE_LIMIT.set(usage.limit)
+        DaemonState.get().set_storage(usage.used, usage.limit)
+        return usage.bytes_over
+
+
+def save_video(result: VideoInfo, logger: Logger, deduplicator: Deduplicator | None = None) -> None:
+    new_video = YouTubeVideo() \
+        .set_youtube_video_id(result.video_id) \
+        .set_path_on_disk(result.path_on_disk) \
+        .set_file_size(result.file_size) \
+        .set_upload_date(result.upload_date) \
+        .set_channel(result.channel)
+    try:
+        save_result = new_video.save()
+    except ProgramShouldExit as should_exit:
+        handle_should_exit_exception(should_exit, logger)
+    except sqlite3.IntegrityError:
+        # Saved by a run that died before finishing the download job.
+        logger.warning(f'Video already saved to database: {new_video.video_id}')
+        DownloadedIndex.get().add(new_video.video_id)
+    else:
+        if not save_result:
+            logger.error(f'Failed saving video to database: {new_video.path_on_disk}')
+        elif deduplicator is not None:
+            deduplicator.submit(new_video.video_id)
+
+
+def evict(logger: Logger, config: Config) -> None:
+    DaemonState.get().set_stage(Stage.EVICTING)
+    planner = EvictionPlanner(logger, config.options.eviction_policy)
+    if config.options.channel_limits:
+        try:
+            planner.evict_over_channel_limits(config.options.channel_limits)
+        except ProgramShouldExit as should_exit:
+            handle_should_exit_exception(should_exit, logger)
+    bytes_over_quota = get_bytes_over_quota(logger, config)
+    if bytes_over_quota > 0:
+        try:
+            planner.evict(bytes_over_quota)
+        except ProgramShouldExit as should_exit:
+            handle_should_exit_exception(should_exit, logger)
+        get_bytes_over_quota(logger, config)
+
+
+def run_cycle(
+        logger: Logger,
+        config: Config,
+        scheduler: ChannelScheduler,
+        channel_urls: tuple,
+        deduplicator: Deduplicator | None = None
+) -> None:
+    """
+    Scans due channels, downloads queued videos and evicts videos over the quota.
+    :param logger:
+    :param config:
+    :param scheduler:
+    :param channel_urls: Channels to track, added to or removed from the schedule first.
+    :param deduplicator: Checks saved videos for duplicates in the background.
+    :return:
+    """
+    with CYCLE_DURATION.time():
+        for result in download_video(logger, config, scheduler, channel_urls):
+            if isinstance(result, VideoInfo):
+                save_video(result, logger, deduplicator)
+
+        if not DaemonState.get().stopping:
+            evict(logger, config)
+    DaemonState.get().set_queued(DownloadJob.count(JobStatus.QUEUED))
+
+
+def apply_reload(logger: Logger, config: Config, result: ReloadResult) -> None:
+    """
+    Applies a reloaded config to the parts that copied options when they started.
+    :param logger:
+    :param config:
+    :param result:
+    :return:
+    """
+    if not result.config_changed:
+        return
+    logger.configure(config.options.log_level, config.options.log_max_size)
+    BandwidthLimiter.get().configure(config.options.rate_limit, config.options.rate_limit_schedule)
+    YoutubeDLPool.get().clear()
+    if config.options.metrics_port != result.previous_options.metrics_port:
+        logger.warning('A changed metrics_port takes effect after a restart')
+
+
+def start_control_server(logger: Logger) -> ControlServer | None:
+    try:
+        return ControlServer(logger).start()
+    except OSError as e:
+        logger.error(f'Failed opening the control socket, {e}')
+        return None
+
+
+def start_metrics_server(logger: Logger, config: Config) -> None:
+    try:
+        MetricsServer(config.options.metrics_port, logger).start()
+    except OSError as e:
+        logger.error(f'Failed serving metrics on port {config.options.metrics_port}, {e}')
+
+
+def rebuild_usage(logger: Logger) -> int:
+    pid = PidFileManager().read()
+    if pid and Daemon.is_process_running(pid):
+        print('ytracker is running. Stop it before rebuilding the storage usage.')
+        return ExitCode.FAILURE.value
+    try:
+        used_bytes = YouTubeVideo.rebuild_sum_file_size()
+    except ProgramShouldExit as should_exit:
+        handle_should_exit_exception(should_exit, logger)
+    else:
+        logger.info(f'Storage usage rebuilt: {used_bytes} bytes')
+        print(f'Storage used by videos: {used_bytes} bytes')
+        return ExitCode.SUCCESS.value
+
+
+def reconcile_now(logger: Logger, config: Config) -> int:
+    pid = PidFileManager().read()
+    if pid and Daemon.is_process_running(pid):
+        print('ytracker is running. Stop it before reconciling, it reconciles on start anyway.')
+        return ExitCode.FAILURE.value
+    try:
+        report = Reconciler(config, logger).run()
+    except ProgramShouldExit as should_exit:
+        handle_should_exit_exception(should_exit, logger)
+    else:
+        print(f'Adopted: {report.adopted}\n'
+              f'Corrected: {report.corrected}\n'
+              f'Marked deleted: {report.marked_deleted}\n'
+              f'Removed partial files: {report.removed_partials}\n'
+              f'Resumable on next start: {len(report.resumable)}')
+        return ExitCode.SUCCESS.value
+
+
+def profile_cycle(argv: list, logger: Logger, config: Config) -> int:
+    pid = PidFileManager().read()
+    if pid and Daemon.is_process_running(pid):
+        print('ytracker is running. Stop it before profiling, so the cycle does not compete with it.')
+        return ExitCode.FAILURE.value
+    try:
+        BandwidthLimiter.get().configure(config.options.rate_limit, config.options.rate_limit_schedule)
+        scheduler = ChannelScheduler(config, logger)
+        prepare_queue(logger, config)
+        channel_urls = load_urls()
+        scheduler.sync(channel_urls)
+        scheduler.check_all_now()
+    except ProgramShouldExit as should_exit:
+        handle_should_exit_exception(should_exit, logger)
+    else:
+        report = CycleProfiler(logger).run(
+            lambda: run_cycle(logger, config, scheduler, channel_urls),
+            save_pstats='--pstats' in argv[2:]
+        )
+        print(f'Cycle took {report.seconds:.3f}s\n'
+              f'Report: {report.report_path}')
+        if report.pstats_path is not None:
+            print(f'Stats: {report.pstats_path}')
+        return ExitCode.SUCCESS.value
+
+
+def reload_daemon() -> int:
+    pid = PidFileManager().read()
+    if not pid or not Daemon.is_process_running(pid):
+        print('ytracker is not running.')
+        return ExitCode.FAILURE.value
+    os.kill(pid, signal.SIGHUP)
+    return ExitCode.SUCCESS.value
+
+
+def control_daemon(command: Command) -> int:
+    try:
+        response = send_command(command.value)
+    except OSError:
+        print('ytracker is not running.')
+        return ExitCode.FAILURE.value
+    if not response.get('ok'):
+        print(response.get('error'))
+        return ExitCode.FAILURE.value
+
+    if command == Command.STATUS:
+        print(f'Stage: {response["stage"]}{" (draining)" if response["draining"] else ""}\n'
+              f'Queued downloads: {response["queued"]}\n'
+              f'Active downloads: {len(response["active_downloads"])}')
+        for download in response['active_downloads']:
+            print(f'  {download["url"]} ({download["seconds"]}s)')
+        print(f'Storage used: {response["storage_used"]} of {response["storage_limit"]} bytes')
+        if response['next_cycle_in'] is not None:
+            print(f'Next cycle in: {response["next_cycle_in"]}s')
+    else:
+        print({
+            Command.SCAN_NOW: 'Checking every channel now.',
+            Command.PAUSE: 'Paused. Active downloads finish, nothing new starts.',
+            Command.RESUME: 'Resumed.',
+            Command.DRAIN: 'Draining. Queued downloads finish, then ytracker exits.',
+        }[command])
+    return ExitCode.SUCCESS.value
 
 
 def ytracker(argv: list, logger: Logger) -> int:
@@ -71,39 +334,76 @@ def ytracker(argv: list, logger: Logger) -> int:
     if command.value == Command.HELP.value:
         return print_help()
 
+    if command == Command.REBUILD_USAGE:
+        return rebuild_usage(logger)
+
+    if command == Command.RELOAD:
+        return reload_daemon()
+
+    if command in (Command.STATUS, Command.SCAN_NOW, Command.PAUSE, Command.RESUME, Command.DRAIN):
+        return control_daemon(command)
+
     config = Config.create(logger)
+    logger.configure(config.options.log_level, config.options.log_max_size)
+
+    if command == Command.RECONCILE:
+        return reconcile_now(logger, config)
+
+    if command == Command.PROFILE:
+        return profile_cycle(argv, logger, config)
+
+    # Long enough for the daemon to let downloads finish and save them.
+    stop_timeout = config.options.shutdown_grace_period + DownloadPool.ABANDON_AFTER + 10
+
+    if command == Command.STOP:
+        stopped = Daemon(command.value, PidFileManager(), logger, stop_timeout).stop()
+        return ExitCode.SUCCESS.value if stopped else ExitCode.FAILURE.value
+
+    with Daemon(command.value, PidFileManager(), logger, stop_timeout):
+        state = DaemonState.get()
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signal_number, lambda *_: state.stop(config.options.shutdown_grace_period))
+
+        BandwidthLimiter.get().configure(config.options.rate_limit, config.options.rate_limit_schedule)
+        scheduler = ChannelScheduler(config, logger)
+        prepare_queue(logger, config)
+        try:
+            reloader = Reloader(config, logger)
+        except ProgramShouldExit as should_exit:
+            handle_should_exit_exception(should_exit, logger)
+        signal.signal(signal.SIGHUP, reloader.request)
+
+        if config.options.metrics_port:
+            start_metrics_server(logger, config)
+
+        control_server = start_control_server(logger)
+        deduplicator = Deduplicator(config, logger).start()
+        try:
+            while program_should_run() and not state.stopping:
+                state.wait_until_resumed()
+                if state.take_scan_request():
+                    scheduler.check_all_now()
+                if not state.stopping:
+                    run_cycle(logger, config, scheduler, reloader.channel_urls, deduplicator)
+                if state.draining or state.stopping:
+                    break
 
-    with Daemon(command.value, PidFileManager(), logger):
-        if command == Command.STOP.value:
-            return ExitCode.SUCCESS.value
-
-        while program_should_run():
-            for result in download_video(logger, config):
-                if not isinstance(result, VideoInfo):
-                    continue
-
-                try:
-                    new_video = YouTubeVideo() \
-                        .set_youtube_video_id(result.video_id) \
-                        .set_path_on_disk(result.path_on_disk) \
-                        .set_file_size(result.file_size)
-                    save_result = new_video.save()
-                except ProgramShouldExit as should_exit:
-                    handle_should_exit_exception(should_exit, logger)
-                finally:
-                    if not save_result:
-                        logger.error(f'Failed saving video to database: {new_video.path_on_disk}')
-
-            while is_not_enough_space(logger, config):
-                try:
-                    video = YouTubeVideo.get_latest_not_deleted_video().set_deleted(True)
-                    video.update()
-                except ProgramShouldExit as should_exit:
-                    handle_should_exit_exception(should_exit, logger)
-
-                delete_file(video.path_on_disk, logger)
-
-            sleep(logger, config)
+                seconds = seconds_until_next_cycle(scheduler)
+                state.set_stage(Stage.SLEEPING)
+                state.set_next_cycle_at(time.time() + seconds)
+                sleep(logger, seconds, lambda: reloader.pending() or state.wake_requested())
+                state.set_next_cycle_at(None)
+                apply_reload(logger, config, reloader.reload())
+            logger.info('Drained, exiting' if state.draining else 'Stopped, exiting')
+        finally:
+            if control_server is not None:
+                control_server.stop()
+            deduplicator.stop()
+            if DownloadPool.abandoned_alive():
+                logger.warning('Leaving the database open for downloads still running')
+            else:
+                Session.close_all()
+        return ExitCode.SUCCESS.value
 
 
 def main():
@@ -1,7 +1,9 @@
 import json
 import os
 from dataclasses import dataclass
+from ytracker.eviction import ChannelLimit
 from ytracker.logger import Logger
+from ytracker.ratelimit import RateLimitWindow
 
 
 @dataclass(frozen=True, slots=True)
@@ -12,7 +14,30 @@ class CreateConfigStatus:
 
 
 class Options:
-    __slots__ = '_download_path', '_refresh_interval', '_storage_size', '_video_quality'
+    __slots__ = (
+        '_download_path',
+        '_refresh_interval',
+        '_storage_size',
+        '_video_quality',
+        '_scan_workers',
+        '_download_workers',
+        '_min_refresh_interval',
+        '_max_refresh_interval',
+        '_max_catch_up',
+        '_rate_limit',
+        '_per_download_rate_limit',
+        '_rate_limit_schedule',
+        '_metrics_port',
+        '_log_level',
+        '_log_max_size',
+        '_shutdown_grace_period',
+        '_storage_mode',
+        '_min_free_space',
+        '_min_free_percent',
+        '_eviction_policy',
+        '_channel_limits',
+        '_deduplicate'
+    )
 
     def __init__(
             self,
@@ -20,12 +45,48 @@ class Options:
             download_path=os.path.join(os.path.expanduser('~'), 'Videos', 'ytracker'),
             refresh_interval=2,
             storage_size=5,
-            video_quality='720'
+            video_quality='720',
+            scan_workers=4,
+            download_workers=2,
+            min_refresh_interval=1.0,
+            max_refresh_interval=24.0,
+            max_catch_up=100,
+            rate_limit=0,
+            per_download_rate_limit=0,
+            rate_limit_schedule=(),
+            metrics_port=0,
+            log_level='INFO',
+            log_max_size=10,
+            shutdown_grace_period=30,
+            storage_mode='quota',
+            min_free_space=5,
+            min_free_percent=0.0,
+            eviction_policy='oldest',
+            channel_limits=(),
+            deduplicate='hardlink'
     ):
         self._download_path = download_path
         self._refresh_interval = refresh_interval
         self._storage_size = storage_size
         self._video_quality = video_quality
+        self._scan_workers = scan_workers
+        self._download_workers = download_workers
+        self._min_refresh_interval = min_refresh_interval
+        self._max_refresh_interval = max_refresh_interval
+        self._max_catch_up = max_catch_up
+        self._rate_limit = rate_limit
+        self._per_download_rate_limit = per_download_rate_limit
+        self._rate_limit_schedule = rate_limit_schedule
+        self._metrics_port = metrics_port
+        self._log_level = log_level
+        self._log_max_size = log_max_size
+        self._shutdown_grace_period = shutdown_grace_period
+        self._storage_mode = storage_mode
+        self._min_free_space = min_free_space
+        self._min_free_percent = min_free_percent
+        self._eviction_policy = eviction_policy
+        self._channel_limits = channel_limits
+        self._deduplicate = deduplicate
 
     @classmethod
     def create(
@@ -35,6 +96,24 @@ class Options:
             refresh_interval=None,
             storage_size=None,
             video_quality=None,
+            scan_workers=None,
+            download_workers=None,
+            min_refresh_interval=None,
+            max_refresh_interval=None,
+            max_catch_up=None,
+            rate_limit=None,
+            per_download_rate_limit=None,
+            rate_limit_schedule=None,
+            metrics_port=None,
+            log_level=None,
+            log_max_size=None,
+            shutdown_grace_period=None,
+            storage_mode=None,
+            min_free_space=None,
+            min_free_percent=None,
+            eviction_policy=None,
+            channel_limits=None,
+            deduplicate=None,
     ) -> 'Options':
         download_path: str = download_path if download_path is not None \
             else os.path.join(os.path.expanduser('~'), 'Videos', 'ytracker')
@@ -52,13 +131,93 @@ class Options:
 
         video_quality: str = video_quality if video_quality in ('360', '480', '720', '1080') else '720'
 
+        scan_workers: int = max(1, int(scan_workers)) if scan_workers is not None else 4
+
+        download_workers: int = max(1, int(download_workers)) if download_workers is not None else 2
+
+        min_refresh_interval: float = float(min_refresh_interval) if min_refresh_interval is not None else 1.0
+
+        max_refresh_interval: float = float(max_refresh_interval) if max_refresh_interval is not None else 24.0
+
+        max_catch_up: int = max(1, int(max_catch_up)) if max_catch_up is not None else 100
+
+        rate_limit: int = max(0, int(rate_limit)) if rate_limit is not None else 0
+
+        per_download_rate_limit: int = max(0, int(per_download_rate_limit)) \
+            if per_download_rate_limit is not None else 0
+
+        rate_limit_schedule: tuple[RateLimitWindow, ...] = cls._parse_rate_limit_schedule(rate_limit_schedule)
+
+        metrics_port: int = max(0, int(metrics_port)) if metrics_port is not None else 0
+
+        log_level: str = str(log_level).upper() \
+            if str(log_level).upper() in ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL') else 'INFO'
+
+        log_max_size: int = max(1, int(log_max_size)) if log_max_size is not None else 10
+
+        shutdown_grace_period: int = max(0, int(shutdown_grace_period)) if shutdown_grace_period is not None else 30
+
+        storage_mode: str = storage_mode if storage_mode in ('quota', 'free_space') else 'quota'
+
+        min_free_space: int = max(0, int(min_free_space)) if min_free_space is not None else 5
+
+        min_free_percent: float = min(100.0, max(0.0, float(min_free_percent))) \
+            if min_free_percent is not None else 0.0
+
+        eviction_policy: str = eviction_policy \
+            if eviction_policy in ('oldest', 'largest', 'least_recently_accessed', 'oldest_upload') else 'oldest'
+
+        channel_limits: tuple[ChannelLimit, ...] = cls._parse_channel_limits(channel_limits)
+
+        deduplicate: str = deduplicate if deduplicate in ('hardlink', 'drop', 'off') else 'hardlink'
+
         return cls(
             download_path=download_path,
             refresh_interval=refresh_interval,
             storage_size=storage_size,
-            video_quality=video_quality
+            video_quality=video_quality,
+            scan_workers=scan_workers,
+            download_workers=download_workers,
+            min_refresh_interval=min_refresh_interval,
+            max_refresh_interval=max_refresh_interval,
+            max_catch_up=max_catch_up,
+            rate_limit=rate_limit,
+            per_download_rate_limit=per_download_rate_limit,
+            rate_limit_schedule=rate_limit_schedule,
+            metrics_port=metrics_port,
+            log_level=log_level,
+            log_max_size=log_max_size,
+            shutdown_grace_period=shutdown_grace_period,
+            storage_mode=storage_mode,
+            min_free_space=min_free_space,
+            min_free_percent=min_free_percent,
+            eviction_policy=eviction_policy,
+            channel_limits=channel_limits,
+            deduplicate=deduplicate
         )
 
+    @staticmethod
+    def _parse_rate_limit_schedule(schedule) -> tuple[RateLimitWindow, ...]:
+        windows = []
+        for window in schedule if isinstance(schedule, (list, tuple)) else ():
+            try:
+                windows.append(window if isinstance(window, RateLimitWindow) else RateLimitWindow.create(window))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return tuple(windows)
+
+    @staticmethod
+    def _parse_channel_limits(limits) -> tuple[ChannelLimit, ...]:
+        if isinstance(limits, (list, tuple)):
+            return tuple(limit for limit in limits if isinstance(limit, ChannelLimit))
+        channel_limits = []
+        for channel, limit in limits.items() if isinstance(limits, dict) else ():
+            try:
+                channel_limits.append(ChannelLimit.create(channel, limit))
+            except (KeyError, TypeError, ValueError):
+                continue
+        return tuple(channel_limits)
+
     @property
     def download_path(self) -> str:
         """
@@ -91,6 +250,153 @@ class Options:
         """
         return self._video_quality
 
+    @property
+    def scan_workers(self) -> int:
+        """
+        Returns how many channels are scanned concurrently.
+        :return:
+        """
+        return self._scan_workers
+
+    @property
+    def download_workers(self) -> int:
+        """
+        Returns how many videos are downloaded concurrently.
+        :return:
+        """
+        return self._download_workers
+
+    @property
+    def min_refresh_interval(self) -> float:
+        """
+        Returns the shortest time, in hours, between two checks of one channel.
+        :return:
+        """
+        return self._min_refresh_interval
+
+    @property
+    def max_refresh_interval(self) -> float:
+        """
+        Returns the longest time, in hours, between two checks of one channel.
+        :return:
+        """
+        return self._max_refresh_interval
+
+    @property
+    def max_catch_up(self) -> int:
+        """
+        Returns how many videos one scan reads from a channel at most.
+        :return:
+        """
+        return self._max_catch_up
+
+    @property
+    def rate_limit(self) -> int:
+        """
+        Returns total download bandwidth in bytes per second, 0 for unlimited.
+        :return:
+        """
+        return self._rate_limit
+
+    @property
+    def per_download_rate_limit(self) -> int:
+        """
+        Returns bandwidth of a single download in bytes per second, 0 for unlimited.
+        :return:
+        """
+        return self._per_download_rate_limit
+
+    @property
+    def rate_limit_schedule(self) -> tuple[RateLimitWindow, ...]:
+        """
+        Returns time of day windows overriding rate_limit.
+        :return:
+        """
+        return self._rate_limit_schedule
+
+    @property
+    def metrics_port(self) -> int:
+        """
+        Returns localhost port serving Prometheus metrics, 0 when disabled.
+        :return:
+        """
+        return self._metrics_port
+
+    @property
+    def log_level(self) -> str:
+        """
+        Lowest level of messages written to the log file.
+        :return:
+        """
+        return self._log_level
+
+    @property
+    def log_max_size(self) -> int:
+        """
+        Size in megabytes after which the log file is rotated.
+        :return:
+        """
+        return self._log_max_size
+
+    @property
+    def shutdown_grace_period(self) -> int:
+        """
+        Seconds active downloads get to finish after a stop request.
+        :return:
+        """
+        return self._shutdown_grace_period
+
+    @property
+    def storage_mode(self) -> str:
+        """
+        How storage is limited: 'quota' caps the size of downloaded videos at storage_size,
+        'free_space' keeps min_free_space and min_free_percent free on the disk of download_path.
+        :return:
+        """
+        return self._storage_mode
+
+    @property
+    def min_free_space(self) -> int:
+        """
+        Gigabytes to keep free on the disk of download_path in free_space mode.
+        :return:
+        """
+        return self._min_free_space
+
+    @property
+    def min_free_percent(self) -> float:
+        """
+        Percent of the disk of download_path to keep free in free_space mode.
+        :return:
+        """
+        return self._min_free_percent
+
+    @property
+    def eviction_policy(self) -> str:
+        """
+        Which videos are evicted first: 'oldest' downloaded, 'largest', 'least_recently_accessed'
+        by file access time or 'oldest_upload' by upload date.
+        :return:
+        """
+        return self._eviction_policy
+
+    @property
+    def channel_limits(self) -> tuple[ChannelLimit, ...]:
+        """
+        Retention limits of single channels, applied before the global storage limit.
+        :return:
+        """
+        return self._channel_limits
+
+    @property
+    def deduplicate(self) -> str:
+        """
+        What happens to a video with the same content as an older one: 'hardlink' replaces its file
+        with a hardlink to the older one, 'drop' deletes it, 'off' keeps both.
+        :return:
+        """
+        return self._deduplicate
+
 
 class Config:
     __slots__ = '_options',
@@ -109,7 +415,25 @@ class Config:
     @classmethod
     def create(cls, logger: Logger) -> 'Config':
         config = cls()
-        conf_path = config._conf_path()
+        conf_path = config.conf_path()
+        config.options = cls.load_options(logger, conf_path)
+        if not isinstance(config.options, Options):
+            config.options = Options.create()
+            config_created = config._create_config_file(conf_path=conf_path)
+            if not config_created.success:
+                logger.error(f'{config_created.msg}, {config_created.exception}')
+                # TODO toastify here
+        return config
+
+    @classmethod
+    def load_options(cls, logger: Logger, conf_path: str | None = None) -> Options | None:
+        """
+        Reads options from the config file.
+        :param logger:
+        :param conf_path:
+        :return: None when the file is missing or can't be read or parsed.
+        """
+        conf_path = cls.conf_path() if conf_path is None else conf_path
         try:
             with open(conf_path, 'r') as config_file:
                 config_data = json.load(config_file)
@@ -120,20 +444,31 @@ class Config:
         except json.JSONDecodeError as e:
             logger.error(f'Parsing failed: {conf_path}, {e}')
         else:
-            config.options = Options.create(
+            return Options.create(
                 download_path=config_data.get('download_path'),
                 refresh_interval=config_data.get('refresh_interval'),
                 storage_size=config_data.get('storage_size'),
-                video_quality=config_data.get('video_quality')
+                video_quality=config_data.get('video_quality'),
+                scan_workers=config_data.get('scan_workers'),
+                download_workers=config_data.get('download_workers'),
+                min_refresh_interval=config_data.get('min_refresh_interval'),
+                max_refresh_interval=config_data.get('max_refresh_interval'),
+                max_catch_up=config_data.get('max_catch_up'),
+                rate_limit=config_data.get('rate_limit'),
+                per_download_rate_limit=config_data.get('per_download_rate_limit'),
+                rate_limit_schedule=config_data.get('rate_limit_schedule'),
+                metrics_port=config_data.get('metrics_port'),
+                log_level=config_data.get('log_level'),
+                log_max_size=config_data.get('log_max_size'),
+                shutdown_grace_period=config_data.get('shutdown_grace_period'),
+                storage_mode=config_data.get('storage_mode'),
+                min_free_space=config_data.get('min_free_space'),
+                min_free_percent=config_data.get('min_free_percent'),
+                eviction_policy=config_data.get('eviction_policy'),
+                channel_limits=config_data.get('channel_limits'),
+                deduplicate=config_data.get('deduplicate')
             )
-        finally:
-            if not isinstance(config.options, Options):
-                config.options = Options.create()
-                config_created = config._create_config_file(conf_path=conf_path)
-                if not config_created.success:
-                    logger.error(f'{config_created.msg}, {config_created.exception}')
-                    # TODO toastify here
-        return config
+        return None
 
     @classmethod
     def _create_config_file(cls, conf_path: str, new_config=None) -> CreateConfigStatus:
@@ -141,7 +476,25 @@ class Config:
             'download_path': os.path.join(os.path.expanduser('~'), 'Videos', 'ytracker'),
             'refresh_interval': 2,
             'storage_size': 5,
-            'video_quality': '720'
+            'video_quality': '720',
+            'scan_workers': 4,
+            'download_workers': 2,
+            'min_refresh_interval': 1.0,
+            'max_refresh_interval': 24.0,
+            'max_catch_up': 100,
+            'rate_limit': 0,
+            'per_download_rate_limit': 0,
+            'rate_limit_schedule': [],
+            'metrics_port': 0,
+            'log_level': 'INFO',
+            'log_max_size': 10,
+            'shutdown_grace_period': 30,
+            'storage_mode': 'quota',
+            'min_free_space': 5,
+            'min_free_percent': 0.0,
+            'eviction_policy': 'oldest',
+            'channel_limits': {},
+            'deduplicate': 'hardlink'
         } if new_config is None else new_config
 
         try:
@@ -155,7 +508,7 @@ class Config:
             return CreateConfigStatus(True)
 
     @staticmethod
-    def _conf_path() -> str:
+    def conf_path() -> str:
         config_path = os.path.join(
             os.path.expanduser('~'),
             '.config',
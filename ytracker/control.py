@@ -0,0 +1,313 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from enum import Enum
+from typing import Optional
+from yt_dlp.utils import DownloadCancelled
+from ytracker.logger import Logger
+
+
+class Stage(Enum):
+    STARTING = 'starting'
+    SCANNING = 'scanning'
+    DOWNLOADING = 'downloading'
+    EVICTING = 'evicting'
+    SLEEPING = 'sleeping'
+    STOPPING = 'stopping'
+
+
+class DaemonState:
+    """
+    What the daemon is doing right now, kept in memory for the control socket.
+
+    The main loop and the download pool report into it as they go, so a
+    status request never touches the database. It also carries the requests
+    made over the socket, pause, resume, scan now and drain, and the request
+    to stop that comes with SIGTERM or SIGINT.
+    """
+    __slots__ = (
+        '_stage',
+        '_queued',
+        '_active',
+        '_storage_used',
+        '_storage_limit',
+        '_next_cycle_at',
+        '_paused',
+        '_draining',
+        '_scan_requested',
+        '_stop_deadline',
+        '_lock',
+        '_changed'
+    )
+
+    _instance: Optional['DaemonState'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._stage = Stage.STARTING
+        self._queued = 0
+        self._active: dict[str, float] = {}
+        self._storage_used = 0
+        self._storage_limit = 0
+        self._next_cycle_at: float | None = None
+        self._paused = False
+        self._draining = False
+        self._scan_requested = False
+        self._stop_deadline: float | None = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @classmethod
+    def get(cls) -> 'DaemonState':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    @property
+    def draining(self) -> bool:
+        return self._draining
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop_deadline is not None
+
+    def set_stage(self, stage: Stage) -> None:
+        with self._lock:
+            self._stage = stage
+
+    def set_queued(self, queued: int) -> None:
+        with self._lock:
+            self._queued = queued
+
+    def set_storage(self, used: int, limit: int) -> None:
+        with self._lock:
+            self._storage_used = used
+            self._storage_limit = limit
+
+    def set_next_cycle_at(self, next_cycle_at: float | None) -> None:
+        with self._lock:
+            self._next_cycle_at = next_cycle_at
+
+    def job_queued(self) -> None:
+        with self._lock:
+            self._queued += 1
+
+    def download_started(self, video_url: str) -> None:
+        with self._lock:
+            self._queued = max(0, self._queued - 1)
+            self._active[video_url] = time.time()
+
+    def download_finished(self, video_url: str) -> None:
+        with self._lock:
+            self._active.pop(video_url, None)
+
+    def pause(self) -> None:
+        with self._changed:
+            self._paused = True
+
+    def resume(self) -> None:
+        with self._changed:
+            self._paused = False
+            self._changed.notify_all()
+
+    def drain(self) -> None:
+        """
+        Stops scanning for good. Queued downloads still finish, then the daemon exits.
+        :return:
+        """
+        with self._changed:
+            self._draining = True
+            self._paused = False
+            self._changed.notify_all()
+
+    def stop(self, grace_period: float, now: float | None = None) -> None:
+        """
+        Stops discovery and new downloads. Active downloads get `grace_period`
+        seconds to finish. Only sets flags, so it is safe in a signal handler.
+        :param grace_period:
+        :param now:
+        :return:
+        """
+        if self._stop_deadline is None:
+            self._stop_deadline = (time.monotonic() if now is None else now) + grace_period
+        self._stage = Stage.STOPPING
+        self._paused = False
+
+    def grace_expired(self, now: float | None = None) -> bool:
+        return self._stop_deadline is not None \
+            and (time.monotonic() if now is None else now) >= self._stop_deadline
+
+    def cancel_hook(self, progress: dict) -> None:
+        """
+        yt-dlp progress hook aborting downloads still running when the grace
+        period is over. yt-dlp keeps the .part file, so they resume later.
+        :param progress:
+        :return:
+        """
+        if self.grace_expired():
+            raise DownloadCancelled('ytracker is shutting down')
+
+    def request_scan(self) -> None:
+        with self._lock:
+            self._scan_requested = True
+
+    def take_scan_request(self) -> bool:
+        with self._lock:
+            requested, self._scan_requested = self._scan_requested, False
+            return requested
+
+    def wake_requested(self) -> bool:
+        """
+        Returns True when the daemon should stop sleeping and start a cycle.
+        :return:
+        """
+        return self._scan_requested or self._draining or self.stopping
+
+    def wait_until_resumed(self, timeout: float | None = None) -> bool:
+        """
+        Blocks while paused. Wakes up every second, since stop() can't notify
+        from a signal handler.
+        :param timeout:
+        :return: True when not paused anymore.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._paused and not self.stopping:
+                remaining = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
+
+    def snapshot(self, now: float | None = None) -> dict:
+        now = time.time() if now is None else now
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'stage': 'paused' if self._paused else self._stage.value,
+                'paused': self._paused,
+                'draining': self._draining,
+                'stopping': self.stopping,
+                'queued': self._queued,
+                'active_downloads': [
+                    {'url': video_url, 'seconds': round(now - started_at, 1)}
+                    for video_url, started_at in self._active.items()
+                ],
+                'storage_used': self._storage_used,
+                'storage_limit': self._storage_limit,
+                'next_cycle_in': round(max(0.0, self._next_cycle_at - now), 1)
+                if self._next_cycle_at is not None else None,
+            }
+
+
+def socket_path() -> str:
+    return os.path.join(
+        os.path.expanduser('~'),
+        '.local',
+        'share',
+        'ytracker',
+        'ytracker.sock'
+    )
+
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline(4096) or b'{}')
+            response = self.server.dispatch(request.get('command'))
+        except (ValueError, AttributeError) as e:
+            response = {'ok': False, 'error': f'Invalid request, {e}'}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, state: DaemonState) -> None:
+        self.state = state
+        super().__init__(path, _ControlHandler)
+
+    def dispatch(self, command: str | None) -> dict:
+        if command == 'status':
+            return {'ok': True, **self.state.snapshot()}
+        if command == 'scan-now':
+            self.state.request_scan()
+        elif command == 'pause':
+            self.state.pause()
+        elif command == 'resume':
+            self.state.resume()
+        elif command == 'drain':
+            self.state.drain()
+        else:
+            return {'ok': False, 'error': f'Unknown command: {command}'}
+        return {'ok': True}
+
+
+class ControlServer:
+    """
+    Answers one JSON request per line on a Unix socket only the owner can use,
+    e.g. {"command": "status"}, from a background thread.
+    """
+    __slots__ = '_path', '_logger', '_state', '_server', '_thread'
+
+    def __init__(self, logger: Logger, path: str | None = None, state: DaemonState | None = None) -> None:
+        self._path = socket_path() if path is None else path
+        self._logger = logger
+        self._state = DaemonState.get() if state is None else state
+        self._server: _UnixServer | None = None
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> 'ControlServer':
+        if os.path.exists(self._path):
+            os.remove(self._path)
+        # The daemon runs with umask(0), so bind under a restrictive one: a chmod after the bind would leave the
+        # socket world-writable until it runs.
+        previous_umask = os.umask(0o177)
+        try:
+            self._server = _UnixServer(self._path, self._state)
+        finally:
+            os.umask(previous_umask)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='ytracker-control',
+            daemon=True
+        )
+        self._thread.start()
+        self._logger.info(f'Listening for commands on {self._path}')
+        return self
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+def send_command(command: str, path: str | None = None, timeout: float = 5.0) -> dict:
+    """
+    Sends one command to a running daemon and returns its answer.
+    :param command:
+    :param path:
+    :param timeout:
+    :return:
+    :raises OSError: When no daemon listens on the socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path() if path is None else path)
+        client.sendall(json.dumps({'command': command}).encode() + b'\n')
+        with client.makefile('rb') as response:
+            return json.loads(response.readline())
@@ -1,6 +1,7 @@
 import os
 import signal
 import sys
+import time
 from typing import Literal
 from ytracker.logger import Logger
 
@@ -35,20 +36,39 @@ class PidFileManager:
         else:
             return True
 
+    def remove(self, pid: int) -> bool:
+        """
+        Removes the pid file if it still holds `pid`.
+        :param pid:
+        :return:
+        """
+        if self.read() != pid:
+            return False
+        try:
+            os.remove(self._file)
+        except OSError:
+            return False
+        else:
+            return True
+
 
 class Daemon:
-    __slots__ = '_action', '_pid_manager', '_logger'
+    __slots__ = '_action', '_pid_manager', '_logger', '_stop_timeout'
+
+    POLL_INTERVAL = 0.2
 
     def __init__(
             self,
             action: Literal['start', 'stop'],
             /,
             pid_manager: PidFileManager,
-            logger: Logger
+            logger: Logger,
+            stop_timeout: float = 60.0
     ) -> None:
         self._action = action
         self._pid_manager = pid_manager
         self._logger = logger
+        self._stop_timeout = stop_timeout
 
     def __enter__(self) -> None:
         return {
@@ -57,7 +77,9 @@ class Daemon:
         }.get(self._action, lambda: sys.exit(1))()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.stop()
+        if self._action == 'start':
+            self._pid_manager.remove(os.getpid())
+            self._logger.info('Daemon exited')
 
     @staticmethod
     def is_process_running(pid: int) -> bool:
@@ -77,7 +99,8 @@ class Daemon:
             return True
 
     def start(self) -> None:
-        self._kill(self._pid_manager.read())
+        if not self.stop():
+            sys.exit(1)
         self._logger.info('Starting a new daemon process...')
         self._fork()
         os.chdir('/')
@@ -101,14 +124,28 @@ class Daemon:
         else:
             self._logger.info(f'A new daemon process started: {pid}')
 
-    def stop(self) -> None:
+    def stop(self) -> bool:
+        """
+        Asks the running daemon to stop and waits until it exited, which
+        takes up to its shutdown grace period.
+        :return: True when no daemon is running anymore.
+        """
         pid = self._pid_manager.read()
-        if pid:
-            self._logger.info('Daemon exiting...')
-            self._kill(pid)
-            sys.exit(0)
+        if not pid or pid == os.getpid() or not self.is_process_running(pid):
+            return True
+        self._logger.info(f'Stopping daemon process {pid}...')
+        self._kill(pid)
+        deadline = time.monotonic() + self._stop_timeout
+        while time.monotonic() < deadline:
+            if self._pid_manager.read() != pid or not self.is_process_running(pid):
+                return True
+            time.sleep(self.POLL_INTERVAL)
+        self._logger.critical(f'Daemon process {pid} did not exit within {self._stop_timeout} seconds.')
+        return False
 
     def _kill(self, pid: int) -> None:
+        if not pid:
+            return
         try:
             os.kill(pid, signal.SIGTERM)
         except OSError as e:
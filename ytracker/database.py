@@ -1,9 +1,14 @@
 import os
 import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Optional, Callable
+from enum import Enum
+from typing import Optional, Callable, Iterable, Iterator
 from ytracker.exception import ProgramShouldExit
+from ytracker.metrics import DB_QUERY_DURATION
 
 
 @dataclass(frozen=True, slots=True)
@@ -70,15 +75,106 @@ class Database:
         return DBPath(dir=db_dir, file=f'{package_name}.db')
 
 
+class Session:
+    """
+    One long-lived SQLite connection shared by the whole process.
+
+    The connection runs in WAL mode and is guarded by a lock, so worker threads
+    can share it. Tables register here once validated, so the schema is checked
+    only the first time a table is used.
+    """
+    __slots__ = '_database', '_connection', '_lock', '_validated_tables'
+
+    _sessions: dict[str, 'Session'] = {}
+    _sessions_lock = threading.Lock()
+
+    PRAGMAS = (
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA cache_size = -16000',
+    )
+
+    def __init__(self, database: Database) -> None:
+        self._database = database
+        self._connection = sqlite3.connect(
+            database.file,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for pragma in self.PRAGMAS:
+            self._connection.execute(pragma)
+        self._lock = threading.RLock()
+        self._validated_tables: set[str] = set()
+
+    @classmethod
+    def get(cls, package_name: str = 'ytracker') -> 'Session':
+        with cls._sessions_lock:
+            session = cls._sessions.get(package_name)
+            if session is None:
+                session = cls(Database.create(package_name))
+                cls._sessions[package_name] = session
+            return session
+
+    @classmethod
+    def close_all(cls) -> None:
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+
+    @property
+    def database(self) -> Database:
+        return self._database
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def is_validated(self, table: str) -> bool:
+        return table in self._validated_tables
+
+    def mark_validated(self, table: str) -> None:
+        self._validated_tables.add(table)
+
+    def fetchone(self, query: str, params: tuple | dict = ()) -> Optional[tuple]:
+        with DB_QUERY_DURATION.time(operation='fetchone'), self._lock:
+            return self._connection.execute(query, params).fetchone()
+
+    def fetchall(self, query: str, params: tuple | dict = ()) -> list[tuple]:
+        with DB_QUERY_DURATION.time(operation='fetchall'), self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def execute(self, query: str, params: tuple | dict = ()) -> int:
+        with DB_QUERY_DURATION.time(operation='execute'), self.transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def executemany(self, query: str, params: Iterable[tuple | dict]) -> int:
+        with DB_QUERY_DURATION.time(operation='executemany'), self.transaction() as conn:
+            return conn.executemany(query, params).rowcount
+
+    def executescript(self, script: str) -> None:
+        with self._lock:
+            self._connection.executescript(script)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            with self._connection:
+                yield self._connection
+
+
 class Table(ABC):
-    __slots__ = '_database', '_table_name'
+    __slots__ = '_session', '_table_name'
 
-    def __init__(self, table_name: str, database: Database):
+    def __init__(self, table_name: str, session: Session):
         self._table_name = table_name.strip()
-        self._database = database
-        if not self._validate_table():
-            if not self._create_table():
+        self._session = session
+        if not session.is_validated(self._table_name):
+            if not self._validate_table() and not self._create_table():
                 raise ProgramShouldExit('Failed creating database.', 1)
+            session.mark_validated(self._table_name)
 
     @abstractmethod
     def _get(self, constraint: Constraint) -> 'Table':
@@ -108,13 +204,31 @@ class Table(ABC):
     def _create_table(self) -> bool:
         pass
 
+    def _columns(self) -> set[str]:
+        return {row[1] for row in self.session.fetchall(f'PRAGMA table_info({self.table})')}
+
+    def _add_columns(self, columns: dict[str, str]) -> None:
+        """
+        Adds columns missing from a table created by an older version.
+        :param columns: Column names mapped to their definitions.
+        :return:
+        """
+        existing = self._columns()
+        for column, definition in columns.items():
+            if column not in existing:
+                self.session.executescript(f'ALTER TABLE {self.table} ADD COLUMN {column} {definition};')
+
     @property
     def table(self) -> str:
         return self._table_name
 
+    @property
+    def session(self) -> Session:
+        return self._session
+
     @property
     def database(self) -> Database:
-        return self._database
+        return self._session.database
 
 
 class YouTubeVideo(Table):
@@ -124,17 +238,82 @@ class YouTubeVideo(Table):
         'path_on_disk',
         'file_size',
         'deleted',
+        'upload_date',
+        'channel',
+        'content_hash',
+        'duplicate_of',
         'created_at',
         'updated_at'
     )
 
+    COLUMNS = 'id, youtube_video_id, path_on_disk, file_size, deleted, upload_date, channel, ' \
+              'content_hash, duplicate_of, created_at, updated_at'
+
+    # Added after the table was introduced, so older databases get them with ALTER TABLE.
+    ADDED_COLUMNS = {
+        'upload_date': 'TEXT',
+        'channel': 'TEXT',
+        'content_hash': 'TEXT',
+        # Id of the video whose file this one is hardlinked to, so its bytes aren't counted twice.
+        'duplicate_of': 'INTEGER',
+    }
+
+    INDEXES = {
+        'idx_youtube_video_id': 'youtube_video_id',
+        'idx_deleted_created_at': 'deleted, created_at',
+        'idx_deleted_file_size': 'deleted, file_size',
+        'idx_deleted_upload_date': 'deleted, upload_date',
+        'idx_channel_deleted_created_at': 'channel, deleted, created_at',
+        'idx_content_hash': 'content_hash',
+        'idx_duplicate_of': 'duplicate_of',
+    }
+
+    # Eviction order of each policy run in SQL, backed by the indexes above.
+    # Videos of unknown upload date go last under 'oldest_upload'.
+    EVICTION_ORDERS = {
+        'oldest': 'created_at, id',
+        'largest': 'file_size DESC, id',
+        'oldest_upload': 'upload_date IS NULL, upload_date, created_at, id',
+    }
+
+    USAGE_TABLE = 'storage_usage'
+
+    # Recreated whenever the table is migrated, so older databases get the current bodies.
+    TRIGGERS = {
+        'trg_storage_usage_insert': """
+            AFTER INSERT ON download_history WHEN NEW.deleted = 0 AND NEW.duplicate_of IS NULL
+            BEGIN
+                UPDATE storage_usage SET used_bytes = used_bytes + NEW.file_size WHERE id = 1;
+            END
+        """,
+        'trg_storage_usage_update': """
+            AFTER UPDATE OF file_size, deleted, duplicate_of ON download_history
+            BEGIN
+                UPDATE storage_usage SET used_bytes = used_bytes
+                    + CASE WHEN NEW.deleted = 0 AND NEW.duplicate_of IS NULL THEN NEW.file_size ELSE 0 END
+                    - CASE WHEN OLD.deleted = 0 AND OLD.duplicate_of IS NULL THEN OLD.file_size ELSE 0 END
+                WHERE id = 1;
+            END
+        """,
+        'trg_storage_usage_delete': """
+            AFTER DELETE ON download_history WHEN OLD.deleted = 0 AND OLD.duplicate_of IS NULL
+            BEGIN
+                UPDATE storage_usage SET used_bytes = used_bytes - OLD.file_size WHERE id = 1;
+            END
+        """,
+    }
+
     def __init__(self, table_id: Optional[int] = None, /):
-        super().__init__('download_history', Database.create('ytracker'))
+        super().__init__('download_history', Session.get())
         self.table_id: Optional[int] = None
         self.video_id: Optional[str] = None
         self.path_on_disk: Optional[str] = None
         self.file_size: Optional[int] = None
         self.deleted: bool = False
+        self.upload_date: Optional[str] = None
+        self.channel: Optional[str] = None
+        self.content_hash: Optional[str] = None
+        self.duplicate_of: Optional[int] = None
         self.created_at: Optional[str] = None
         self.updated_at: Optional[str] = None
 
@@ -147,37 +326,263 @@ class YouTubeVideo(Table):
         return cls()._get(Constraint('youtube_video_id', video_id))
 
     @classmethod
-    def get_latest_not_deleted_video(cls) -> Optional['YouTubeVideo']:
+    def plan_eviction(cls, bytes_to_free: int, policy: str = 'oldest') -> list['YouTubeVideo']:
+        """
+        Returns, in eviction order, the fewest not deleted videos whose
+        combined size reaches `bytes_to_free`, using one windowed query.
+        :param bytes_to_free:
+        :param policy: One of EVICTION_ORDERS.
+        :return:
+        """
+        if bytes_to_free <= 0:
+            return []
+        order = cls.EVICTION_ORDERS[policy]
         instance = cls()
-        with sqlite3.connect(instance.database.file) as conn:
-            query: str = f"""
-                SELECT * FROM {instance.table}
-                WHERE deleted = 0
-                ORDER BY created_at DESC
-                LIMIT 1
-            """
-            video = conn.cursor().execute(query).fetchone()
-            if video is None:
-                return None
-            instance.table_id, instance.video_id, instance.path_on_disk, instance.file_size, \
-                instance.deleted, instance.created_at, instance.updated_at = video
-            return instance
+        rows = instance.session.fetchall(f"""
+            SELECT {cls.COLUMNS} FROM (
+                SELECT {cls.COLUMNS}, SUM(file_size) OVER (
+                    ORDER BY {order}
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                ) AS freed
+                FROM {instance.table}
+                WHERE deleted = 0 AND duplicate_of IS NULL
+            )
+            WHERE freed - file_size < ?
+            ORDER BY freed
+        """, (bytes_to_free,))
+        return [cls()._set_row(row) for row in rows]
 
     @classmethod
-    def get_sum_file_size(cls) -> Optional[int]:
+    def plan_channel_eviction(
+            cls,
+            limits: Iterable[tuple[str, int | None, int | None, str | None]]
+    ) -> list['YouTubeVideo']:
+        """
+        Returns the not deleted videos of limited channels that fall outside
+        their channel's limits, keeping the newest ones, using one windowed
+        query for all channels.
+        :param limits: Channel, max bytes, max videos and the oldest created_at
+        kept, each limit None when not set.
+        :return:
+        """
+        limits = list(limits)
+        if not limits:
+            return []
         instance = cls()
-        with sqlite3.connect(instance.database.file) as conn:
-            return conn.cursor().execute(
-                f'SELECT SUM(file_size) FROM {instance.table} WHERE deleted = 0'
-            ).fetchone()[0]
+        values = ', '.join('(?, ?, ?, ?)' for _ in limits)
+        rows = instance.session.fetchall(f"""
+            WITH channel_limit (channel, max_bytes, max_videos, min_created_at) AS (VALUES {values})
+            SELECT {cls.COLUMNS} FROM (
+                SELECT {', '.join(f'video.{column}' for column in cls.COLUMNS.split(', '))},
+                    max_bytes, max_videos, min_created_at,
+                    SUM(file_size) OVER newest_first AS kept_bytes,
+                    ROW_NUMBER() OVER newest_first AS kept_videos
+                FROM {instance.table} AS video
+                JOIN channel_limit USING (channel)
+                WHERE video.deleted = 0 AND video.duplicate_of IS NULL
+                WINDOW newest_first AS (
+                    PARTITION BY video.channel
+                    ORDER BY video.created_at DESC, video.id DESC
+                    ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                )
+            )
+            WHERE kept_bytes > max_bytes OR kept_videos > max_videos OR created_at < min_created_at
+            ORDER BY channel, created_at, id
+        """, tuple(value for limit in limits for value in limit))
+        return [cls()._set_row(row) for row in rows]
+
+    @classmethod
+    def get_not_deleted(cls) -> list['YouTubeVideo']:
+        """
+        Returns not deleted videos, leaving out duplicates hardlinked to another video.
+        :return:
+        """
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(
+            f'SELECT {cls.COLUMNS} FROM {instance.table} WHERE deleted = 0 AND duplicate_of IS NULL'
+        )]
+
+    @classmethod
+    def get_duplicates_of(cls, videos: list['YouTubeVideo']) -> list['YouTubeVideo']:
+        """
+        Returns not deleted videos hardlinked to any of `videos`.
+        :param videos:
+        :return:
+        """
+        if not videos:
+            return []
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(f"""
+            SELECT {cls.COLUMNS} FROM {instance.table}
+            WHERE deleted = 0 AND duplicate_of IN ({', '.join('?' for _ in videos)})
+        """, tuple(video.table_id for video in videos))]
+
+    @classmethod
+    def get_same_size(cls, video: 'YouTubeVideo') -> list['YouTubeVideo']:
+        """
+        Returns other not deleted, not duplicate videos of the same file size,
+        the only ones `video` can have the same content as, oldest first.
+        :param video:
+        :return:
+        """
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(f"""
+            SELECT {cls.COLUMNS} FROM {instance.table}
+            WHERE deleted = 0 AND file_size = ? AND duplicate_of IS NULL AND id != ?
+            ORDER BY id
+        """, (video.file_size, video.table_id))]
+
+    @classmethod
+    def get_by_content_hash(cls, content_hash: str) -> list['YouTubeVideo']:
+        """
+        Returns not deleted, not duplicate videos with this content, oldest first.
+        :param content_hash:
+        :return:
+        """
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(f"""
+            SELECT {cls.COLUMNS} FROM {instance.table}
+            WHERE content_hash = ? AND deleted = 0 AND duplicate_of IS NULL
+            ORDER BY id
+        """, (content_hash,))]
+
+    @classmethod
+    def get_unhashed_with_same_size(cls) -> list[str]:
+        """
+        Returns youtube_video_id of not hashed videos sharing their file size
+        with another video, the ones that may be duplicates.
+        :return:
+        """
+        instance = cls()
+        return [row[0] for row in instance.session.fetchall(f"""
+            SELECT youtube_video_id FROM {instance.table}
+            WHERE deleted = 0 AND duplicate_of IS NULL AND content_hash IS NULL AND file_size IN (
+                SELECT file_size FROM {instance.table}
+                WHERE deleted = 0 AND duplicate_of IS NULL
+                GROUP BY file_size
+                HAVING COUNT(*) > 1
+            )
+            ORDER BY id
+        """)]
+
+    def save_content_hash(self, content_hash: str) -> bool:
+        """
+        Stores only the content hash, leaving columns other threads may change alone.
+        :param content_hash:
+        :return:
+        """
+        self.content_hash = content_hash
+        return self.session.execute(
+            f'UPDATE {self.table} SET content_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+            (content_hash, self.table_id)
+        ) > 0
+
+    def mark_duplicate_of(self, original: 'YouTubeVideo', deleted: bool) -> bool:
+        """
+        Marks this video as a duplicate of `original`, unless `original` got
+        deleted in the meantime.
+        :param original:
+        :param deleted: Whether the duplicate's file is removed rather than hardlinked.
+        :return:
+        """
+        marked = self.session.execute(f"""
+            UPDATE {self.table}
+            SET duplicate_of = ?, deleted = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND EXISTS (SELECT 1 FROM {self.table} WHERE id = ? AND deleted = 0)
+        """, (original.table_id, deleted, self.table_id, original.table_id)) > 0
+        if marked:
+            self.duplicate_of = original.table_id
+            self.deleted = deleted
+        return marked
+
+    @classmethod
+    def mark_deleted(cls, videos: list['YouTubeVideo']) -> int:
+        instance = cls()
+        with instance.session.transaction() as conn:
+            rowcount = conn.executemany(
+                f'UPDATE {instance.table} SET deleted = 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                ((video.table_id,) for video in videos)
+            ).rowcount
+        for video in videos:
+            video.deleted = True
+        return rowcount
+
+    @classmethod
+    def get_sum_file_size(cls) -> int:
+        """
+        Returns bytes taken by not deleted videos. The figure is kept
+        up to date by triggers, so this doesn't scan download_history.
+        :return:
+        """
+        instance = cls()
+        return instance.session.fetchone(
+            f'SELECT used_bytes FROM {cls.USAGE_TABLE} WHERE id = 1'
+        )[0]
+
+    @classmethod
+    def rebuild_sum_file_size(cls) -> int:
+        """
+        Recomputes the storage usage counter from download_history.
+        :return:
+        """
+        instance = cls()
+        instance.session.execute(f"""
+            UPDATE {cls.USAGE_TABLE}
+            SET used_bytes = (
+                SELECT COALESCE(SUM(file_size), 0) FROM {instance.table} WHERE deleted = 0 AND duplicate_of IS NULL
+            )
+            WHERE id = 1
+        """)
+        return cls.get_sum_file_size()
 
     @classmethod
     def exists(cls, video_id: str) -> bool:
         instance = cls()
-        with sqlite3.connect(instance.database.file) as conn:
-            return conn.cursor().execute(
-                f"SELECT COUNT(*) from {instance.table} WHERE youtube_video_id = '{video_id}'"
-            ).fetchone()[0] > 0
+        return instance.session.fetchone(
+            f'SELECT 1 FROM {instance.table} WHERE youtube_video_id = ? LIMIT 1',
+            (video_id,)
+        ) is not None
+
+    @classmethod
+    def get_all(cls) -> list['YouTubeVideo']:
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(
+            f'SELECT {cls.COLUMNS} FROM {instance.table}'
+        )]
+
+    @classmethod
+    def save_all(cls, inserted: list['YouTubeVideo'], updated: list['YouTubeVideo']) -> None:
+        """
+        Inserts and updates many videos in a single transaction.
+        :param inserted:
+        :param updated:
+        :return:
+        """
+        instance = cls()
+        with instance.session.transaction() as conn:
+            conn.executemany(f"""
+                INSERT INTO {instance.table}
+                (youtube_video_id, path_on_disk, file_size, deleted, upload_date, channel)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                (video.video_id, video.path_on_disk, video.file_size, video.deleted, video.upload_date, video.channel)
+                for video in inserted
+            ))
+            conn.executemany(f"""
+                UPDATE {instance.table}
+                SET path_on_disk = ?, file_size = ?, deleted = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, ((video.path_on_disk, video.file_size, video.deleted, video.table_id) for video in updated))
+        index = DownloadedIndex.get()
+        for video in inserted:
+            index.add(video.video_id)
+
+    @classmethod
+    def get_all_video_ids(cls) -> set[str]:
+        instance = cls()
+        return {row[0] for row in instance.session.fetchall(
+            f'SELECT youtube_video_id FROM {instance.table}'
+        )}
 
     @property
     def video(self) -> dict:
@@ -187,6 +592,10 @@ class YouTubeVideo(Table):
             'path_on_disk': self.path_on_disk,
             'file_size': self.file_size,
             'deleted': bool(self.deleted),
+            'upload_date': self.upload_date,
+            'channel': self.channel,
+            'content_hash': self.content_hash,
+            'duplicate_of': self.duplicate_of,
             'created_at': self.created_at,
             'updated_at': self.updated_at
         }
@@ -207,6 +616,18 @@ class YouTubeVideo(Table):
         self.deleted = deleted
         return self
 
+    def set_upload_date(self, upload_date: Optional[str]) -> 'YouTubeVideo':
+        self.upload_date = upload_date
+        return self
+
+    def set_channel(self, channel: Optional[str]) -> 'YouTubeVideo':
+        self.channel = channel
+        return self
+
+    def set_content_hash(self, content_hash: Optional[str]) -> 'YouTubeVideo':
+        self.content_hash = content_hash
+        return self
+
     def set_created_at(self, created_at: str) -> 'YouTubeVideo':
         self.created_at = created_at
         return self
@@ -215,6 +636,12 @@ class YouTubeVideo(Table):
         self.updated_at = updated_at
         return self
 
+    def _set_row(self, row: tuple) -> 'YouTubeVideo':
+        self.table_id, self.video_id, self.path_on_disk, self.file_size, \
+            self.deleted, self.upload_date, self.channel, self.content_hash, self.duplicate_of, \
+            self.created_at, self.updated_at = row
+        return self
+
     def _assert_required(self) -> bool:
         return all(value is not None for value in (
             self.video_id,
@@ -223,15 +650,21 @@ class YouTubeVideo(Table):
         ))
 
     def _validate_table(self) -> bool:
-        with sqlite3.connect(self.database.file) as conn:
-            return conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name = ?",
-                (self.table,)
-            ).fetchone() is not None
+        names = {row[0] for row in self.session.fetchall(
+            'SELECT name FROM sqlite_master WHERE tbl_name IN (?, ?)',
+            (self.table, self.USAGE_TABLE)
+        )}
+        columns = self._columns()
+        return all(name in names for name in (
+            self.table,
+            self.USAGE_TABLE,
+            *self.INDEXES,
+            *self.TRIGGERS
+        )) and all(column in columns for column in self.ADDED_COLUMNS)
 
     def _create_table(self) -> bool:
-        create_table_query = f"""
-        CREATE TABLE {self.table} (
+        self.session.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             youtube_video_id TEXT NOT NULL UNIQUE,
             path_on_disk TEXT NOT NULL,
@@ -240,78 +673,631 @@ class YouTubeVideo(Table):
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
         );
-        """
-        create_index_on_youtube_video_id = """
-        CREATE INDEX idx_youtube_video_id ON download_history (youtube_video_id);
-        """
-        with sqlite3.connect(self.database.file) as conn:
-            cursor = conn.cursor()
-            cursor.execute(create_table_query)
-            cursor.execute(create_index_on_youtube_video_id)
-            conn.commit()
+        """)
+        self._add_columns(self.ADDED_COLUMNS)
+        for index, columns in self.INDEXES.items():
+            self.session.executescript(f'CREATE INDEX IF NOT EXISTS {index} ON {self.table} ({columns});')
+        self.session.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {self.USAGE_TABLE} (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            used_bytes INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO {self.USAGE_TABLE} (id, used_bytes)
+        SELECT 1, COALESCE(SUM(file_size), 0) FROM {self.table} WHERE deleted = 0 AND duplicate_of IS NULL;
+        """)
+        for trigger, body in self.TRIGGERS.items():
+            self.session.executescript(f'DROP TRIGGER IF EXISTS {trigger}; CREATE TRIGGER {trigger} {body};')
 
         return self._validate_table()
 
     def _get(self, constraint: Constraint) -> Optional['YouTubeVideo']:
-        with sqlite3.connect(self.database.file) as conn:
-            video = conn.cursor().execute(
-                f"SELECT * FROM {self.table} WHERE {constraint.column} = '{constraint.value}'"
-            ).fetchone()
-            if video is None:
-                return None
-            self.table_id, self.video_id, self.path_on_disk, self.file_size, \
-                self.deleted, self.created_at, self.updated_at = video
-            return self
+        video = self.session.fetchone(
+            f'SELECT {self.COLUMNS} FROM {self.table} WHERE {constraint.column} = ?',
+            (constraint.value,)
+        )
+        if video is None:
+            return None
+        return self._set_row(video)
 
     def save(self) -> bool:
         if not self._assert_required():
             raise ValueError('Cannot save video. Some or all required values are not set.')
-        with sqlite3.connect(self.database.file) as conn:
-            cursor = conn.cursor()
-            insert_query: str = f"""
+        insert_query: str = f"""
+            INSERT INTO {self.table}
+            (youtube_video_id, path_on_disk, file_size, deleted, upload_date, channel)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """
+        saved = self.session.execute(insert_query, (
+            self.video_id,
+            self.path_on_disk,
+            self.file_size,
+            self.deleted,
+            self.upload_date,
+            self.channel
+        )) > 0
+        if saved:
+            DownloadedIndex.get().add(self.video_id)
+
+        return saved
+
+    def update(self) -> bool:
+        update_query: str = f"""
+        UPDATE {self.table}
+        SET
+            youtube_video_id = ?,
+            path_on_disk = ?,
+            file_size = ?,
+            deleted = ?,
+            upload_date = ?,
+            channel = ?,
+            content_hash = ?,
+            duplicate_of = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE
+            id = ?
+        """
+        return self.session.execute(update_query, (
+            self.video_id,
+            self.path_on_disk,
+            self.file_size,
+            self.deleted,
+            self.upload_date,
+            self.channel,
+            self.content_hash,
+            self.duplicate_of,
+            self.table_id
+        )) > 0
+
+    def delete(self) -> bool:
+        deleted = self.session.execute(
+            f'DELETE FROM {self.table} WHERE id = ?',
+            (self.table_id,)
+        ) > 0
+        if deleted and self.video_id is not None:
+            DownloadedIndex.get().discard(self.video_id)
+
+        return deleted
+
+
+class Channel(Table):
+    """
+    Polling state of one subscribed channel: how often it is checked
+    and when the next check is due, as unix timestamps and seconds.
+    """
+    __slots__ = (
+        'table_id',
+        'url',
+        'check_interval',
+        'next_check_at',
+        'last_checked_at',
+        'last_video_id',
+        'last_upload_date',
+        'created_at',
+        'updated_at'
+    )
+
+    COLUMNS = 'id, url, check_interval, next_check_at, last_checked_at, ' \
+              'last_video_id, last_upload_date, created_at, updated_at'
+
+    # Added after the table was introduced, so older databases get them with ALTER TABLE.
+    ADDED_COLUMNS = {
+        'last_video_id': 'TEXT',
+        'last_upload_date': 'TEXT',
+    }
+
+    def __init__(self, table_id: Optional[int] = None, /):
+        super().__init__('channel', Session.get())
+        self.table_id: Optional[int] = None
+        self.url: Optional[str] = None
+        self.check_interval: Optional[float] = None
+        self.next_check_at: Optional[float] = None
+        self.last_checked_at: Optional[float] = None
+        self.last_video_id: Optional[str] = None
+        self.last_upload_date: Optional[str] = None
+        self.created_at: Optional[str] = None
+        self.updated_at: Optional[str] = None
+
+        if table_id is not None:
+            self.table_id = table_id
+            self._get(Constraint('id', table_id))
+
+    @classmethod
+    def find_by_url(cls, url: str) -> Optional['Channel']:
+        return cls()._get(Constraint('url', url))
+
+    @classmethod
+    def get_all(cls) -> list['Channel']:
+        instance = cls()
+        return [cls()._set_row(row) for row in instance.session.fetchall(
+            f'SELECT {cls.COLUMNS} FROM {instance.table}'
+        )]
+
+    def set_url(self, url: str) -> 'Channel':
+        self.url = url
+        return self
+
+    def set_check_interval(self, check_interval: float) -> 'Channel':
+        self.check_interval = check_interval
+        return self
+
+    def set_next_check_at(self, next_check_at: float) -> 'Channel':
+        self.next_check_at = next_check_at
+        return self
+
+    def set_last_checked_at(self, last_checked_at: float) -> 'Channel':
+        self.last_checked_at = last_checked_at
+        return self
+
+    def set_last_video_id(self, last_video_id: Optional[str]) -> 'Channel':
+        self.last_video_id = last_video_id
+        return self
+
+    def set_last_upload_date(self, last_upload_date: Optional[str]) -> 'Channel':
+        self.last_upload_date = last_upload_date
+        return self
+
+    def _set_row(self, row: tuple) -> 'Channel':
+        self.table_id, self.url, self.check_interval, self.next_check_at, self.last_checked_at, \
+            self.last_video_id, self.last_upload_date, self.created_at, self.updated_at = row
+        return self
+
+    def _assert_required(self) -> bool:
+        return all(value is not None for value in (
+            self.url,
+            self.check_interval,
+            self.next_check_at
+        ))
+
+    def _validate_table(self) -> bool:
+        columns = self._columns()
+        return bool(columns) and all(column in columns for column in self.ADDED_COLUMNS)
+
+    def _create_table(self) -> bool:
+        self.session.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL UNIQUE,
+            check_interval REAL NOT NULL,
+            next_check_at REAL NOT NULL,
+            last_checked_at REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        self._add_columns(self.ADDED_COLUMNS)
+
+        return self._validate_table()
+
+    def _get(self, constraint: Constraint) -> Optional['Channel']:
+        channel = self.session.fetchone(
+            f'SELECT {self.COLUMNS} FROM {self.table} WHERE {constraint.column} = ?',
+            (constraint.value,)
+        )
+        if channel is None:
+            return None
+        return self._set_row(channel)
+
+    def save(self) -> bool:
+        if not self._assert_required():
+            raise ValueError('Cannot save channel. Some or all required values are not set.')
+        with self.session.transaction() as conn:
+            cursor = conn.execute(f"""
                 INSERT INTO {self.table}
-                (youtube_video_id, path_on_disk, file_size, deleted)
-                VALUES (?, ?, ?, ?)
-            """
-            cursor.execute(insert_query, (
-                self.video_id,
-                self.path_on_disk,
-                self.file_size,
-                self.deleted
+                (url, check_interval, next_check_at, last_checked_at, last_video_id, last_upload_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                self.url,
+                self.check_interval,
+                self.next_check_at,
+                self.last_checked_at,
+                self.last_video_id,
+                self.last_upload_date
             ))
-            conn.commit()
+            self.table_id = cursor.lastrowid
 
         return cursor.rowcount > 0
 
     def update(self) -> bool:
-        with sqlite3.connect(self.database.file) as conn:
-            cursor = conn.cursor()
-            update_query: str = f"""
-            UPDATE {self.table}
-            SET
-                youtube_video_id = ?,
-                path_on_disk = ?,
-                file_size = ?,
-                deleted = ?,
+        return self.session.execute(f"""
+        UPDATE {self.table}
+        SET
+            url = ?,
+            check_interval = ?,
+            next_check_at = ?,
+            last_checked_at = ?,
+            last_video_id = ?,
+            last_upload_date = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE
+            id = ?
+        """, (
+            self.url,
+            self.check_interval,
+            self.next_check_at,
+            self.last_checked_at,
+            self.last_video_id,
+            self.last_upload_date,
+            self.table_id
+        )) > 0
+
+    def delete(self) -> bool:
+        return self.session.execute(
+            f'DELETE FROM {self.table} WHERE id = ?',
+            (self.table_id,)
+        ) > 0
+
+
+class JobStatus(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class DownloadJob(Table):
+    """
+    A video waiting to be downloaded. Discovery queues jobs, download
+    workers claim them one at a time, and failed jobs are retried with
+    exponential backoff until MAX_ATTEMPTS. A job that failed that often
+    is queued again with fresh attempts after FAILED_COOLDOWN, for as long
+    as it is younger than KEEP_FAILED, and is pruned after that.
+    """
+    __slots__ = (
+        'table_id',
+        'video_url',
+        'status',
+        'attempts',
+        'next_attempt_at',
+        'last_error',
+        'channel',
+        'created_at',
+        'updated_at'
+    )
+
+    COLUMNS = 'id, video_url, status, attempts, next_attempt_at, last_error, channel, created_at, updated_at'
+
+    # Added after the table was introduced, so older databases get them with ALTER TABLE.
+    ADDED_COLUMNS = {
+        'channel': 'TEXT',
+    }
+
+    INDEXES = {
+        'idx_download_job_status_next_attempt_at': 'status, next_attempt_at',
+    }
+
+    MAX_ATTEMPTS = 5
+    # Seconds before the first retry, doubled for every following attempt.
+    RETRY_DELAY = 300
+    # Finished jobs are kept this long, in seconds, before being pruned.
+    KEEP_DONE = 7 * 24 * 3600
+    # Seconds after its last attempt before a failed job may be queued again.
+    FAILED_COOLDOWN = 24 * 3600
+    # Failed jobs not queued again are kept this long, in seconds, before being pruned.
+    KEEP_FAILED = 30 * 24 * 3600
+
+    def __init__(self, table_id: Optional[int] = None, /):
+        super().__init__('download_job', Session.get())
+        self.table_id: Optional[int] = None
+        self.video_url: Optional[str] = None
+        self.status: str = JobStatus.QUEUED.value
+        self.attempts: int = 0
+        self.next_attempt_at: float = 0
+        self.last_error: Optional[str] = None
+        self.channel: Optional[str] = None
+        self.created_at: Optional[str] = None
+        self.updated_at: Optional[str] = None
+
+        if table_id is not None:
+            self.table_id = table_id
+            self._get(Constraint('id', table_id))
+
+    @classmethod
+    def find_by_video_url(cls, video_url: str) -> Optional['DownloadJob']:
+        return cls()._get(Constraint('video_url', video_url))
+
+    @classmethod
+    def enqueue(cls, video_url: str, now: Optional[float] = None, channel: Optional[str] = None) -> bool:
+        """
+        Queues a video unless a job for it already exists. A failed job past
+        its cooldown is queued again instead, with its attempts reset.
+        :param video_url:
+        :param now:
+        :param channel: Url of the channel the video was found on.
+        :return: True when a job was queued.
+        """
+        instance = cls()
+        return instance.session.execute(f"""
+            INSERT INTO {instance.table} (video_url, status, next_attempt_at, channel) VALUES (?, ?, ?, ?)
+            ON CONFLICT (video_url) DO UPDATE SET
+                status = excluded.status,
+                attempts = 0,
+                next_attempt_at = excluded.next_attempt_at,
+                channel = COALESCE(excluded.channel, channel),
                 updated_at = CURRENT_TIMESTAMP
-            WHERE
-                id = ?
-            """
-            cursor.execute(update_query, (
-                self.video_id,
-                self.path_on_disk,
-                self.file_size,
-                self.deleted,
-                self.table_id
+            WHERE status = ? AND next_attempt_at <= excluded.next_attempt_at
+        """, (
+            video_url,
+            JobStatus.QUEUED.value,
+            time.time() if now is None else now,
+            channel,
+            JobStatus.FAILED.value
+        )) > 0
+
+    @classmethod
+    def claim(cls, now: Optional[float] = None) -> Optional['DownloadJob']:
+        """
+        Atomically moves the oldest ready job to running and returns it.
+        :param now:
+        :return:
+        """
+        instance = cls()
+        with instance.session.transaction() as conn:
+            row = conn.execute(f"""
+                UPDATE {instance.table}
+                SET status = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM {instance.table}
+                    WHERE status = ? AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id
+                    LIMIT 1
+                )
+                RETURNING {cls.COLUMNS}
+            """, (
+                JobStatus.RUNNING.value,
+                JobStatus.QUEUED.value,
+                time.time() if now is None else now
+            )).fetchone()
+        if row is None:
+            return None
+        return instance._set_row(row)
+
+    @classmethod
+    def requeue_running(cls) -> int:
+        """
+        Puts jobs interrupted by a shutdown or crash back in the queue.
+        :return:
+        """
+        instance = cls()
+        return instance.session.execute(
+            f'UPDATE {instance.table} SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE status = ?',
+            (JobStatus.QUEUED.value, JobStatus.RUNNING.value)
+        )
+
+    @classmethod
+    def requeue_failed(cls, now: Optional[float] = None) -> int:
+        """
+        Queues failed jobs past their cooldown again, with their attempts
+        reset. Scans stop at the channel's watermark, so they would not
+        rediscover these videos. Jobs created more than KEEP_FAILED ago
+        stay failed until they are pruned.
+        :param now:
+        :return:
+        """
+        instance = cls()
+        now = time.time() if now is None else now
+        return instance.session.execute(f"""
+            UPDATE {instance.table}
+            SET status = ?, attempts = 0, next_attempt_at = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE status = ? AND next_attempt_at <= ? AND created_at >= datetime(?, 'unixepoch')
+        """, (JobStatus.QUEUED.value, now, JobStatus.FAILED.value, now, now - cls.KEEP_FAILED))
+
+    @classmethod
+    def prune(cls, now: Optional[float] = None) -> int:
+        """
+        Deletes jobs done more than KEEP_DONE ago and jobs whose cooldown
+        after failing ended more than KEEP_FAILED ago.
+        :param now:
+        :return:
+        """
+        instance = cls()
+        now = time.time() if now is None else now
+        return instance.session.execute(
+            f'DELETE FROM {instance.table} '
+            f'WHERE (status = ? AND next_attempt_at < ?) OR (status = ? AND next_attempt_at < ?)',
+            (JobStatus.DONE.value, now - cls.KEEP_DONE, JobStatus.FAILED.value, now - cls.KEEP_FAILED)
+        )
+
+    @classmethod
+    def get_channels(cls) -> dict[str, str]:
+        """
+        Returns the channel url of every job that recorded one, keyed by its video url.
+        :return:
+        """
+        instance = cls()
+        return dict(instance.session.fetchall(
+            f'SELECT video_url, channel FROM {instance.table} WHERE channel IS NOT NULL'
+        ))
+
+    @classmethod
+    def count(cls, status: JobStatus) -> int:
+        instance = cls()
+        return instance.session.fetchone(
+            f'SELECT COUNT(*) FROM {instance.table} WHERE status = ?',
+            (status.value,)
+        )[0]
+
+    @classmethod
+    def next_ready_at(cls) -> Optional[float]:
+        """
+        Returns when the next queued job becomes ready, None if nothing is queued.
+        :return:
+        """
+        instance = cls()
+        return instance.session.fetchone(
+            f'SELECT MIN(next_attempt_at) FROM {instance.table} WHERE status = ?',
+            (JobStatus.QUEUED.value,)
+        )[0]
+
+    def finish(self, now: Optional[float] = None) -> bool:
+        self.status = JobStatus.DONE.value
+        self.next_attempt_at = time.time() if now is None else now
+        self.last_error = None
+        return self.update()
+
+    def fail(self, error: str, now: Optional[float] = None) -> bool:
+        """
+        Schedules a retry, or gives up after MAX_ATTEMPTS until FAILED_COOLDOWN is over.
+        :param error:
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.status = JobStatus.FAILED.value
+            self.next_attempt_at = now + self.FAILED_COOLDOWN
+        else:
+            self.status = JobStatus.QUEUED.value
+            self.next_attempt_at = now + self.RETRY_DELAY * 2 ** (self.attempts - 1)
+        self.last_error = error
+        return self.update()
+
+    def release(self, now: Optional[float] = None) -> bool:
+        """
+        Puts a job cut short by a shutdown back in the queue, without counting the attempt.
+        :param now:
+        :return:
+        """
+        self.status = JobStatus.QUEUED.value
+        self.attempts = max(0, self.attempts - 1)
+        self.next_attempt_at = time.time() if now is None else now
+        return self.update()
+
+    def set_video_url(self, video_url: str) -> 'DownloadJob':
+        self.video_url = video_url
+        return self
+
+    def _set_row(self, row: tuple) -> 'DownloadJob':
+        self.table_id, self.video_url, self.status, self.attempts, \
+            self.next_attempt_at, self.last_error, self.channel, self.created_at, self.updated_at = row
+        return self
+
+    def _assert_required(self) -> bool:
+        return self.video_url is not None
+
+    def _validate_table(self) -> bool:
+        names = {row[0] for row in self.session.fetchall(
+            'SELECT name FROM sqlite_master WHERE tbl_name = ?',
+            (self.table,)
+        )}
+        return self.table in names \
+            and all(index in names for index in self.INDEXES) \
+            and all(column in self._columns() for column in self.ADDED_COLUMNS)
+
+    def _create_table(self) -> bool:
+        self.session.executescript(f"""
+        CREATE TABLE IF NOT EXISTS {self.table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_url TEXT NOT NULL UNIQUE,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """)
+        self._add_columns(self.ADDED_COLUMNS)
+        for index, columns in self.INDEXES.items():
+            self.session.executescript(f'CREATE INDEX IF NOT EXISTS {index} ON {self.table} ({columns});')
+
+        return self._validate_table()
+
+    def _get(self, constraint: Constraint) -> Optional['DownloadJob']:
+        job = self.session.fetchone(
+            f'SELECT {self.COLUMNS} FROM {self.table} WHERE {constraint.column} = ?',
+            (constraint.value,)
+        )
+        if job is None:
+            return None
+        return self._set_row(job)
+
+    def save(self) -> bool:
+        if not self._assert_required():
+            raise ValueError('Cannot save job. Video url is not set.')
+        with self.session.transaction() as conn:
+            cursor = conn.execute(f"""
+                INSERT INTO {self.table}
+                (video_url, status, attempts, next_attempt_at, last_error, channel)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                self.video_url,
+                self.status,
+                self.attempts,
+                self.next_attempt_at,
+                self.last_error,
+                self.channel
             ))
-            conn.commit()
+            self.table_id = cursor.lastrowid
 
         return cursor.rowcount > 0
 
+    def update(self) -> bool:
+        return self.session.execute(f"""
+        UPDATE {self.table}
+        SET
+            video_url = ?,
+            status = ?,
+            attempts = ?,
+            next_attempt_at = ?,
+            last_error = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE
+            id = ?
+        """, (
+            self.video_url,
+            self.status,
+            self.attempts,
+            self.next_attempt_at,
+            self.last_error,
+            self.table_id
+        )) > 0
+
     def delete(self) -> bool:
-        with sqlite3.connect(self.database.file) as conn:
-            cursor = conn.cursor()
-            cursor.execute(f"DELETE FROM {self.table} WHERE id = '{self.table_id}'")
-            conn.commit()
+        return self.session.execute(
+            f'DELETE FROM {self.table} WHERE id = ?',
+            (self.table_id,)
+        ) > 0
 
-        return cursor.rowcount > 0
+
+class DownloadedIndex:
+    """
+    In-memory set of every youtube_video_id in download_history.
+
+    Loaded with one query per cycle and kept current by YouTubeVideo.save()
+    and delete(), so membership checks during a scan never touch the database.
+    """
+    __slots__ = '_video_ids', '_lock'
+
+    _instance: Optional['DownloadedIndex'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._video_ids: set[str] = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> 'DownloadedIndex':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def reload(self) -> 'DownloadedIndex':
+        video_ids = YouTubeVideo.get_all_video_ids()
+        with self._lock:
+            self._video_ids = video_ids
+        return self
+
+    def add(self, video_id: str) -> None:
+        with self._lock:
+            self._video_ids.add(video_id)
+
+    def discard(self, video_id: str) -> None:
+        with self._lock:
+            self._video_ids.discard(video_id)
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._video_ids
+
+    def __len__(self) -> int:
+        return len(self._video_ids)
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import queue
+import threading
+from ytracker.config import Config
+from ytracker.database import YouTubeVideo
+from ytracker.logger import Logger
+from ytracker.metrics import BYTES_DEDUPLICATED, VIDEOS_DEDUPLICATED
+from ytracker.utils import delete_file
+
+_STOP = object()
+
+
+class Deduplicator:
+    """
+    Finds downloaded videos with the same content, such as re-uploads,
+    and keeps their bytes on disk once.
+
+    Saved videos are handed to a background thread, so hashing never holds
+    up downloads. Only videos sharing their file size with another video
+    can be duplicates, so only those are hashed, reading the file in chunks.
+    A duplicate is then hardlinked to, or dropped in favor of, the oldest
+    video with the same content, and stops counting toward storage.
+    """
+    __slots__ = '_config', '_logger', '_queue', '_stop', '_thread'
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, config: Config, logger: Logger) -> None:
+        self._config = config
+        self._logger = logger
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> 'Deduplicator':
+        """
+        Starts the background thread, which first catches up on videos
+        downloaded before that may be duplicates.
+        :return:
+        """
+        self._thread = threading.Thread(target=self._run, name='ytracker-dedupe', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        Stops the background thread, abandoning any hash in progress.
+        :param timeout:
+        :return:
+        """
+        self._stop.set()
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, video_id: str) -> None:
+        """
+        Queues a just saved video to be checked. Returns immediately.
+        :param video_id: youtube_video_id of the video.
+        :return:
+        """
+        if self._config.options.deduplicate != 'off':
+            self._queue.put(video_id)
+
+    def _run(self) -> None:
+        try:
+            if self._config.options.deduplicate != 'off':
+                for video_id in YouTubeVideo.get_unhashed_with_same_size():
+                    self._queue.put(video_id)
+        except Exception as e:
+            self._logger.error(f'Failed finding videos to deduplicate, {e}')
+
+        while not self._stop.is_set():
+            video_id = self._queue.get()
+            if video_id is _STOP:
+                return
+            try:
+                self.process(video_id)
+            except Exception as e:
+                self._logger.error(f'Failed deduplicating {video_id}, {e}')
+
+    def process(self, video_id: str) -> list[YouTubeVideo]:
+        """
+        Hashes the video and the videos of the same size not hashed yet,
+        then deduplicates every video sharing its content.
+        :param video_id: youtube_video_id of the video.
+        :return: Videos found to be duplicates.
+        """
+        mode = self._config.options.deduplicate
+        video = YouTubeVideo.find_by_video_id(video_id)
+        if mode == 'off' or video is None or video.deleted or video.duplicate_of is not None:
+            return []
+        same_size = YouTubeVideo.get_same_size(video)
+        if not same_size:
+            return []
+
+        for candidate in (video, *same_size):
+            if candidate.content_hash is None:
+                content_hash = self.hash_file(candidate.path_on_disk)
+                if content_hash is None:
+                    if self._stop.is_set():
+                        return []
+                    continue
+                candidate.save_content_hash(content_hash)
+        if video.content_hash is None:
+            return []
+
+        same_content = YouTubeVideo.get_by_content_hash(video.content_hash)
+        if len(same_content) < 2:
+            return []
+        original, *copies = same_content
+        duplicates = [copy for copy in copies if self._deduplicate(copy, original, mode)]
+        if duplicates:
+            freed = sum(duplicate.file_size for duplicate in duplicates)
+            VIDEOS_DEDUPLICATED.inc(len(duplicates))
+            BYTES_DEDUPLICATED.inc(freed)
+            self._logger.info(
+                f'Deduplicated {len(duplicates)} copies of {original.path_on_disk}, freed {freed} bytes'
+            )
+        return duplicates
+
+    def hash_file(self, path: str) -> str | None:
+        """
+        Returns the sha256 of the file, read in chunks so memory stays flat
+        however big it is. None when it can't be read or stop() was called.
+        :param path:
+        :return:
+        """
+        digest = hashlib.sha256()
+        buffer = bytearray(self.CHUNK_SIZE)
+        view = memoryview(buffer)
+        try:
+            with open(path, 'rb', buffering=0) as file:
+                while not self._stop.is_set():
+                    read = file.readinto(buffer)
+                    if not read:
+                        return digest.hexdigest()
+                    digest.update(view[:read])
+        except OSError as e:
+            self._logger.warning(f'Not hashed, {e}')
+        return None
+
+    def _deduplicate(self, duplicate: YouTubeVideo, original: YouTubeVideo, mode: str) -> bool:
+        if mode == 'drop':
+            if not duplicate.mark_duplicate_of(original, deleted=True):
+                return False
+            delete_file(duplicate.path_on_disk, self._logger)
+            return True
+
+        # Linked before marking, so a failed link leaves a video counted in full.
+        link_path = f'{duplicate.path_on_disk}.ytracker-link'
+        try:
+            if not os.path.samefile(original.path_on_disk, duplicate.path_on_disk):
+                os.link(original.path_on_disk, link_path)
+                os.replace(link_path, duplicate.path_on_disk)
+        except OSError as e:
+            self._logger.warning(f'Not hardlinked to {original.path_on_disk}, {e}')
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            return False
+        return duplicate.mark_duplicate_of(original, deleted=False)
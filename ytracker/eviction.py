@@ -0,0 +1,148 @@
+import heapq
+import os
+import time
+from dataclasses import dataclass
+from ytracker.database import YouTubeVideo
+from ytracker.logger import Logger
+from ytracker.metrics import BYTES_EVICTED, VIDEOS_EVICTED
+from ytracker.utils import convert_gb_to_bytes, delete_file
+
+
+@dataclass(frozen=True, slots=True)
+class ChannelLimit:
+    channel: str
+    max_bytes: int | None = None
+    max_videos: int | None = None
+    max_age: float | None = None
+
+    @classmethod
+    def create(cls, channel: str, limit: dict) -> 'ChannelLimit':
+        """
+        :param channel: Url of the channel as in ytracker_urls.txt.
+        :param limit: Any of max_size in GB, max_videos and max_age in days.
+        :return:
+        :raises ValueError: When no limit is set or one is not positive.
+        """
+        max_size = limit.get('max_size')
+        max_videos = limit.get('max_videos')
+        max_age = limit.get('max_age')
+        channel_limit = cls(
+            str(channel).strip(),
+            int(float(max_size) * convert_gb_to_bytes(1)) if max_size is not None else None,
+            int(max_videos) if max_videos is not None else None,
+            float(max_age) * 24 * 3600 if max_age is not None else None
+        )
+        limits = [
+            value for value in (channel_limit.max_bytes, channel_limit.max_videos, channel_limit.max_age)
+            if value is not None
+        ]
+        if not channel_limit.channel or not limits or any(value < 0 for value in limits):
+            raise ValueError(f'Invalid limits of channel {channel}: {limit}')
+        return channel_limit
+
+    def values(self, now: float) -> tuple[str, int | None, int | None, str | None]:
+        """
+        Returns the limit as given to YouTubeVideo.plan_channel_eviction(),
+        max_age turned into the oldest created_at kept.
+        :param now:
+        :return:
+        """
+        min_created_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now - self.max_age)) \
+            if self.max_age is not None else None
+        return self.channel, self.max_bytes, self.max_videos, min_created_at
+
+
+class EvictionPlanner:
+    """
+    Frees storage by evicting as many videos as needed in one pass:
+    victims are chosen with a single query, marked deleted in a single
+    transaction and only then removed from disk.
+
+    The policy decides which videos go first. Policies ordered by a column
+    are planned by one windowed query over an index. 'least_recently_accessed'
+    depends on file access times the database doesn't have, so the not deleted
+    videos are heapified by atime and popped only until enough bytes are freed.
+    """
+    __slots__ = '_logger', '_policy'
+
+    POLICIES = (*YouTubeVideo.EVICTION_ORDERS, 'least_recently_accessed')
+
+    def __init__(self, logger: Logger, policy: str = 'oldest') -> None:
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown eviction policy: {policy}')
+        self._logger = logger
+        self._policy = policy
+
+    def plan(self, bytes_to_free: int) -> list[YouTubeVideo]:
+        """
+        Returns, in eviction order, the fewest videos the policy picks to
+        free `bytes_to_free`.
+        :param bytes_to_free:
+        :return:
+        """
+        if self._policy != 'least_recently_accessed':
+            return YouTubeVideo.plan_eviction(bytes_to_free, self._policy)
+        if bytes_to_free <= 0:
+            return []
+
+        candidates = [
+            (self._accessed_at(video.path_on_disk), video.table_id, video)
+            for video in YouTubeVideo.get_not_deleted()
+        ]
+        heapq.heapify(candidates)
+        victims = []
+        freed = 0
+        while candidates and freed < bytes_to_free:
+            _, _, video = heapq.heappop(candidates)
+            victims.append(video)
+            freed += video.file_size
+        return victims
+
+    def evict(self, bytes_to_free: int) -> list[YouTubeVideo]:
+        return self._evict(self.plan(bytes_to_free), f'by {self._policy} policy')
+
+    def evict_over_channel_limits(
+            self,
+            limits: tuple[ChannelLimit, ...],
+            now: float | None = None
+    ) -> list[YouTubeVideo]:
+        """
+        Evicts the oldest videos of every channel over its own limits,
+        planned with one query however many channels are limited.
+        :param limits:
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        victims = YouTubeVideo.plan_channel_eviction(limit.values(now) for limit in limits)
+        return self._evict(victims, 'over channel limits')
+
+    def _evict(self, victims: list[YouTubeVideo], reason: str) -> list[YouTubeVideo]:
+        if not victims:
+            return victims
+
+        # Hardlinked duplicates share the victims' bytes, which only go once they do too.
+        duplicates = YouTubeVideo.get_duplicates_of(victims)
+        YouTubeVideo.mark_deleted(victims + duplicates)
+        for video in victims + duplicates:
+            delete_file(video.path_on_disk, self._logger)
+
+        freed = sum(video.file_size for video in victims)
+        VIDEOS_EVICTED.inc(len(victims) + len(duplicates))
+        BYTES_EVICTED.inc(freed)
+        self._logger.info(f'Evicted {len(victims) + len(duplicates)} videos {reason}, freed {freed} bytes')
+
+        return victims + duplicates
+
+    @staticmethod
+    def _accessed_at(path: str) -> float:
+        """
+        Returns the access time of the file, or 0 for a missing file,
+        so videos gone from disk are evicted first.
+        :param path:
+        :return:
+        """
+        try:
+            return os.stat(path).st_atime
+        except OSError:
+            return 0.0
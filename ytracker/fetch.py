@@ -1,53 +1,163 @@
+import itertools
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime
+from functools import partial
 from ytracker.config import Config
-from ytracker.database import YouTubeVideo
+from ytracker.control import DaemonState
+from ytracker.database import DownloadedIndex
+from ytracker.formats import FormatNegotiator
 from ytracker.logger import Logger
-from typing import Optional
+from ytracker.metrics import (
+    BYTES_DOWNLOADED,
+    CHANNELS_SCANNED,
+    DOWNLOAD_THROUGHPUT,
+    DOWNLOADS_FAILED,
+    SCAN_DURATION,
+    VIDEOS_DISCOVERED,
+    VIDEOS_DOWNLOADED
+)
+from ytracker.ratelimit import BandwidthLimiter
+from ytracker.scheduler import ChannelScheduler, Watermark
+from ytracker.storage import StoragePolicy
+from ytracker.ydl import YoutubeDLPool
+from typing import Iterable, Iterator, Optional
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadCancelled, PagedList, filesize_from_tbr
+
+
+@dataclass(frozen=True, slots=True)
+class ChannelScan:
+    entries: list[dict]
+    watermark: Watermark | None = None
 
 
 class Urls:
-    __slots__ = '_channel_urls', '_logger'
+    __slots__ = '_channel_urls', '_logger', '_workers', '_scheduler', '_max_catch_up'
 
-    def __init__(self, channel_urls: tuple, logger: Logger) -> None:
+    # Entries read from a channel that was never scanned before.
+    FIRST_SCAN_SIZE = 10
+    # Already downloaded entries in a row after which a scan gives up looking for the watermark.
+    KNOWN_STREAK = 10
+
+    def __init__(
+            self,
+            channel_urls: tuple,
+            logger: Logger,
+            workers: int = 1,
+            scheduler: ChannelScheduler | None = None,
+            max_catch_up: int = 100
+    ) -> None:
         self._channel_urls = channel_urls
         self._logger = logger
+        self._workers = workers
+        self._scheduler = scheduler
+        self._max_catch_up = max_catch_up
 
-    def __iter__(self) -> str | None:
-        for channel_url in self._channel_urls:
-            for videos_info in self._get_info(channel_url):
-                yield videos_info.get('url', None)
+    def __iter__(self) -> Iterator[tuple[str | None, str]]:
+        """
+        Scans up to `workers` channels at once and yields video urls
+        of each channel as soon as its scan finishes, paired with the
+        url of the channel. The scheduler is told
+        how many new videos each channel had and where its newest video is.
+
+        A channel is recorded only after the consumer took all of its
+        urls. DownloadPool queues each url as a download job before it
+        asks for the next one. So the watermark never moves past a video
+        that is neither downloaded nor queued, and a channel cut short
+        is scanned from its old watermark again. A job that later fails
+        for good sits behind the watermark. DownloadJob.requeue_failed()
+        retries it, since scans don't find it again.
+        :return:
+        """
+        executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='ytracker-scan')
+        try:
+            futures = {
+                executor.submit(self._get_info, channel_url): channel_url
+                for channel_url in self._channel_urls
+            }
+            for future in as_completed(futures):
+                scan = future.result()
+                videos_info = scan.entries if scan is not None else []
+                for video_info in videos_info:
+                    yield video_info.get('url', None), futures[future]
+                if self._scheduler is not None:
+                    self._scheduler.record(
+                        futures[future],
+                        len(videos_info),
+                        scan.watermark if scan is not None else None
+                    )
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
 
-    # noinspection PyUnusedLocal
     @staticmethod
-    def _is_downloaded(info, *, incomplete):
-        video_id = info.get('id', False)
-        if video_id and YouTubeVideo.exists(video_id):
-            return 'Video is already downloaded.'
+    def _params() -> dict:
+        return {
+            'lazy_playlist': True,
+            'extract_flat': True,
+            'quiet': True,
+        }
 
-    def _get_info(self, playlist_url: str) -> Optional[list[dict]]:
+    def _get_info(self, playlist_url: str) -> Optional[ChannelScan]:
+        watermark = self._scheduler.watermark(playlist_url) if self._scheduler is not None else None
+        limit = self.FIRST_SCAN_SIZE if watermark is None else self._max_catch_up
+        started_at = time.perf_counter()
         try:
-            with YoutubeDL(
-                    {
-                        'match_filter': self._is_downloaded,
-                        'lazy_playlist': True,
-                        'break_per_url': True,
-                        'playlistend': 10,
-                        'extract_flat': True,
-                        'quiet': True,
-                    }
-            ) as ydl:
+            with YoutubeDLPool.get().acquire(('flat-scan',), self._params) as ydl:
                 self._logger.info(f'Getting videos from playlist: {playlist_url}')
-                info = ydl.sanitize_info(
-                    ydl.extract_info(playlist_url.strip(), download=False)
-                ).get('entries')
+                playlist = ydl.extract_info(playlist_url.strip(), download=False, process=False)
+                while playlist.get('_type') in ('url', 'url_transparent'):
+                    playlist = ydl.extract_info(playlist['url'], download=False, process=False)
+                entries = playlist.get('entries') or ()
+                if isinstance(entries, PagedList):
+                    entries = entries.getslice(0, limit)
+                scan = self._walk(entries, watermark, limit)
         except Exception as e:
             self._logger.error(f'Error occurred while getting video info, {e}')
+            CHANNELS_SCANNED.inc(status='error')
             return None
-        else:
-            return info
+        finally:
+            SCAN_DURATION.observe(time.perf_counter() - started_at)
+
+        CHANNELS_SCANNED.inc(status='ok')
+        VIDEOS_DISCOVERED.inc(len(scan.entries))
+        return scan
+
+    def _walk(self, entries: Iterable[dict], watermark: Watermark | None, limit: int) -> ChannelScan:
+        """
+        Reads the lazily fetched playlist, newest first, until it reaches the
+        watermark or `limit` entries, collecting videos not downloaded yet.
+        :param entries:
+        :param watermark:
+        :param limit:
+        :return:
+        """
+        downloaded = DownloadedIndex.get()
+        new_entries = []
+        newest = None
+        known_streak = 0
+        for entry in itertools.islice(entries, limit):
+            video_id = entry.get('id')
+            if not video_id:
+                continue
+            upload_date = entry.get('upload_date')
+            if newest is None:
+                newest = Watermark(video_id, upload_date)
+            if watermark is not None:
+                if video_id == watermark.video_id:
+                    break
+                if upload_date and watermark.upload_date and upload_date < watermark.upload_date:
+                    break
+            if video_id in downloaded:
+                known_streak += 1
+                if watermark is not None and known_streak >= self.KNOWN_STREAK:
+                    break
+                continue
+            known_streak = 0
+            new_entries.append(entry)
+
+        return ChannelScan(new_entries, newest)
 
 
 @dataclass(slots=True)
@@ -55,80 +165,142 @@ class VideoInfo:
     video_id: str
     path_on_disk: str
     file_size: int | None = None
+    upload_date: str | None = None
+    channel: str | None = None
 
 
 class VideoFetcher:
-    __slots__ = '_config', '_logger'
+    __slots__ = '_config', '_logger', '_storage'
 
-    def __init__(self, config: Config, logger: Logger) -> None:
+    def __init__(self, config: Config, logger: Logger, storage: StoragePolicy | None = None) -> None:
         self._config = config
         self._logger = logger
+        self._storage = StoragePolicy(config, logger) if storage is None else storage
 
-    def _format_output_path(self, *, without_format: bool = False) -> str:
+    def _format_output_path(self) -> str:
         download_path = self._config.options.download_path
         slash = '' if download_path.endswith('/') else '/'
-        if without_format:
-            return f'{download_path}{slash}'
         return f'{download_path}{slash}%(upload_date)s_%(uploader)s_%(id)s.%(ext)s'
 
-    def _format_video_format(self) -> str:
-        video_format = self._config.options.video_quality
-        if video_format == '1080':
-            return '137'
-        if video_format == '720':
-            return '22'
-        if video_format == '480':
-            return '135'
-        if video_format == '360':
-            return '18'
-
-    def _set_video_info(self, video_url: str) -> VideoInfo | bool:
-        self._logger.info(f'Getting video info: {video_url}')
-        with YoutubeDL({'quiet': True}) as ydl:
-            video_info = ydl.sanitize_info(ydl.extract_info(video_url, download=False))
-
-        if not isinstance(video_info, dict):
-            self._logger.error('Video info not downloaded')
-            return False
-
-        download_path = self._format_output_path(without_format=True)
+    def _profile(self, format_spec: str) -> tuple:
+        return (
+            'download',
+            self._format_output_path(),
+            format_spec,
+            self._config.options.per_download_rate_limit
+        )
 
-        uploader = video_info.get('uploader', False)
-        if not uploader:
-            return False
-        video_id = video_info.get('id', False)
-        if not video_id:
-            return False
-        upload_date = video_info.get('upload_date', datetime.now().strftime('%Y%m%d'))
+    @staticmethod
+    def _downloaded_path(ydl: YoutubeDL, video_info: dict) -> str:
+        """
+        Returns the final path yt-dlp wrote the video to, after any merging
+        or remuxing, falling back to the output template.
+        :param ydl:
+        :param video_info:
+        :return:
+        """
+        requested_downloads = video_info.get('requested_downloads') or ()
+        for requested_download in reversed(requested_downloads):
+            if requested_download.get('filepath'):
+                return requested_download['filepath']
+        return ydl.prepare_filename(video_info)
 
-        return VideoInfo(
-            video_info.get('id', 'unknown-id'),
-            f'{download_path}{upload_date}_{uploader}_{video_id}.mp4'
+    @staticmethod
+    def _expected_size(video_format: dict, duration: float | None) -> int:
+        """
+        Returns the size yt-dlp expects the download to have, summed over
+        merged formats, or 0 when it doesn't know.
+        :param video_format: Format chosen for the download.
+        :param duration: Length of the video in seconds, to estimate sizes from bitrates.
+        :return:
+        """
+        formats = video_format.get('requested_formats') or (video_format,)
+        return sum(
+            int(
+                requested.get('filesize')
+                or requested.get('filesize_approx')
+                or filesize_from_tbr(requested.get('tbr'), duration)
+                or 0
+            )
+            for requested in formats
         )
 
+    def _params(self, format_spec: str) -> dict:
+        return {
+            'quiet': True,
+            'outtmpl': self._format_output_path(),
+            'format': format_spec,
+            'ratelimit': self._config.options.per_download_rate_limit or None,
+            'progress_hooks': [BandwidthLimiter.get().progress_hook, DaemonState.get().cancel_hook]
+        }
+
     def download(self, video_url: str) -> VideoInfo | bool:
-        video_info = self._set_video_info(video_url)
-        if not video_info:
-            return False
-        self._logger.info(f'Started downloading: {video_url}')
+        started_at = time.perf_counter()
+        video_info = self._download(video_url)
+        if not isinstance(video_info, VideoInfo):
+            DOWNLOADS_FAILED.inc()
+            return video_info
+
+        VIDEOS_DOWNLOADED.inc()
+        BYTES_DOWNLOADED.inc(video_info.file_size)
+        DOWNLOAD_THROUGHPUT.observe(video_info.file_size / max(time.perf_counter() - started_at, 0.001))
+        return video_info
+
+    def _download(self, video_url: str) -> VideoInfo | bool:
+        self._logger.info(f'Getting video info: {video_url}')
+        negotiator = FormatNegotiator.get()
+        quality = self._config.options.video_quality
+        extract_spec = negotiator.spec(quality)
+        choice = None
         try:
-            with YoutubeDL(
-                    {
-                        'quiet': True,
-                        'outtmpl': self._format_output_path(),
-                        'format': self._format_video_format()
-                    }
-            ) as ydl:
-                ydl.download(video_url)
+            with YoutubeDLPool.get().acquire(self._profile(extract_spec), partial(self._params, extract_spec)) as ydl:
+                # Unprocessed, so formats are selected once by choose() and once
+                # more by process_ie_result(), rather than also during extraction.
+                video_info = ydl.extract_info(video_url, download=False, process=False)
+                while isinstance(video_info, dict) and video_info.get('_type') in ('url', 'url_transparent'):
+                    video_info = ydl.extract_info(video_info['url'], download=False, process=False)
+                if not isinstance(video_info, dict):
+                    self._logger.error('Video info not downloaded')
+                    return False
+                if not video_info.get('uploader', False) or not video_info.get('id', False):
+                    return False
+                ydl.sort_formats(video_info)
+                choice = negotiator.choose(ydl, video_info, quality)
+            if choice is None:
+                self._logger.error(f'No format of quality {quality} or lower available: {video_url}')
+                return False
+
+            expected_size = self._expected_size(choice.formats[0], video_info.get('duration'))
+            with self._storage.room_for(expected_size) as fits:
+                if not fits:
+                    self._logger.error(f'Not enough storage for {expected_size} bytes: {video_url}')
+                    return False
+                self._logger.info(f'Started downloading {choice.profile.name} format: {video_url}')
+                spec = choice.profile.spec
+                with YoutubeDLPool.get().acquire(self._profile(spec), partial(self._params, spec)) as ydl:
+                    downloaded_info = ydl.process_ie_result(video_info, download=True)
+                    path_on_disk = self._downloaded_path(ydl, downloaded_info)
+        except DownloadCancelled:
+            raise
         except Exception as e:
             self._logger.error(f'YouTubeDL error occurred while downloading video, {e}')
+            if choice is not None:
+                negotiator.forget(video_info, quality)
             return False
 
-        if not os.path.isfile(video_info.path_on_disk):
-            self._logger.error(f'Video not downloaded: {video_info.path_on_disk}')
+        if not os.path.isfile(path_on_disk):
+            self._logger.error(f'Video not downloaded: {path_on_disk}')
+            negotiator.forget(video_info, quality)
             return False
 
+        negotiator.remember(video_info, quality, choice.profile)
         self._logger.info(f'Finished downloading {video_url}')
-        video_info.file_size = os.path.getsize(video_info.path_on_disk)
+        file_size = os.path.getsize(path_on_disk)
+        self._storage.add(file_size)
 
-        return video_info
+        return VideoInfo(
+            downloaded_info['id'],
+            path_on_disk,
+            file_size,
+            downloaded_info.get('upload_date')
+        )
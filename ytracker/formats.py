@@ -0,0 +1,130 @@
+import threading
+from dataclasses import dataclass
+from typing import Hashable, Optional
+from yt_dlp import YoutubeDL
+from yt_dlp.postprocessor import FFmpegMergerPP
+
+
+@dataclass(frozen=True, slots=True)
+class FormatProfile:
+    name: str
+    spec: str
+    merge: bool = False
+    capped: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class FormatChoice:
+    profile: FormatProfile
+    formats: list[dict]
+
+
+class FormatNegotiator:
+    """
+    Picks what to download from a ladder of format profiles, best first.
+
+    Every profile stays within the configured quality, except the last
+    resort. Profiles merging separate video and audio streams are skipped
+    when ffmpeg can't merge, so a download never comes back without audio.
+    The ladder is evaluated against the formats extraction already fetched,
+    so falling back costs no request. The ladder is always walked best
+    first. The profile that last worked for a channel only breaks ties: it
+    is taken over the ladder's pick when it reaches the same height, e.g. a
+    progressive format that needs no merge.
+    """
+    __slots__ = '_working', '_can_merge', '_lock'
+
+    _instance: Optional['FormatNegotiator'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, can_merge: bool | None = None) -> None:
+        self._working: dict[tuple[Hashable, str], str] = {}
+        self._can_merge = can_merge
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls) -> 'FormatNegotiator':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def can_merge(self) -> bool:
+        if self._can_merge is None:
+            merger = FFmpegMergerPP(None)
+            self._can_merge = merger.available and merger.can_merge()
+        return self._can_merge
+
+    def profiles(self, quality: str) -> tuple[FormatProfile, ...]:
+        """
+        Returns the ladder for `quality`, a video height such as '720'.
+        :param quality:
+        :return:
+        """
+        height = quality if str(quality).isdigit() else '720'
+        ladder = (
+            FormatProfile('mp4', f'bv*[height<={height}][ext=mp4]+ba[ext=m4a]', merge=True),
+            FormatProfile('merged', f'bv*[height<={height}]+ba', merge=True),
+            FormatProfile('single', f'b[height<={height}]'),
+            FormatProfile('any', 'b', capped=False),
+        )
+        return tuple(profile for profile in ladder if self.can_merge or not profile.merge)
+
+    def spec(self, quality: str) -> str:
+        """
+        Returns the whole ladder as one yt-dlp format spec, so extraction
+        finds some format whichever profile is chosen afterwards.
+        :param quality:
+        :return:
+        """
+        return '/'.join(profile.spec for profile in self.profiles(quality))
+
+    def choose(self, ydl: YoutubeDL, video_info: dict, quality: str) -> FormatChoice | None:
+        """
+        Returns the first profile with formats available in `video_info`, or
+        the one that last worked for the video's channel when its formats are
+        as high.
+        :param ydl:
+        :param video_info: Extracted info of the video.
+        :param quality:
+        :return:
+        """
+        profiles = self.profiles(quality)
+        with self._lock:
+            working = self._working.get((self._channel(video_info), quality))
+
+        formats = video_info.get('formats') or [video_info]
+        ctx = {
+            'formats': formats,
+            'has_merged_format': any('none' not in (f.get('acodec'), f.get('vcodec')) for f in formats),
+            'incomplete_formats': all(f.get('vcodec') == 'none' for f in formats)
+            or all(f.get('acodec') == 'none' for f in formats),
+        }
+        for index, profile in enumerate(profiles):
+            selected = list(ydl.build_format_selector(profile.spec)(ctx))
+            if selected:
+                break
+        else:
+            return None
+
+        choice = FormatChoice(profile, selected)
+        for remembered in profiles[index + 1:]:
+            if remembered.name != working or not remembered.capped:
+                continue
+            selected = list(ydl.build_format_selector(remembered.spec)(ctx))
+            if selected and (selected[0].get('height') or 0) >= (choice.formats[0].get('height') or 0):
+                return FormatChoice(remembered, selected)
+        return choice
+
+    def remember(self, video_info: dict, quality: str, profile: FormatProfile) -> None:
+        with self._lock:
+            self._working[(self._channel(video_info), quality)] = profile.name
+
+    def forget(self, video_info: dict, quality: str) -> None:
+        with self._lock:
+            self._working.pop((self._channel(video_info), quality), None)
+
+    @staticmethod
+    def _channel(video_info: dict) -> Hashable:
+        return video_info.get('channel_id') or video_info.get('uploader_id') or video_info.get('uploader')
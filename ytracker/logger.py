@@ -1,13 +1,36 @@
+import atexit
 import os
 import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
 
 
 class Logger:
+    """
+    Thin wrapper around the shared 'ytracker' logger.
+
+    Records are put on a queue and written to a rotating log file by a
+    single listener thread, so workers never wait on log I/O. The handlers
+    are set up once per process, however many Logger instances exist. The
+    listener is stopped around fork() and restarted in both processes,
+    since a forked child inherits no threads.
+    """
     __slots__ = '_logger',
 
+    NAME = 'ytracker'
+    FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    MAX_BYTES = 10 * 1024 * 1024
+    BACKUP_COUNT = 5
+
+    _queue: queue.SimpleQueue = queue.SimpleQueue()
+    _file_handler: Optional[RotatingFileHandler] = None
+    _listener: Optional[QueueListener] = None
+    _setup_lock = threading.RLock()
+
     def __init__(self, log_file_path=None) -> None:
-        self._logger = logging.getLogger('ytracker')
-        self._logger.setLevel(logging.DEBUG)
+        self._logger = logging.getLogger(self.NAME)
 
         log_file_path = os.path.join(
             os.environ.get('HOME'),
@@ -17,11 +40,87 @@ class Logger:
             'ytracker.log'
         ) if log_file_path is None else log_file_path
 
-        file_handler = logging.FileHandler(log_file_path)
-        file_handler.setFormatter(
-            logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        )
-        self._logger.addHandler(file_handler)
+        self._setup(log_file_path)
+
+    @classmethod
+    def _setup(cls, log_file_path: str) -> None:
+        """
+        Attaches the queue handler once and (re)starts the listener writing
+        to `log_file_path`. Does nothing when it already writes there.
+        :param log_file_path:
+        :return:
+        """
+        with cls._setup_lock:
+            logger = logging.getLogger(cls.NAME)
+            if not any(isinstance(handler, QueueHandler) for handler in logger.handlers):
+                logger.setLevel(logging.DEBUG)
+                logger.addHandler(QueueHandler(cls._queue))
+                atexit.register(cls._stop_listener)
+                os.register_at_fork(
+                    before=cls._stop_listener,
+                    after_in_parent=cls._start_listener,
+                    after_in_child=cls._start_listener
+                )
+
+            if cls._file_handler is not None and cls._file_handler.baseFilename == os.path.abspath(log_file_path):
+                return
+
+            os.makedirs(os.path.dirname(os.path.abspath(log_file_path)), exist_ok=True)
+            file_handler = RotatingFileHandler(
+                log_file_path,
+                maxBytes=cls._file_handler.maxBytes if cls._file_handler is not None else cls.MAX_BYTES,
+                backupCount=cls.BACKUP_COUNT,
+                delay=True
+            )
+            file_handler.setFormatter(logging.Formatter(cls.FORMAT))
+
+            cls._stop_listener()
+            if cls._file_handler is not None:
+                cls._file_handler.close()
+            cls._file_handler = file_handler
+            cls._start_listener()
+
+    @classmethod
+    def _start_listener(cls) -> None:
+        with cls._setup_lock:
+            if cls._listener is None and cls._file_handler is not None:
+                cls._listener = QueueListener(cls._queue, cls._file_handler)
+                cls._listener.start()
+
+    @classmethod
+    def _stop_listener(cls) -> None:
+        """
+        Writes out every queued record and stops the listener thread.
+        :return:
+        """
+        with cls._setup_lock:
+            if cls._listener is not None:
+                cls._listener.stop()
+                cls._listener = None
+            if cls._file_handler is not None:
+                cls._file_handler.flush()
+
+    def configure(self, level: str = 'DEBUG', max_size: int | None = None) -> 'Logger':
+        """
+        Applies the configured log level and rotation size.
+        :param level: Name of the lowest level written, e.g. 'INFO'.
+        :param max_size: Size in megabytes after which the log file is rotated.
+        :return:
+        """
+        self._logger.setLevel(level)
+        with self._setup_lock:
+            if max_size is not None:
+                self._file_handler.maxBytes = max_size * 1024 * 1024
+        return self
+
+    def flush(self) -> None:
+        """
+        Blocks until every record logged so far is written to the log file.
+        :return:
+        """
+        with self._setup_lock:
+            self._stop_listener()
+            self._start_listener()
 
     def info(self, msg: str) -> None:
         self._logger.info(msg)
@@ -0,0 +1,226 @@
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional
+from ytracker.logger import Logger
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    __slots__ = 'name', 'help', '_values', '_lock'
+
+    TYPE = 'untyped'
+
+    def __init__(self, name: str, help_text: str) -> None:
+        self.name = name
+        self.help = help_text
+        self._values: dict[tuple[tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: dict) -> tuple[tuple[str, str], ...]:
+        return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{_format_labels(labels)} {_format_value(value)}'
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.TYPE}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    __slots__ = ()
+
+    TYPE = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    __slots__ = ()
+
+    TYPE = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    __slots__ = 'buckets', '_counts', '_sums'
+
+    TYPE = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._counts: dict[tuple[tuple[str, str], ...], list[int]] = {}
+        self._sums: dict[tuple[tuple[str, str], ...], float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = labels + (('le', _format_value(bound)),)
+                yield f'{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}'
+            yield f'{self.name}_count{_format_labels(labels)} {cumulative}'
+
+
+class Registry:
+    __slots__ = '_metrics', '_lock'
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+CHANNELS_SCANNED = REGISTRY.register(Counter(
+    'ytracker_channels_scanned_total', 'Channel scans by outcome.'))
+SCAN_DURATION = REGISTRY.register(Histogram(
+    'ytracker_scan_duration_seconds', 'Time spent scanning one channel.'))
+VIDEOS_DISCOVERED = REGISTRY.register(Counter(
+    'ytracker_videos_discovered_total', 'New videos found by channel scans.'))
+VIDEOS_DOWNLOADED = REGISTRY.register(Counter(
+    'ytracker_videos_downloaded_total', 'Videos downloaded successfully.'))
+DOWNLOADS_FAILED = REGISTRY.register(Counter(
+    'ytracker_downloads_failed_total', 'Video downloads that failed.'))
+BYTES_DOWNLOADED = REGISTRY.register(Counter(
+    'ytracker_downloaded_bytes_total', 'Bytes of downloaded videos.'))
+DOWNLOAD_THROUGHPUT = REGISTRY.register(Histogram(
+    'ytracker_download_throughput_bytes_per_second', 'Average throughput of each finished download.',
+    buckets=(1e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 5e7, 1e8)))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'ytracker_db_query_duration_seconds', 'SQLite query latency by operation.',
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)))
+VIDEOS_EVICTED = REGISTRY.register(Counter(
+    'ytracker_videos_evicted_total', 'Videos deleted to free storage.'))
+BYTES_EVICTED = REGISTRY.register(Counter(
+    'ytracker_evicted_bytes_total', 'Bytes freed by evicting videos.'))
+VIDEOS_DEDUPLICATED = REGISTRY.register(Counter(
+    'ytracker_videos_deduplicated_total', 'Videos found to be duplicates of another video.'))
+BYTES_DEDUPLICATED = REGISTRY.register(Counter(
+    'ytracker_deduplicated_bytes_total', 'Bytes freed by hardlinking or dropping duplicate videos.'))
+STORAGE_USED = REGISTRY.register(Gauge(
+    'ytracker_storage_used_bytes', 'Bytes taken by downloaded videos.'))
+STORAGE_LIMIT = REGISTRY.register(Gauge(
+    'ytracker_storage_limit_bytes', 'Configured storage_size in bytes.'))
+CYCLE_DURATION = REGISTRY.register(Histogram(
+    'ytracker_cycle_duration_seconds', 'Time spent on one discovery, download and eviction cycle.'))
+
+
+class MetricsServer:
+    """
+    Serves the registry in Prometheus text format on localhost.
+    """
+    __slots__ = '_server', '_thread', '_logger'
+
+    def __init__(self, port: int, logger: Logger, registry: Registry = REGISTRY) -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+        self._logger = logger
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='ytracker-metrics', daemon=True)
+        self._thread.start()
+        self._logger.info(f'Serving metrics on http://127.0.0.1:{self.port}/metrics')
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,120 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, Optional
+from ytracker.logger import Logger
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileReport:
+    report_path: str
+    pstats_path: str | None
+    seconds: float
+    peak_memory: int
+
+
+class CycleProfiler:
+    """
+    Runs one function under cProfile and tracemalloc and writes what it found.
+
+    cProfile only sees the thread that enabled it, so every thread started
+    while profiling, such as scan and download workers, gets a profiler of
+    its own. Their stats are merged into one report.
+    """
+    __slots__ = '_logger', '_report_dir', '_profilers', '_lock'
+
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 25
+
+    def __init__(self, logger: Logger, report_dir: Optional[str] = None) -> None:
+        self._logger = logger
+        self._report_dir = os.path.join(
+            os.path.expanduser('~'),
+            '.local',
+            'share',
+            'ytracker'
+        ) if report_dir is None else report_dir
+        self._profilers: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def run(self, function: Callable[[], object], save_pstats: bool = False) -> ProfileReport:
+        """
+        Calls `function` once and writes profile-<time>.txt to the report dir,
+        with the hottest functions and the top allocation sites.
+        :param function:
+        :param save_pstats: Also write profile-<time>.pstats, e.g. for snakeviz.
+        :return:
+        """
+        os.makedirs(self._report_dir, exist_ok=True)
+        base_path = os.path.join(self._report_dir, f'profile-{time.strftime("%Y%m%d-%H%M%S")}')
+        main_profiler = cProfile.Profile()
+        self._profilers = [main_profiler]
+
+        tracemalloc.start()
+        threading.setprofile(self._profile_thread)
+        started_at = time.perf_counter()
+        main_profiler.enable()
+        try:
+            function()
+        finally:
+            main_profiler.disable()
+            seconds = time.perf_counter() - started_at
+            threading.setprofile(None)
+            snapshot = tracemalloc.take_snapshot()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        stats = pstats.Stats(main_profiler)
+        with self._lock:
+            for profiler in self._profilers[1:]:
+                stats.add(profiler)
+
+        report = ProfileReport(
+            f'{base_path}.txt',
+            f'{base_path}.pstats' if save_pstats else None,
+            seconds,
+            peak_memory
+        )
+        with open(report.report_path, 'w') as report_file:
+            report_file.write(self._format(report, stats, snapshot))
+        if report.pstats_path is not None:
+            stats.dump_stats(report.pstats_path)
+        self._logger.info(f'Profile written: {report.report_path}')
+        return report
+
+    def _profile_thread(self, *_) -> None:
+        """
+        First profile event of a new thread. Replaces itself with a cProfile
+        profiler owned by that thread.
+        :return:
+        """
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._profilers.append(profiler)
+        profiler.enable()
+
+    def _format(self, report: ProfileReport, stats: pstats.Stats, snapshot: tracemalloc.Snapshot) -> str:
+        output = io.StringIO()
+        output.write(f'Cycle took {report.seconds:.3f}s, '
+                     f'{len(self._profilers)} threads profiled, '
+                     f'peak traced memory {report.peak_memory / 1024 / 1024:.1f} MiB\n\n')
+
+        stats.stream = output
+        for sort_key in (pstats.SortKey.CUMULATIVE, pstats.SortKey.TIME):
+            output.write(f'=== Top {self.TOP_FUNCTIONS} functions by {sort_key.value} time ===\n')
+            stats.sort_stats(sort_key).print_stats(self.TOP_FUNCTIONS)
+
+        output.write(f'=== Top {self.TOP_ALLOCATIONS} allocation sites ===\n')
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+        for statistic in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]:
+            output.write(f'{statistic}\n')
+        return output.getvalue()
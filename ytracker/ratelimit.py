@@ -0,0 +1,162 @@
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket counting bytes.
+
+    `consume()` takes the bytes right away, going into debt if needed, and
+    sleeps the calling thread until the debt is paid off, so threads sharing
+    a bucket share its rate. A rate of 0 means unlimited.
+    """
+    __slots__ = '_rate', '_tokens', '_updated_at', '_lock', '_clock', '_sleep'
+
+    def __init__(
+            self,
+            rate: float,
+            clock: Callable[[], float] = time.monotonic,
+            sleep: Callable[[float], None] = time.sleep
+    ) -> None:
+        self._rate = rate
+        self._tokens = rate
+        self._clock = clock
+        self._sleep = sleep
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill()
+            self._rate = rate
+            self._tokens = min(self._tokens, rate)
+
+    def consume(self, amount: float) -> float:
+        """
+        Takes `amount` bytes from the bucket and waits as long as the rate requires.
+        :param amount:
+        :return: Seconds waited.
+        """
+        with self._lock:
+            if self._rate <= 0:
+                return 0.0
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def _refill(self) -> None:
+        now = self._clock()
+        if self._rate > 0:
+            # A full bucket allows a burst of one second worth of bytes.
+            self._tokens = min(self._rate, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitWindow:
+    start: str
+    end: str
+    rate_limit: int
+
+    @classmethod
+    def create(cls, window: dict) -> 'RateLimitWindow':
+        start = datetime.strptime(str(window['start']), '%H:%M').strftime('%H:%M')
+        end = datetime.strptime(str(window['end']), '%H:%M').strftime('%H:%M')
+        return cls(start, end, max(0, int(window['rate_limit'])))
+
+    def contains(self, moment: datetime) -> bool:
+        clock = moment.strftime('%H:%M')
+        if self.start <= self.end:
+            return self.start <= clock < self.end
+        return clock >= self.start or clock < self.end
+
+
+class BandwidthLimiter:
+    """
+    Process-wide limit on download bandwidth.
+
+    Every download reports its progress through `progress_hook`, which
+    charges the newly received bytes to one shared bucket and so blocks
+    the downloading thread when all downloads together go over the limit.
+    The limit follows the time-of-day schedule from the config.
+
+    A download's first report is only its baseline. When yt-dlp resumes a
+    .part file, that report already counts the bytes on disk, which must
+    not be charged. Only the bytes received after it are.
+    """
+    __slots__ = '_bucket', '_rate_limit', '_schedule', '_downloaded', '_lock', '_checked_at', '_now'
+
+    _instance: Optional['BandwidthLimiter'] = None
+    _instance_lock = threading.Lock()
+
+    # Seconds between checks whether another schedule window started.
+    SCHEDULE_CHECK_INTERVAL = 30
+
+    def __init__(
+            self,
+            bucket: TokenBucket | None = None,
+            now: Callable[[], datetime] = datetime.now
+    ) -> None:
+        self._bucket = TokenBucket(0) if bucket is None else bucket
+        self._rate_limit = 0
+        self._schedule: tuple[RateLimitWindow, ...] = ()
+        self._downloaded: dict[tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self._checked_at: float | None = None
+        self._now = now
+
+    @classmethod
+    def get(cls) -> 'BandwidthLimiter':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def configure(self, rate_limit: int, schedule: tuple[RateLimitWindow, ...] = ()) -> None:
+        with self._lock:
+            self._rate_limit = rate_limit
+            self._schedule = schedule
+            self._checked_at = None
+        self._apply_schedule()
+
+    def current_rate_limit(self) -> int:
+        moment = self._now()
+        for window in self._schedule:
+            if window.contains(moment):
+                return window.rate_limit
+        return self._rate_limit
+
+    def progress_hook(self, progress: dict) -> None:
+        key = (threading.get_ident(), progress.get('tmpfilename') or progress.get('filename') or '')
+        if progress.get('status') != 'downloading':
+            with self._lock:
+                self._downloaded.pop(key, None)
+            return
+
+        downloaded_bytes = progress.get('downloaded_bytes') or 0
+        with self._lock:
+            received = downloaded_bytes - self._downloaded.get(key, downloaded_bytes)
+            self._downloaded[key] = downloaded_bytes
+        self._apply_schedule()
+        if received > 0:
+            self._bucket.consume(received)
+
+    def _apply_schedule(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.SCHEDULE_CHECK_INTERVAL:
+                return
+            self._checked_at = now
+        rate_limit = self.current_rate_limit()
+        if rate_limit != self._bucket.rate:
+            self._bucket.set_rate(rate_limit)
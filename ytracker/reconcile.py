@@ -0,0 +1,138 @@
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from ytracker.config import Config
+from ytracker.database import DownloadJob, YouTubeVideo
+from ytracker.logger import Logger
+from ytracker.utils import delete_file, video_id_of
+
+# Matches the output template used by VideoFetcher: %(upload_date)s_%(uploader)s_%(id)s.%(ext)s
+FILE_NAME_PATTERN = re.compile(r'^(?P<upload_date>\d{8}|NA)_(?P<uploader>.+)_(?P<video_id>[\w-]{11})\.(?P<ext>.+)$')
+# Single format files yt-dlp downloads before merging them, e.g. .f137.mp4
+FORMAT_FILE_PATTERN = re.compile(r'^f\d+\.')
+# Containers yt-dlp downloads or merges videos into. Thumbnails, subtitles and
+# .info.json files match the output template too, but are not videos.
+VIDEO_EXTENSIONS = frozenset(('mp4', 'm4v', 'mkv', 'webm', 'mov', 'flv', 'avi', '3gp'))
+
+
+@dataclass(slots=True)
+class ReconcileReport:
+    adopted: int = 0
+    corrected: int = 0
+    marked_deleted: int = 0
+    removed_partials: int = 0
+    resumable: list[str] = field(default_factory=list)
+
+
+class Reconciler:
+    """
+    Brings download_history in line with the files actually in download_path.
+
+    Finished files without a row are adopted, rows whose file is gone are
+    marked deleted and stale sizes are corrected, all in one transaction.
+    Adopted videos get the channel their download job recorded. Once that
+    job is pruned the channel is unknown, and the video counts only toward
+    the global storage limit, not the channel_limits.
+    Partial downloads of videos not in the history are reported as
+    resumable, since yt-dlp continues a .part file of the same name, while
+    leftovers of finished videos and abandoned partials are removed.
+    """
+    __slots__ = '_config', '_logger'
+
+    PARTIAL_SUFFIXES = ('.part', '.ytdl')
+    # Partial downloads untouched for longer than this are not worth resuming.
+    PARTIAL_MAX_AGE = 7 * 24 * 3600
+
+    def __init__(self, config: Config, logger: Logger) -> None:
+        self._config = config
+        self._logger = logger
+
+    @staticmethod
+    def is_video(ext: str) -> bool:
+        """
+        Returns True when `ext`, e.g. 'mp4' or 'f137.mp4.part', belongs to a video container.
+        :param ext:
+        :return:
+        """
+        return any(part.split('-')[0].lower() in VIDEO_EXTENSIONS for part in ext.split('.'))
+
+    @classmethod
+    def is_partial(cls, file_name: str, ext: str) -> bool:
+        return file_name.endswith(cls.PARTIAL_SUFFIXES) \
+            or '.part-Frag' in file_name \
+            or '.temp.' in file_name \
+            or FORMAT_FILE_PATTERN.match(ext) is not None
+
+    def run(self, now: float | None = None) -> ReconcileReport:
+        now = time.time() if now is None else now
+        report = ReconcileReport()
+        finished, partials = self._scan()
+        videos = {video.video_id: video for video in YouTubeVideo.get_all()}
+
+        inserted = []
+        updated = []
+        channels = None
+        for video_id, (path, size, upload_date) in finished.items():
+            if video_id not in videos:
+                if channels is None:
+                    channels = {video_id_of(url): channel for url, channel in DownloadJob.get_channels().items()}
+                inserted.append(YouTubeVideo()
+                                .set_youtube_video_id(video_id)
+                                .set_path_on_disk(path)
+                                .set_file_size(size)
+                                .set_upload_date(upload_date)
+                                .set_channel(channels.get(video_id)))
+        for video in videos.values():
+            if video.deleted:
+                continue
+            path, size, _ = finished.get(video.video_id, (None, None, None))
+            if path is None:
+                updated.append(video.set_deleted(True))
+                report.marked_deleted += 1
+            elif path != video.path_on_disk or size != video.file_size:
+                updated.append(video.set_path_on_disk(path).set_file_size(size))
+                report.corrected += 1
+        report.adopted = len(inserted)
+        if inserted or updated:
+            YouTubeVideo.save_all(inserted, updated)
+
+        for video_id, path, modified_at in partials:
+            if video_id not in videos and video_id not in finished and now - modified_at < self.PARTIAL_MAX_AGE:
+                if video_id not in report.resumable:
+                    report.resumable.append(video_id)
+                continue
+            delete_file(path, self._logger)
+            report.removed_partials += 1
+
+        self._logger.info(
+            f'Reconciled {self._config.options.download_path}: adopted {report.adopted}, '
+            f'corrected {report.corrected}, marked deleted {report.marked_deleted}, '
+            f'removed {report.removed_partials} partial files, {len(report.resumable)} resumable'
+        )
+
+        return report
+
+    def _scan(self) -> tuple[dict[str, tuple[str, int, str | None]], list[tuple[str, str, float]]]:
+        finished: dict[str, tuple[str, int, str | None]] = {}
+        partials: list[tuple[str, str, float]] = []
+        try:
+            entries = os.scandir(self._config.options.download_path)
+        except FileNotFoundError:
+            return finished, partials
+
+        with entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                match = FILE_NAME_PATTERN.match(entry.name)
+                if match is None or not self.is_video(match['ext']):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if self.is_partial(entry.name, match['ext']):
+                    partials.append((match['video_id'], entry.path, stat.st_mtime))
+                else:
+                    upload_date = match['upload_date'] if match['upload_date'] != 'NA' else None
+                    finished[match['video_id']] = (entry.path, stat.st_size, upload_date)
+
+        return finished, partials
@@ -0,0 +1,156 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+from ytracker.config import Config, Options
+from ytracker.exception import ProgramShouldExit
+from ytracker.logger import Logger
+from ytracker.utils import load_urls, urls_path
+
+
+@dataclass(frozen=True, slots=True)
+class FileStamp:
+    mtime_ns: int
+    size: int
+    inode: int
+
+    @classmethod
+    def of(cls, path: str) -> Optional['FileStamp']:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return cls(stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+@dataclass(frozen=True, slots=True)
+class ReloadResult:
+    previous_options: Options | None = None
+    channels_changed: bool = False
+
+    @property
+    def config_changed(self) -> bool:
+        return self.previous_options is not None
+
+
+class Reloader:
+    """
+    Keeps the config and the channel list in step with config.json and
+    ytracker_urls.txt while the daemon runs.
+
+    Files are stat()ed at most every WATCH_INTERVAL seconds. Only a file
+    whose stamp changed is read, and only a file whose content changed is
+    parsed. A reload can also be requested, e.g. on SIGHUP, which rereads
+    both files. A file that fails to parse leaves the current values in place.
+    """
+    __slots__ = (
+        '_config',
+        '_logger',
+        '_conf_path',
+        '_urls_path',
+        '_channel_urls',
+        '_stamps',
+        '_contents',
+        '_requested',
+        '_checked_at'
+    )
+
+    WATCH_INTERVAL = 5.0
+
+    def __init__(
+            self,
+            config: Config,
+            logger: Logger,
+            conf_path: str | None = None,
+            channel_urls_path: str | None = None
+    ) -> None:
+        self._config = config
+        self._logger = logger
+        self._conf_path = Config.conf_path() if conf_path is None else conf_path
+        self._urls_path = urls_path() if channel_urls_path is None else channel_urls_path
+        self._channel_urls = load_urls(self._urls_path)
+        self._stamps = {path: FileStamp.of(path) for path in (self._conf_path, self._urls_path)}
+        self._contents = {path: self._read(path) for path in (self._conf_path, self._urls_path)}
+        self._requested = False
+        self._checked_at = time.monotonic()
+
+    @property
+    def channel_urls(self) -> tuple:
+        return self._channel_urls
+
+    def request(self, *_) -> None:
+        """
+        Asks for both files to be reread. Safe to use as a signal handler.
+        :return:
+        """
+        self._requested = True
+
+    def pending(self) -> bool:
+        """
+        Returns True when a reload was requested or a watched file was touched.
+        :return:
+        """
+        if self._requested:
+            return True
+        now = time.monotonic()
+        if now - self._checked_at < self.WATCH_INTERVAL:
+            return False
+        self._checked_at = now
+        return any(FileStamp.of(path) != stamp for path, stamp in self._stamps.items())
+
+    def reload(self) -> ReloadResult:
+        """
+        Rereads files that changed and applies their content to the config
+        and the channel list.
+        :return:
+        """
+        force = self._requested
+        self._requested = False
+        self._checked_at = time.monotonic()
+
+        previous_options = None
+        if self._changed(self._conf_path, force):
+            options = self._load_options()
+            if options is not None:
+                previous_options = self._config.options
+                self._config.options = options
+                self._logger.info(f'Config reloaded: {self._conf_path}')
+
+        channels_changed = False
+        if self._changed(self._urls_path, force):
+            try:
+                channel_urls = load_urls(self._urls_path)
+            except ProgramShouldExit as e:
+                self._logger.error(f'Keeping {len(self._channel_urls)} channels, {e.msg}')
+            else:
+                channels_changed = set(channel_urls) != set(self._channel_urls)
+                self._channel_urls = channel_urls
+                self._logger.info(f'Channel list reloaded: {len(channel_urls)} channels')
+
+        return ReloadResult(previous_options, channels_changed)
+
+    def _changed(self, path: str, force: bool) -> bool:
+        stamp = FileStamp.of(path)
+        if not force and stamp == self._stamps[path]:
+            return False
+        self._stamps[path] = stamp
+        content = self._read(path)
+        if content == self._contents[path]:
+            return False
+        self._contents[path] = content
+        return True
+
+    def _load_options(self) -> Options | None:
+        try:
+            return Config.load_options(self._logger, self._conf_path)
+        except (TypeError, ValueError) as e:
+            self._logger.error(f'Invalid value in {self._conf_path}, keeping the current config, {e}')
+            return None
+
+    @staticmethod
+    def _read(path: str) -> bytes | None:
+        try:
+            with open(path, 'rb') as file:
+                return file.read()
+        except OSError:
+            return None
@@ -0,0 +1,172 @@
+import heapq
+import threading
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional
+from ytracker.config import Config
+from ytracker.database import Channel
+from ytracker.logger import Logger
+
+
+@dataclass(frozen=True, slots=True)
+class Watermark:
+    """
+    Newest video seen on a channel. Scans stop once they reach it.
+    """
+    video_id: str
+    upload_date: str | None = None
+
+
+class ChannelScheduler:
+    """
+    Decides which channels are due for a check.
+
+    Every channel has its own check interval. A check that finds new videos
+    moves the interval towards the observed time between uploads, a check
+    that finds nothing stretches it, always within min_refresh_interval and
+    max_refresh_interval. Next check times are kept in a heap and persisted
+    in the channel table.
+    """
+    __slots__ = '_config', '_logger', '_channels', '_heap', '_lock'
+
+    GROWTH = 1.5
+
+    def __init__(self, config: Config, logger: Logger) -> None:
+        self._config = config
+        self._logger = logger
+        self._channels: dict[str, Channel] = {channel.url: channel for channel in Channel.get_all()}
+        self._heap: list[tuple[float, str]] = [
+            (channel.next_check_at, channel.url) for channel in self._channels.values()
+        ]
+        heapq.heapify(self._heap)
+        self._lock = threading.Lock()
+
+    @property
+    def min_interval(self) -> float:
+        return self._config.options.min_refresh_interval * 3600
+
+    @property
+    def max_interval(self) -> float:
+        return self._config.options.max_refresh_interval * 3600
+
+    def sync(self, channel_urls: Iterable[str], now: Optional[float] = None) -> None:
+        """
+        Starts tracking new channels, due right away, and forgets removed ones.
+        :param channel_urls:
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        channel_urls = set(channel_urls)
+        with self._lock:
+            for url in self._channels.keys() - channel_urls:
+                self._channels.pop(url).delete()
+                self._logger.info(f'Stopped tracking channel: {url}')
+            for url in channel_urls - self._channels.keys():
+                channel = Channel() \
+                    .set_url(url) \
+                    .set_check_interval(self._clamp(self._config.options.refresh_interval * 3600)) \
+                    .set_next_check_at(now)
+                channel.save()
+                self._channels[url] = channel
+                heapq.heappush(self._heap, (channel.next_check_at, url))
+
+    def due(self, now: Optional[float] = None) -> tuple[str, ...]:
+        """
+        Returns channels whose check is due. They are provisionally rescheduled
+        one interval ahead in case their scan never reports back.
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            self._drop_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, url = heapq.heappop(self._heap)
+                channel = self._channels[url]
+                channel.next_check_at = now + channel.check_interval
+                heapq.heappush(self._heap, (channel.next_check_at, url))
+                due.append(url)
+                self._drop_stale()
+        return tuple(due)
+
+    def check_all_now(self, now: Optional[float] = None) -> None:
+        """
+        Makes every channel due right away, keeping their intervals.
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            for url, channel in self._channels.items():
+                channel.next_check_at = now
+                heapq.heappush(self._heap, (now, url))
+
+    def watermark(self, channel_url: str) -> Optional[Watermark]:
+        with self._lock:
+            channel = self._channels.get(channel_url)
+            if channel is None or channel.last_video_id is None:
+                return None
+            return Watermark(channel.last_video_id, channel.last_upload_date)
+
+    def record(
+            self,
+            channel_url: str,
+            new_videos: int,
+            watermark: Optional[Watermark] = None,
+            now: Optional[float] = None
+    ) -> None:
+        """
+        Adapts the channel's interval to the outcome of a check and persists it
+        together with the newest video the check saw.
+        :param channel_url:
+        :param new_videos: How many not yet downloaded videos the check found.
+        :param watermark: Newest video on the channel, None to keep the current one.
+        :param now:
+        :return:
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            channel = self._channels.get(channel_url)
+            if channel is None:
+                return
+            if new_videos > 0:
+                since_last_check = now - channel.last_checked_at \
+                    if channel.last_checked_at is not None else channel.check_interval
+                interval = (channel.check_interval + since_last_check / new_videos) / 2
+            else:
+                interval = channel.check_interval * self.GROWTH
+            if watermark is not None:
+                channel \
+                    .set_last_video_id(watermark.video_id) \
+                    .set_last_upload_date(watermark.upload_date)
+            channel \
+                .set_check_interval(self._clamp(interval)) \
+                .set_last_checked_at(now) \
+                .set_next_check_at(now + channel.check_interval) \
+                .update()
+            heapq.heappush(self._heap, (channel.next_check_at, channel_url))
+
+    def seconds_until_next(self, now: Optional[float] = None) -> float:
+        now = time.time() if now is None else now
+        with self._lock:
+            self._drop_stale()
+            if not self._heap:
+                return self.max_interval
+            return max(0.0, self._heap[0][0] - now)
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _drop_stale(self) -> None:
+        """
+        Pops heap entries left behind by rescheduled or removed channels.
+        :return:
+        """
+        while self._heap:
+            next_check_at, url = self._heap[0]
+            channel = self._channels.get(url)
+            if channel is not None and channel.next_check_at == next_check_at:
+                return
+            heapq.heappop(self._heap)
@@ -0,0 +1,126 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+from ytracker.config import Config
+from ytracker.database import YouTubeVideo
+from ytracker.eviction import EvictionPlanner
+from ytracker.logger import Logger
+from ytracker.utils import convert_gb_to_bytes
+
+
+@dataclass(frozen=True, slots=True)
+class StorageUsage:
+    used: int
+    limit: int
+
+    @property
+    def bytes_over(self) -> int:
+        return self.used - self.limit
+
+
+class StoragePolicy:
+    """
+    Decides how many bytes downloaded videos may take.
+
+    In 'quota' mode the limit is storage_size. In 'free_space' mode it is
+    whatever keeps min_free_space / min_free_percent of the disk under
+    download_path free, measured with statvfs, so other files on the disk
+    count too. Videos are evicted ahead of a download to make room for it.
+
+    The storage_usage counter is read once, so a policy lives for one cycle
+    and counts the downloads finished meanwhile itself. In 'quota' mode
+    downloads reserve their expected size while they run. In 'free_space'
+    mode they don't, since statvfs already sees what they wrote.
+    """
+    __slots__ = '_config', '_logger', '_used', '_reserved', '_lock'
+
+    def __init__(self, config: Config, logger: Logger) -> None:
+        self._config = config
+        self._logger = logger
+        self._used: int | None = None
+        self._reserved = 0
+        self._lock = threading.Lock()
+
+    def usage(self) -> StorageUsage:
+        """
+        Returns bytes used by downloaded videos and how many they may use.
+        :return:
+        :raises ProgramShouldExit:
+        """
+        used = YouTubeVideo.get_sum_file_size() or 0
+        if self._config.options.storage_mode != 'free_space':
+            return StorageUsage(used, convert_gb_to_bytes(self._config.options.storage_size))
+
+        free, keep_free = self._free_space()
+        return StorageUsage(used, used + free - keep_free)
+
+    @contextmanager
+    def room_for(self, expected_bytes: int) -> Iterator[bool]:
+        """
+        Reserves room for a download of `expected_bytes` while it runs,
+        evicting videos first when it would not fit.
+        :param expected_bytes:
+        :return: False when even eviction can't make enough room.
+        :raises ProgramShouldExit:
+        """
+        reserved_bytes = expected_bytes if self._config.options.storage_mode != 'free_space' else 0
+        with self._lock:
+            bytes_over = self._bytes_over() + self._reserved + expected_bytes
+            if bytes_over > 0:
+                EvictionPlanner(self._logger, self._config.options.eviction_policy).evict(bytes_over)
+                self._used = None
+                bytes_over = self._bytes_over() + self._reserved + expected_bytes
+            fits = bytes_over <= 0
+            if fits:
+                self._reserved += reserved_bytes
+        try:
+            yield fits
+        finally:
+            if fits:
+                with self._lock:
+                    self._reserved -= reserved_bytes
+
+    def add(self, file_size: int) -> None:
+        """
+        Counts a finished download toward the usage read from the counter.
+        :param file_size:
+        :return:
+        """
+        with self._lock:
+            if self._used is not None:
+                self._used += file_size
+
+    def _bytes_over(self) -> int:
+        if self._config.options.storage_mode == 'free_space':
+            free, keep_free = self._free_space()
+            return keep_free - free
+        if self._used is None:
+            self._used = YouTubeVideo.get_sum_file_size() or 0
+        return self._used - convert_gb_to_bytes(self._config.options.storage_size)
+
+    def _free_space(self) -> tuple[int, int]:
+        """
+        Returns free bytes on the disk under download_path and how many must stay free.
+        :return:
+        """
+        stat = os.statvfs(self._existing_dir(self._config.options.download_path))
+        keep_free = max(
+            convert_gb_to_bytes(self._config.options.min_free_space),
+            int(stat.f_blocks * stat.f_frsize * self._config.options.min_free_percent / 100)
+        )
+        return stat.f_bavail * stat.f_frsize, keep_free
+
+    @staticmethod
+    def _existing_dir(path: str) -> str:
+        """
+        Returns `path` or its closest existing parent, since download_path
+        may not be created yet.
+        :param path:
+        :return:
+        """
+        path = os.path.abspath(path)
+        while not os.path.isdir(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        return path
@@ -3,7 +3,7 @@ import os
 import re
 import sys
 from enum import Enum
-from ytracker.config import Config
+from typing import Callable, Optional
 from ytracker.exception import ProgramShouldExit
 from ytracker.logger import Logger
 
@@ -17,14 +17,28 @@ def is_valid_youtube_url(url: str) -> bool:
     return re.match(r'https://www\.youtube\.com/@[^/]+', url) is not None
 
 
-def load_urls(file_path=None) -> tuple:
-    file_path = os.path.join(
+def video_id_of(video_url: str) -> Optional[str]:
+    """
+    Returns the id of the video `video_url` points to, None when it is not a video url.
+    :param video_url:
+    :return:
+    """
+    match = re.search(r'(?:[?&]v=|youtu\.be/|/shorts/|/live/)([\w-]{11})(?![\w-])', video_url)
+    return match.group(1) if match is not None else None
+
+
+def urls_path() -> str:
+    return os.path.join(
         os.path.expanduser('~'),
         '.local',
         'share',
         'ytracker',
         'ytracker_urls.txt'
-    ) if file_path is None else file_path
+    )
+
+
+def load_urls(file_path=None) -> tuple:
+    file_path = urls_path() if file_path is None else file_path
 
     try:
         with open(file_path, 'r') as file:
@@ -46,6 +60,15 @@ class Command(Enum):
     START = 'start'
     STOP = 'stop'
     HELP = 'help'
+    REBUILD_USAGE = 'rebuild-usage'
+    RECONCILE = 'reconcile'
+    PROFILE = 'profile'
+    RELOAD = 'reload'
+    STATUS = 'status'
+    SCAN_NOW = 'scan-now'
+    PAUSE = 'pause'
+    RESUME = 'resume'
+    DRAIN = 'drain'
 
 
 def parse_args(args: list[str]) -> Command:
@@ -60,6 +83,24 @@ def parse_args(args: list[str]) -> Command:
         return Command.STOP
     if arg == 'help':
         return Command.HELP
+    if arg == 'rebuild-usage':
+        return Command.REBUILD_USAGE
+    if arg == 'reconcile':
+        return Command.RECONCILE
+    if arg == 'profile':
+        return Command.PROFILE
+    if arg == 'reload':
+        return Command.RELOAD
+    if arg == 'status':
+        return Command.STATUS
+    if arg == 'scan-now':
+        return Command.SCAN_NOW
+    if arg == 'pause':
+        return Command.PAUSE
+    if arg == 'resume':
+        return Command.RESUME
+    if arg == 'drain':
+        return Command.DRAIN
 
     return Command.HELP
 
@@ -73,7 +114,20 @@ Manage the ytracker service.
 Commands:
   start    Start the ytracker service.
   stop     Stop the ytracker service.
+  reload   Reread config.json and ytracker_urls.txt without restarting.
+  status   Show what the running service is doing.
+  scan-now Check every channel now instead of when it is due.
+  pause    Finish active downloads and start nothing new until resumed.
+  resume   Continue after pause.
+  drain    Stop checking channels, finish queued downloads, then exit.
   help     Show this help message and exit (default).
+  rebuild-usage
+           Recount storage used by downloaded videos.
+  reconcile
+           Match download history to files in download_path.
+  profile [--pstats]
+           Run one cycle in the foreground under cProfile and tracemalloc
+           and write the report to ~/.local/share/ytracker.
     """)
     return ExitCode.SUCCESS.value
 
@@ -102,7 +156,21 @@ def handle_should_exit_exception(e: ProgramShouldExit, logger: Logger) -> None:
     sys.exit(e.code)
 
 
-def sleep(logger: Logger, config: Config) -> None:
-    wait_time = config.options.refresh_interval * 60
-    logger.info(f'Sleeping for {wait_time} minutes...')
-    time.sleep(config.options.refresh_interval * 3600)
+def sleep(logger: Logger, seconds: float, wake: Optional[Callable[[], bool]] = None) -> None:
+    """
+    Sleeps for `seconds`, or until `wake()` returns True, checking it every second.
+    :param logger:
+    :param seconds:
+    :param wake:
+    :return:
+    """
+    logger.info(f'Sleeping for {round(seconds / 60)} minutes...')
+    if wake is None:
+        time.sleep(seconds)
+        return
+    deadline = time.monotonic() + seconds
+    while not wake():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 1.0))
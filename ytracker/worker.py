@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+from typing import Callable, Generator, Iterable
+from yt_dlp.utils import DownloadCancelled
+from ytracker.control import DaemonState, Stage
+from ytracker.database import DownloadedIndex, DownloadJob
+from ytracker.fetch import VideoInfo
+from ytracker.logger import Logger
+from ytracker.utils import video_id_of
+
+_DONE = object()
+_CANCELLED = object()
+
+
+class DownloadPool:
+    """
+    Downloads queued videos on a fixed number of worker threads.
+
+    Discovery runs on its own thread and writes every url to the durable
+    download_job queue. Workers claim jobs from it until discovery is done
+    and no job is ready, so work queued by an earlier run is picked up too.
+    Results come back to the thread iterating `run()`, which stays the only
+    one saving videos. A job is finished once its video was saved, so a
+    crash or failed save in between leaves it to be retried. While the
+    daemon is paused workers claim nothing new, and once it drains
+    discovery stops. When it stops, workers finish their current download
+    and quit; jobs whose download was cancelled are put back in the queue.
+    """
+    __slots__ = '_download', '_workers', '_logger'
+
+    # Workers abandoned by the last run() that may still be inside yt-dlp.
+    _abandoned: list[threading.Thread] = []
+
+    # Seconds past the shutdown grace period after which downloads that
+    # did not react to cancellation are abandoned, left for the next start.
+    ABANDON_AFTER = 5.0
+
+    def __init__(
+            self,
+            download: Callable[[str], VideoInfo | bool],
+            workers: int,
+            logger: Logger
+    ) -> None:
+        self._download = download
+        self._workers = max(1, workers)
+        self._logger = logger
+
+    def run(self, videos: Iterable[tuple[str | None, str | None]]) -> Generator[VideoInfo | bool, None, None]:
+        """
+        Queues `videos`, pairs of video and channel url, and downloads
+        them along with jobs queued before.
+        :param videos:
+        :return:
+        """
+        result_queue: queue.Queue = queue.Queue()
+        discovering = threading.Event()
+        discovering.set()
+        stop = threading.Event()
+        queued = threading.Condition()
+
+        threads = [threading.Thread(
+            target=self._feed,
+            args=(videos, discovering, stop, queued),
+            name='ytracker-discovery',
+            daemon=True
+        )]
+        threads.extend(threading.Thread(
+            target=self._work,
+            args=(result_queue, discovering, stop, queued),
+            name=f'ytracker-download-{number}',
+            daemon=True
+        ) for number in range(self._workers))
+        for thread in threads:
+            thread.start()
+
+        state = DaemonState.get()
+        finished = 0
+        try:
+            while finished < self._workers:
+                try:
+                    item = result_queue.get(timeout=1)
+                except queue.Empty:
+                    if state.grace_expired(time.monotonic() - self.ABANDON_AFTER):
+                        self._logger.warning('Abandoning downloads still running after the grace period')
+                        DownloadPool._abandoned = [thread for thread in threads if thread.is_alive()]
+                        return
+                    continue
+                if item is _DONE:
+                    finished += 1
+                    continue
+                job, result = item
+                if result is _CANCELLED:
+                    job.release()
+                    yield False
+                    continue
+                if not isinstance(result, VideoInfo):
+                    job.fail('Download failed')
+                    yield result
+                    continue
+
+                result.channel = job.channel
+                yield result
+                if result.video_id in DownloadedIndex.get():
+                    job.finish()
+                else:
+                    job.fail('Not saved to download history')
+        finally:
+            stop.set()
+
+    @classmethod
+    def abandoned_alive(cls) -> bool:
+        """
+        Returns True while workers abandoned at shutdown are still running,
+        so the database they may still write to must stay open.
+        :return:
+        """
+        return any(thread.is_alive() for thread in cls._abandoned)
+
+    def _feed(
+            self,
+            videos: Iterable[tuple[str | None, str | None]],
+            discovering: threading.Event,
+            stop: threading.Event,
+            queued: threading.Condition
+    ) -> None:
+        state = DaemonState.get()
+        try:
+            for video_url, channel_url in videos:
+                if stop.is_set() or state.draining or state.stopping:
+                    break
+                if video_url is None or not DownloadJob.enqueue(video_url, channel=channel_url):
+                    continue
+                state.job_queued()
+                with queued:
+                    queued.notify()
+        except Exception as e:
+            self._logger.error(f'Error occurred while discovering videos, {e}')
+        finally:
+            state.set_stage(Stage.DOWNLOADING)
+            discovering.clear()
+            with queued:
+                queued.notify_all()
+
+    def _work(
+            self,
+            result_queue: queue.Queue,
+            discovering: threading.Event,
+            stop: threading.Event,
+            queued: threading.Condition
+    ) -> None:
+        state = DaemonState.get()
+        try:
+            while not stop.is_set() and not state.stopping:
+                if state.paused:
+                    state.wait_until_resumed(timeout=1)
+                    continue
+                job = DownloadJob.claim()
+                if job is None:
+                    if not discovering.is_set():
+                        return
+                    with queued:
+                        queued.wait(timeout=1)
+                    continue
+                # Saved by a run that died before finishing the job.
+                if video_id_of(job.video_url) in DownloadedIndex.get():
+                    job.finish()
+                    continue
+                state.download_started(job.video_url)
+                try:
+                    result = self._download(job.video_url)
+                except DownloadCancelled:
+                    self._logger.info(f'Cancelled downloading {job.video_url}, it resumes on the next start')
+                    result = _CANCELLED
+                except Exception as e:
+                    self._logger.error(f'Error occurred while downloading {job.video_url}, {e}')
+                    result = False
+                finally:
+                    state.download_finished(job.video_url)
+                result_queue.put((job, result))
+        except Exception as e:
+            self._logger.error(f'Download worker stopped, {e}')
+        finally:
+            result_queue.put(_DONE)
@@ -0,0 +1,67 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Hashable, Iterator, Optional
+from yt_dlp import YoutubeDL
+
+
+class YoutubeDLPool:
+    """
+    Reusable YoutubeDL instances grouped by option profile.
+
+    Building a YoutubeDL loads extractors, cookies and HTTP handlers, so
+    instances are created once and handed out again after use. A borrowed
+    instance belongs to one thread until it is returned.
+    """
+    __slots__ = '_idle', '_lock', '_created'
+
+    _instance: Optional['YoutubeDLPool'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self) -> None:
+        self._idle: defaultdict[Hashable, list[YoutubeDL]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._created = 0
+
+    @classmethod
+    def get(cls) -> 'YoutubeDLPool':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @property
+    def created(self) -> int:
+        """
+        Returns how many YoutubeDL instances were built so far.
+        :return:
+        """
+        return self._created
+
+    @contextmanager
+    def acquire(self, profile: Hashable, params: Callable[[], dict]) -> Iterator[YoutubeDL]:
+        """
+        Borrows an idle instance built for `profile`, or builds one from `params()`.
+        :param profile: Key that changes whenever the options would change.
+        :param params:
+        :return:
+        """
+        with self._lock:
+            idle = self._idle[profile]
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            ydl = YoutubeDL(params())
+            with self._lock:
+                self._created += 1
+        try:
+            yield ydl
+        finally:
+            with self._lock:
+                self._idle[profile].append(ydl)
+
+    def clear(self) -> None:
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+        for ydl in idle:
+            ydl.__exit__(None, None, None)